@@ -0,0 +1,188 @@
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+# Actuator layer between the rule engine and the devices
+#
+# All device commands of one evaluation cycle (one check_rules pass, one
+# ingested batch, one set_device_state call) go through dispatch():
+#   1. coalesce: one command per (room, device); the highest priority wins,
+#      ties go to the command submitted last (last writer wins)
+#   2. dedupe: a command for the state the device is already in is dropped
+#   3. throttle: per-device policy against relay flapping
+#        min_interval_seconds  minimum time between two changes of a device
+#        hold_seconds          a device must stay in a new state this long
+#                              before it may return to the previous one
+#      A throttled command is not lost: it is queued per device and retried
+#      in every later cycle until it is allowed, superseded by a newer
+#      command for the device, or no longer needed. Rules fire on edges, so
+#      a dropped "off" would otherwise never be sent again.
+# The surviving commands are applied and handed to listeners as one batch.
+#
+# The hold is hysteresis in time. A threshold deadband is written as two
+# rules with separated thresholds ("fan on above 26", "fan off below 24"):
+# between 24 and 26 neither rule has a rising edge, so the fan keeps its state.
+
+DeviceKey = Tuple[str, str]
+
+
+class Command:
+    """Request to put room.device into state; source names the sender ("manual", "rule:<id>")"""
+
+    __slots__ = ("room", "device", "state", "priority", "source")
+
+    def __init__(self, room: str, device: str, state: str, priority: int = 0, source=None):
+        self.room = room
+        self.device = device
+        self.state = state
+        self.priority = priority
+        self.source = source
+
+    @property
+    def key(self) -> DeviceKey:
+        return self.room, self.device
+
+    def __repr__(self):
+        return f"Command({self.room}.{self.device} -> {self.state}, priority={self.priority})"
+
+
+class DevicePolicy:
+    """Flap protection of one device; zero disables a limit"""
+
+    __slots__ = ("min_interval_seconds", "hold_seconds")
+
+    def __init__(self, min_interval_seconds: float = 0.0, hold_seconds: float = 0.0):
+        self.min_interval_seconds = min_interval_seconds
+        self.hold_seconds = hold_seconds
+
+
+class Actuator:
+    """
+    Coalesces, dedupes and throttles device commands per cycle.
+    current(room, device) reads a device state, apply(room, device, state)
+    changes it, clock() returns the current pd.Timestamp.
+    """
+
+    def __init__(self, current: Callable[[str, str], Optional[str]],
+                 apply: Callable[[str, str, str], None],
+                 clock: Callable[[], pd.Timestamp] = pd.Timestamp.now,
+                 default_policy: Optional[DevicePolicy] = None):
+        self._current = current
+        self._apply = apply
+        self._clock = clock
+        self.default_policy = default_policy or DevicePolicy()
+        self.policies: Dict[DeviceKey, DevicePolicy] = {}
+        # (room, device) -> (time of the last change, state before it)
+        self._last_change: Dict[DeviceKey, Tuple[pd.Timestamp, Optional[str]]] = {}
+        # (room, device) -> throttled command waiting to be retried
+        self._pending: Dict[DeviceKey, Command] = {}
+        self._listeners: List[Callable[[List[Command], pd.Timestamp], None]] = []
+        self._lock = threading.RLock()
+        self.stats = {"cycles": 0, "commands": 0, "applied": 0, "unchanged": 0,
+                      "superseded": 0, "throttled": 0, "retried": 0}
+
+    def set_policy(self, room: str, device: str, policy: DevicePolicy):
+        self.policies[(room, device)] = policy
+
+    def add_listener(self, listener: Callable[[List[Command], pd.Timestamp], None]):
+        """listener(applied_commands, timestamp) is called once per cycle that changed something"""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def _throttled(self, cmd: Command, now: pd.Timestamp) -> Optional[str]:
+        last = self._last_change.get(cmd.key)
+        if last is None:
+            return None
+        policy = self.policies.get(cmd.key, self.default_policy)
+        changed_at, previous_state = last
+        elapsed = (now - changed_at).total_seconds()
+        if elapsed < policy.min_interval_seconds:
+            return "rate_limited"
+        if cmd.state == previous_state and elapsed < policy.hold_seconds:
+            return "hold"
+        return None
+
+    @property
+    def pending(self) -> List[Command]:
+        """Throttled commands waiting for their device's policy to allow them"""
+        with self._lock:
+            return list(self._pending.values())
+
+    def flush(self) -> Dict[str, list]:
+        """A cycle without new commands: applies the queued commands that are now allowed"""
+        return self.dispatch([])
+
+    def dispatch(self, commands: List[Command], force: bool = False) -> Dict[str, list]:
+        """
+        Run one cycle over commands (in submission order), plus the queued
+        commands of devices that get no new command. force skips the
+        throttling, e.g. for manual commands. Returns the commands that were
+        applied, already in place, superseded by another command, or throttled
+        (as (command, reason) pairs) and queued; queued commands that are
+        still throttled are not reported again.
+        """
+        with self._lock:
+            now = self._clock()
+
+            winners: Dict[DeviceKey, Command] = {}
+            superseded = []
+            for cmd in commands:
+                best = winners.get(cmd.key)
+                if best is None or cmd.priority >= best.priority:
+                    if best is not None:
+                        superseded.append(best)
+                    winners[cmd.key] = cmd
+                else:
+                    superseded.append(cmd)
+
+            # a newer command for a device replaces its queued one
+            retries = set()
+            for key, cmd in self._pending.items():
+                if key not in winners:
+                    winners[key] = cmd
+                    retries.add(key)
+            self._pending = {}
+
+            applied, unchanged, throttled = [], [], []
+            for key, cmd in winners.items():
+                current = self._current(cmd.room, cmd.device)
+                if current == cmd.state:
+                    if key not in retries:
+                        unchanged.append(cmd)
+                    continue
+                # force covers this cycle's commands, not queued rule commands
+                reason = None if force and key not in retries else self._throttled(cmd, now)
+                if reason is not None:
+                    self._pending[key] = cmd
+                    if key not in retries:
+                        throttled.append((cmd, reason))
+                    continue
+                self._apply(cmd.room, cmd.device, cmd.state)
+                self._last_change[key] = (now, current)
+                applied.append(cmd)
+                if key in retries:
+                    self.stats["retried"] += 1
+
+            self.stats["cycles"] += 1
+            self.stats["commands"] += len(commands)
+            self.stats["applied"] += len(applied)
+            self.stats["unchanged"] += len(unchanged)
+            self.stats["superseded"] += len(superseded)
+            self.stats["throttled"] += len(throttled)
+
+            if applied:
+                for listener in list(self._listeners):
+                    listener(applied, now)
+
+            return {"applied": applied, "unchanged": unchanged,
+                    "superseded": superseded, "throttled": throttled}
+
+    def reset(self):
+        """Forget change history and queued commands (policies and listeners are kept)"""
+        with self._lock:
+            self._last_change.clear()
+            self._pending.clear()
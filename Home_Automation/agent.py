@@ -1,62 +1,320 @@
+import time
+_IMPORT_STARTED = time.perf_counter()
+
 import json
-import re
-from typing import Dict, Any
+import os
+from pathlib import Path
+from typing import Dict, Any, List
 
 import tools
+import intent_router
+import metrics
+import prompt_builder
+from command_cache import CommandCache
+from prompt_builder import PromptSection
+from metrics import debug, timed
+
+# llm loads the model lazily, on the first call that needs it
+import llm
+from tool_call_grammar import ToolCallStreamParser
+
+STARTUP_TIMINGS: Dict[str, float] = {"import": time.perf_counter() - _IMPORT_STARTED}
 
-# import run_llm from your llm module
-from llm import run_llm  
+SENSOR_CSV = os.environ.get(
+    "HOME_AUTOMATION_SENSOR_CSV", str(Path(__file__).resolve().parent / "sensor_data.csv")
+)
+
+# Rules and device states survive restarts here; an empty value disables it
+STATE_DIR = os.environ.get(
+    "HOME_AUTOMATION_STATE_DIR", str(Path(__file__).resolve().parent / "state")
+)
+
+
+# Retention tiers as "raw_days,minute_days[,hour_days]" (e.g. "7,30,365");
+# empty keeps every raw reading
+RETENTION = os.environ.get("HOME_AUTOMATION_RETENTION", "")
+
+# Stream the model output and start each tool call as soon as its JSON closes;
+# 0 waits for the whole answer first
+STREAM_LLM = os.environ.get("HOME_AUTOMATION_LLM_STREAM", "1") != "0"
+
+# Batch concurrent LLM calls up to this many prompts (llm_server); 0 runs each
+# call on its own. Batched calls are not streamed.
+LLM_BATCH = int(os.environ.get("HOME_AUTOMATION_LLM_BATCH", "0") or 0)
 
 
 # Load resources at startup
 
+def startup(csv_path: str = SENSOR_CSV, warm_up_llm: bool = True, state_dir: str = STATE_DIR):
+    """
+    Load the sensor CSV, restore persisted rules and device states and
+    register the local LLM. The model itself is loaded on a background
+    thread when warm_up_llm is set, otherwise on the first command that
+    needs it.
+    """
+    if RETENTION:
+        days = [float(d) if d.strip() else None for d in RETENTION.split(",")]
+        print("Retention:", tools.configure_retention(*days))
+
+    # 1. load sensor csv
+    started = time.perf_counter()
+    result = tools.load_sensor_data(csv_path)
+    STARTUP_TIMINGS["csv_load"] = time.perf_counter() - started
+
+    if state_dir:
+        started = time.perf_counter()
+        restored = tools.enable_persistence(state_dir)
+        STARTUP_TIMINGS["state_recovery"] = time.perf_counter() - started
+        print("State restored:", restored)
+
+    store = tools.current_home().sensor_store
+    if store is not None:
+        intent_router.register_rooms(room for room, _ in store.keys())
+
+    # 2. load local llm config 
+    llm_info = tools.load_local_llm()
+    print("\nLocal LLM registered:", llm_info, "\n")
+
+    if warm_up_llm and llm_info["status"] == "success":
+        llm.warm_up(prefix=PROMPT_PREFIX)
+    if LLM_BATCH:
+        use_llm_batching(LLM_BATCH)
 
-# 1. load sensor csv
-tools.load_sensor_data(
-    r"path_to_CSV"
-)
+    return result
 
-# 2. load local llm config 
-llm_info = tools.load_local_llm()
-print("\nLocal LLM registered:", llm_info, "\n")
+
+def startup_report() -> Dict[str, Any]:
+    """Seconds spent in imports, CSV load and model load"""
+    report = {name: round(seconds, 4) for name, seconds in STARTUP_TIMINGS.items()}
+    if llm.LOAD_SECONDS is not None:
+        report["model_load"] = round(llm.LOAD_SECONDS, 4)
+    else:
+        report["model_load"] = "not loaded yet"
+    return report
 
 
 # Helper: very small dispatcher
 
-def call_tool(tool_name: str, args: Dict[str, Any]) -> Any:
+TOOL_REGISTRY = {
+    "get_latest_sensor_data": tools.get_latest_sensor_data,
+    "get_sensor_data_by_timestamp": tools.get_sensor_data_by_timestamp,
+    "avg_sensor_data": tools.avg_sensor_data,
+    "min_sensor_data": tools.min_sensor_data,
+    "max_sensor_data": tools.max_sensor_data,
+    "sum_sensor_data": tools.sum_sensor_data,
+    "count_sensor_data": tools.count_sensor_data,
+    "percentile_sensor_data": tools.percentile_sensor_data,
+    "set_device_state": tools.set_device_state,
+    "add_automation_rule": tools.add_automation_rule,
+    "list_automation_rules": tools.list_automation_rules,
+    "check_rules": tools.check_rules,
+    "get_latest_sensor_data_time_filtered": tools.get_latest_sensor_data_time_filtered,
+    "avg_sensor_data_by_period": tools.avg_sensor_data_by_period,
+    "backtest_rules": tools.backtest_rules,
+}
+
+# Parameters of every tool, from its signature; the prompt's tool specs come from here
+TOOL_SCHEMAS = prompt_builder.build_registry(TOOL_REGISTRY)
+
+
+def call_tool(tool_name: str, args: Dict[str, Any], home: tools.Home = None) -> Any:
     """
-    Calls tools.py functions safely
+    Calls tools.py functions safely, on home (default: the current home)
     """
-    TOOL_REGISTRY = {
-        "get_latest_sensor_data": tools.get_latest_sensor_data,
-        "get_sensor_data_by_timestamp": tools.get_sensor_data_by_timestamp,
-        "avg_sensor_data": tools.avg_sensor_data,
-        "set_device_state": tools.set_device_state,
-        "add_automation_rule": tools.add_automation_rule,
-        "list_automation_rules": tools.list_automation_rules,
-        "check_rules": tools.check_rules,  
-        "get_latest_sensor_data_time_filtered": tools.get_latest_sensor_data_time_filtered,
-    }
-
     if tool_name not in TOOL_REGISTRY:
+        metrics.inc("tool_calls_total", tool=tool_name, status="unknown")
         return {"error": f"Unknown tool '{tool_name}'"}
+    problem = TOOL_SCHEMAS[tool_name].check_args(args)
+    if problem is not None:
+        metrics.inc("tool_calls_total", tool=tool_name, status="bad_args")
+        return {"error": problem}
+
+    with tools.use_home(home or tools.current_home()), metrics.span("call_tool", tool=tool_name):
+        result = TOOL_REGISTRY[tool_name](**args)
+    failed = isinstance(result, dict) and ("error" in result or result.get("status") == "error")
+    metrics.inc("tool_calls_total", tool=tool_name, status="error" if failed else "ok")
+    return result
+
+
+# Multi-call plans: the model may answer with a list of tool calls. They run
+# one after another in the order of the plan: every tool holds its home's
+# lock (tools._locked), so calls on one home could not overlap anyway.
+
+def normalize_args(args: Dict[str, Any]) -> Dict[str, Any]:
+    """Map argument names the model sometimes invents onto the real ones"""
+    args = dict(args or {})
+    if "sensor_type" in args:
+        args["sensor_name"] = args.pop("sensor_type")
+    if "sensor" in args:
+        args["sensor_name"] = args.pop("sensor")
+    if "location" in args:
+        args["room"] = args.pop("location")
+    return args
+
+
+def _safe_call_tool(tool_name: str, args: Dict[str, Any], home: tools.Home = None) -> Any:
+    try:
+        return call_tool(tool_name, args, home)
+    except Exception as e:
+        return {"error": f"{tool_name} failed: {e}"}
+
+
+def run_tool_calls(tool_calls: List[Dict[str, Any]], home: tools.Home = None) -> Dict[str, Any]:
+    """Run a list of {"tool", "args"} calls in order; returns every result in the order of the plan"""
+    home = home or tools.current_home()
+    results = [_safe_call_tool(call["tool"], call["args"], home) for call in tool_calls]
+    return _plan_result(tool_calls, results)
+
+
+def _plan_result(tool_calls: List[Dict[str, Any]], results: List[Any]) -> Dict[str, Any]:
+    failed = sum(1 for r in results if isinstance(r, dict) and ("error" in r or r.get("status") == "error"))
+    return {
+        "status": "success" if not failed else ("error" if failed == len(results) else "partial"),
+        "calls": len(tool_calls),
+        "results": [
+            {"tool": call["tool"], "args": call["args"], "result": result}
+            for call, result in zip(tool_calls, results)
+        ]
+    }
+
+
+class ToolPlan:
+    """
+    A plan whose calls arrive one at a time, as the model writes them. Each
+    call runs as soon as it arrives; the model keeps generating the rest of
+    the list on its own thread meanwhile.
+    """
+
+    __slots__ = ("home", "calls", "results")
+
+    def __init__(self, home: tools.Home = None):
+        self.home = home or tools.current_home()
+        self.calls: List[Dict[str, Any]] = []
+        self.results: List[Any] = []
 
-    return TOOL_REGISTRY[tool_name](**args)
+    def submit(self, call: Dict[str, Any]):
+        self.calls.append(call)
+        self.results.append(_safe_call_tool(call["tool"], call["args"], self.home))
 
-def run_local_llm(prompt: str) -> str:
+    def result(self) -> Any:
+        """Result of the only call, or the run_tool_calls result of the plan"""
+        if len(self.results) == 1:
+            return self.results[0]
+        return _plan_result(self.calls, self.results)
+
+
+# BatchingLLMServer every run_local_llm call goes through, or None
+LLM_SERVER = None
+
+
+def use_llm_batching(max_batch_size: int = 8, max_wait_ms: float = 20.0):
     """
-    Proxy function that calls your real LLM in llm.py
+    Route run_local_llm through one BatchingLLMServer, so concurrent commands
+    share model.generate calls; max_batch_size 0 goes back to direct calls.
     """
-    print("\n[LLM PROMPT]")
-    print(prompt)
-    response = run_llm(prompt)  
-    print("\n[RAW LLM OUTPUT]\n")
-    print(response)
-    return response
+    global LLM_SERVER
+    from llm_server import BatchingLLMServer
+
+    previous = LLM_SERVER
+    LLM_SERVER = BatchingLLMServer(max_batch_size, max_wait_ms) if max_batch_size > 0 else None
+    if previous is not None:
+        previous.close()
+    return LLM_SERVER
+
+
+def run_local_llm(prompt: str, prefix: str = None) -> str:
+    """
+    Proxy function that calls your real LLM in llm.py.
+    prefix is the static part of the prompt whose KV cache llm.py reuses.
+    Decoding is constrained to a tool call, or a list of tool calls, on
+    TOOL_REGISTRY names.
+    """
+    debug("\n[LLM PROMPT]")
+    debug(prompt)
+    # commands may run on several threads (api_server); llm.MODEL_LOCK keeps
+    # them off the model one at a time, or the batcher groups them
+    with metrics.span("llm"):
+        if LLM_SERVER is not None:
+            return LLM_SERVER.generate_blocking(prompt, prefix=prefix, tool_names=list(TOOL_REGISTRY))
+        return llm.run_llm(prompt, prefix=prefix, tool_names=list(TOOL_REGISTRY))
+
+
+def run_local_llm_stream(prompt: str, prefix: str = None):
+    """run_local_llm as a generator of text pieces; closing it stops generation"""
+    debug("\n[LLM PROMPT]")
+    debug(prompt)
+    with metrics.span("llm", mode="stream"):
+        yield from llm.stream_llm(prompt, prefix=prefix, tool_names=list(TOOL_REGISTRY))
+
+
+def _stream_command(user_message: str, prompt: str, home: tools.Home = None):
+    """
+    LLM path on a token stream: every tool call starts as soon as its object
+    closes, while the model may still be writing the next call of a list,
+    and generation is stopped once the call (or the list) is complete.
+    """
+    parser = ToolCallStreamParser(TOOL_REGISTRY)
+    plan = ToolPlan(home)
+    stream = run_local_llm_stream(prompt, prefix=PROMPT_PREFIX)
+    try:
+        for piece in stream:
+            for call in parser.feed(piece):
+                debug(f"\n[AGENT DECISION] calling tool: {call['tool']} args={call.get('args', {})}")
+                args = normalize_args(call.get("args", {}))
+                debug(f"[NORMALIZED] calling tool: {call['tool']} args={args}")
+                plan.submit({"tool": call["tool"], "args": args})
+            if parser.finished:
+                break
+    finally:
+        stream.close()
+    debug("\n[RAW LLM OUTPUT]\n", parser.text)
+
+    if not parser.calls:
+        metrics.inc("command_errors_total", reason="invalid_json")
+        error = {"error": "LLM did not return valid JSON", "raw": parser.text}
+        if parser.error:
+            error["detail"] = parser.error
+        return error
+
+    # only complete answers are cached; a list cut short still runs what arrived
+    if parser.done:
+        COMMAND_CACHE.put(user_message, parser.calls if parser.validator.in_list else parser.calls[0])
+
+    result = plan.result()
+    debug("\n[TOOL RESULT]", result)
+    return result
 
 # Extract JSON helper
 
+def _is_tool_call_list(parsed) -> bool:
+    return (isinstance(parsed, list) and bool(parsed)
+            and all(isinstance(c, dict) and "tool" in c for c in parsed))
+
+
+@timed("extract_json")
 def extract_json(text: str):
+    """
+    The tool call in the model output: a dict, or a list of dicts when the
+    model planned several calls. None if no tool call is found.
+    """
+    # constrained decoding returns exactly one tool call or one list of them
+    try:
+        parsed = json.loads(text)
+        if (isinstance(parsed, dict) and "tool" in parsed) or _is_tool_call_list(parsed):
+            return parsed
+    except ValueError:
+        pass
+
+    # free-form output: a list of calls that starts before any bare object
+    start = text.find("[")
+    if start != -1 and (text.find("{") == -1 or start < text.find("{")):
+        try:
+            parsed, _ = json.JSONDecoder().raw_decode(text[start:])
+            if _is_tool_call_list(parsed):
+                return parsed
+        except ValueError:
+            pass
+
     try:
         json_candidates = []
         brace_count = 0
@@ -74,19 +332,19 @@ def extract_json(text: str):
                     start = None
         
         if not json_candidates:
-            print("[extract_json] No complete JSON objects found")
+            debug("[extract_json] No complete JSON objects found")
             return None
         json_str = json_candidates[-1]
-        print(f"[extract_json] Found {len(json_candidates)} JSONs, using last: {json_str[:100]}...")
+        debug(f"[extract_json] Found {len(json_candidates)} JSONs, using last: {json_str[:100]}...")
         
         parsed = json.loads(json_str)
         if "tool" not in parsed:
-            print("[extract_json] Last JSON missing 'tool' key, trying previous...")
+            debug("[extract_json] Last JSON missing 'tool' key, trying previous...")
             for candidate in reversed(json_candidates[:-1]):
                 try:
                     parsed = json.loads(candidate)
                     if "tool" in parsed:
-                        print(f"[extract_json] Found valid tool call: {candidate[:100]}...")
+                        debug(f"[extract_json] Found valid tool call: {candidate[:100]}...")
                         return parsed
                 except:
                     continue
@@ -95,104 +353,144 @@ def extract_json(text: str):
         return parsed
         
     except Exception as e:
-        print(f"[extract_json error]: {e}")
+        debug(f"[extract_json error]: {e}")
         return None
 
-SYSTEM_INSTRUCTIONS = """
+# System prompt sections; the tool specs are generated from TOOL_REGISTRY.
+# Sections with compact=False repeat what the others already say and are left
+# out of the compact prompt (HOME_AUTOMATION_PROMPT_COMPACT=1).
+PROMPT_SECTIONS = [
+    PromptSection("intro", """
 You are a home automation agent.
 You ONLY respond using JSON describing tool calls.
-
+"""),
+    PromptSection("mandatory", """
  ABSOLUTE MANDATORY RULES - READ FIRST:
 1. SINGLE SENSOR ONLY - sensor_name = STRING ("temperature") NEVER ARRAY/LIST
 2. NO EXTRA ARGS - add_automation_rule takes ONLY rule_text + structured_rule
 3. NO time_period, states[], threshold_values[] in add_automation_rule args
-
+""", compact=False),
+    PromptSection("critical_rules", """
 CRITICAL RULES (check in order):
 1. "if", "when", "whenever" + ONE condition + action → add_automation_rule
 2. "check rules", "run rules" → check_rules  
 3. "evening/morning/afternoon/night" + sensor → get_latest_sensor_data_time_filtered
 4. "what is", "latest", "current" → get_latest_sensor_data
-5. "average" → avg_sensor_data
+5. "average" + time period ("average morning temperature over the last 3 days") → avg_sensor_data_by_period; "average" between times → avg_sensor_data; "minimum/lowest", "maximum/highest", "total", "how many readings", "percentile/median" → min/max/sum/count/percentile_sensor_data
 6. "turn on/off", "set" → set_device_state
 7. "list", "show" rules → list_automation_rules
-
+8. "how often would ... have fired", "backtest", "test my rules" → backtest_rules (pass structured_rule only for a rule that is not stored yet)
+"""),
+    PromptSection("structured_rule", """
  STRUCTURED_RULE FORMAT (MANDATORY - NO EXCEPTIONS):
 FORMAT 1 ONLY: {"sensor_name": "temperature", "threshold_value": 25, "device": "fan", "state": "on", "room": "living_room"}
 - sensor_name = STRING only
 - threshold_value = NUMBER only  
 - NO arrays, NO lists, NO time_period here
-
+"""),
+    PromptSection("correct_examples", """
 CORRECT EXAMPLES:
 "temp > 18 → light": {"tool": "add_automation_rule", "args": {"rule_text": "user input", "structured_rule": {"sensor_name": "temperature", "threshold_value": 18, "device": "light", "state": "on", "room": "living_room"}}}
-
+"""),
+    PromptSection("wrong_examples", """
 WRONG (LLM WILL FAIL VALIDATION):
 {"sensor_name": ["temp1", "temp2"]}           → ARRAY ❌
 {"threshold_values": [25, 25]}               → ARRAY ❌  
 {"states": ["on"]}                           → ARRAY ❌
 "time_period": "all"                         → EXTRA ARG ❌
-
+""", compact=False),
+    PromptSection("split_pattern", """
 SINGLE SENSOR SPLIT PATTERN:
-"room1 AND room2 hot → fan" = 2 rules:
-Rule 1: {"sensor_name": "temperature", "room": "living_room", ...}
-Rule 2: {"sensor_name": "temperature", "room": "kitchen", ...}
-
+"room1 AND room2 hot → fan" = 2 rules, returned as a LIST of tool calls in one answer:
+[{"tool": "add_automation_rule", "args": {... "structured_rule": {"sensor_name": "temperature", "room": "living_room", ...}}},
+ {"tool": "add_automation_rule", "args": {... "structured_rule": {"sensor_name": "temperature", "room": "kitchen", ...}}}]
+Use a list whenever the request needs several tool calls (e.g. readings of several rooms).
+"""),
+    PromptSection("time_periods", """
 TIME PERIODS: morning, afternoon, evening, night
-
-TOOL SPECS:
-• add_automation_rule(rule_text: string, structured_rule: object)
-• check_rules(time_period: string) 
-• get_latest_sensor_data_time_filtered(room: string, sensor_name: string, time_period: string)
-• get_latest_sensor_data(room: string, sensor_name: string)
-• set_device_state(room: string, device: string, state: string)
-• list_automation_rules()
-
-Respond ONLY in JSON with keys: "tool" and "args". NO other text.
-"""
-def natural_language_command_agent(user_message: str):
-    prompt = f"""
-{SYSTEM_INSTRUCTIONS}
-
-User request:
-{user_message}
-
-Respond ONLY in JSON with keys: tool, args
-"""
-    llm_output = run_local_llm(prompt)
-
-    tool_call = extract_json(llm_output)
-    if not tool_call:
-        return {"error": "LLM did not return valid JSON", "raw": llm_output}
-
-    tool_name = tool_call.get("tool")
-    args = tool_call.get("args", {})
-
-    allowed_tools = [
-        "get_latest_sensor_data",
-        "get_sensor_data_by_timestamp",
-        "avg_sensor_data",
-        "set_device_state",
-        "add_automation_rule",
-        "list_automation_rules",
-        "check_rules",
-        "get_latest_sensor_data_time_filtered",
-    ]
-
-    if tool_name not in allowed_tools:
-        return {"error": f"Invalid tool name '{tool_name}'", "raw": llm_output}
-
-    print(f"\n[AGENT DECISION] calling tool: {tool_name} args={args}")
-    
-    if "sensor_type" in args:
-        args["sensor_name"] = args.pop("sensor_type")
-    if "sensor" in args:
-        args["sensor_name"] = args.pop("sensor")
-    if "location" in args:
-        args["room"] = args.pop("location")
-
-    print(f"[NORMALIZED] calling tool: {tool_name} args={args}")
-
-    result = call_tool(tool_name, args)
-    print("\n[TOOL RESULT]", result)
+"""),
+    PromptSection("tool_specs", prompt_builder.TOOL_SPECS),
+    PromptSection("respond", """
+Respond ONLY in JSON: one object with keys "tool" and "args", or a list of such objects. NO other text.
+"""),
+]
+
+PROMPT_COMPACT = os.environ.get("HOME_AUTOMATION_PROMPT_COMPACT", "0") == "1"
+
+# Log the token counts of every LLM prompt; tokenizing the whole prompt again
+# costs about as much as building it, so this is off even in debug mode
+PROMPT_REPORT = os.environ.get("HOME_AUTOMATION_PROMPT_REPORT", "0") == "1"
+PROMPT_BUILDER = prompt_builder.PromptBuilder(TOOL_SCHEMAS, PROMPT_SECTIONS, compact=PROMPT_COMPACT)
+
+SYSTEM_INSTRUCTIONS = PROMPT_BUILDER.system_instructions()
+
+# Static head of every prompt; its KV cache is computed once in llm.py
+PROMPT_PREFIX = PROMPT_BUILDER.prefix()
+
+
+def prompt_report(user_message: str = None) -> Dict[str, Any]:
+    """Token counts of the prompt sections (model tokenizer once loaded, else an estimate)"""
+    return PROMPT_BUILDER.report(user_message, tokenizer=llm.tokenizer if llm.is_loaded() else None)
+
+# Parsed tool calls of earlier LLM answers, keyed by normalized user text
+COMMAND_CACHE = CommandCache(max_entries=256, ttl_seconds=3600)
+
+@timed("command")
+def natural_language_command_agent(user_message: str, home: tools.Home = None):
+    """Answer one user command; tools act on home (default: the current home)"""
+    # deterministic fast path: confident matches skip the LLM entirely
+    routed = intent_router.route(user_message)
+    if routed is not None:
+        tool_name, args = routed
+        metrics.inc("commands_total", path="fast")
+        debug(f"\n[FAST PATH] calling tool: {tool_name} args={args}")
+        result = call_tool(tool_name, args, home)
+        debug("\n[TOOL RESULT]", result)
+        return result
+
+    # repeated commands reuse the parsed tool call; the tool still runs live
+    tool_call = COMMAND_CACHE.get(user_message)
+    if tool_call is not None:
+        llm_output = None
+        metrics.inc("commands_total", path="cache")
+        debug(f"\n[CACHE HIT] {tool_call}")
+    else:
+        metrics.inc("commands_total", path="llm")
+        with metrics.span("prompt_build"):
+            prompt = PROMPT_BUILDER.user_prompt(user_message)
+        if PROMPT_REPORT:
+            debug("\n[PROMPT TOKENS]", prompt_report(user_message))
+        if STREAM_LLM and LLM_SERVER is None:
+            return _stream_command(user_message, prompt, home)
+        llm_output = run_local_llm(prompt, prefix=PROMPT_PREFIX)
+
+        tool_call = extract_json(llm_output)
+        if not tool_call:
+            metrics.inc("command_errors_total", reason="invalid_json")
+            return {"error": "LLM did not return valid JSON", "raw": llm_output}
+
+    tool_calls = tool_call if isinstance(tool_call, list) else [tool_call]
+
+    for call in tool_calls:
+        if call.get("tool") not in TOOL_REGISTRY:
+            metrics.inc("command_errors_total", reason="invalid_tool")
+            return {"error": f"Invalid tool name '{call.get('tool')}'", "raw": llm_output}
+
+    if llm_output is not None:
+        COMMAND_CACHE.put(user_message, tool_call)
+
+    calls = []
+    for call in tool_calls:
+        debug(f"\n[AGENT DECISION] calling tool: {call['tool']} args={call.get('args', {})}")
+        args = normalize_args(call.get("args", {}))
+        debug(f"[NORMALIZED] calling tool: {call['tool']} args={args}")
+        calls.append({"tool": call["tool"], "args": args})
+
+    if len(calls) == 1:
+        result = call_tool(calls[0]["tool"], calls[0]["args"], home)
+    else:
+        result = run_tool_calls(calls, home)
+    debug("\n[TOOL RESULT]", result)
     return result
 
 # Simple interactive loop
@@ -200,13 +498,27 @@ Respond ONLY in JSON with keys: tool, args
 if __name__ == "__main__":
     print("Multi-Agent Home Automation System Ready! (Time-Aware)")
     print("Commands: 'list rules', 'check rules evening', 'latest evening kitchen temperature', 'if evening temp>28 → fan'")
-    print("Type 'exit' to quit\n")
+    print("Type 'metrics' for timings and counters, 'prompt' for prompt token counts, 'exit' to quit\n")
+
+    startup(warm_up_llm=os.environ.get("HOME_AUTOMATION_LLM_WARMUP", "1") != "0")
+    print("Startup times (s):", startup_report(), "\n")
 
     while True:
         user_msg = input("User: ")
 
         if user_msg.lower() in ["exit", "quit"]:
+            print("Fast-path router:", intent_router.router_stats())
+            print("Command cache:", COMMAND_CACHE.stats)
+            print("Startup times (s):", startup_report())
             break
 
+        if user_msg.lower() == "metrics":
+            print(metrics.to_prometheus())
+            continue
+
+        if user_msg.lower() == "prompt":
+            print(json.dumps(prompt_report(), indent=2))
+            continue
+
         result = natural_language_command_agent(user_msg)
         print("\nAgent response:", result)
@@ -0,0 +1,449 @@
+"""
+Local HTTP API for the agent, the tools and device-state changes.
+
+    python api_server.py --host 127.0.0.1 --port 8080
+
+Endpoints (JSON in and out unless noted; ?home=<id> selects a home):
+    GET  /health              liveness and startup timings
+    POST /command             {"message": "..."} -> natural_language_command_agent
+    GET  /tools               names in agent.TOOL_REGISTRY
+    POST /tools/<name>        tool arguments -> agent.call_tool, no LLM involved;
+                              400 for missing, unexpected or unparsable arguments
+    POST /readings            {"readings": [...]} or a bare list -> tools.ingest_readings;
+                              400 if any reading is invalid, and then none is applied
+    GET  /events              server-sent events, one "device" event per applied change
+    GET  /metrics             Prometheus text format
+
+Concurrent /command calls that reach the model are batched into shared
+generate calls (--llm-batch-size, 0 disables).
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import agent
+import metrics
+import tools
+
+# Plain asyncio streams, HTTP/1.1 only
+#
+# Connections are kept alive (HTTP/1.1 default, or HTTP/1.0 with
+# "Connection: keep-alive") and serve one request after another until the
+# client closes, asks to close, or stays idle for idle_timeout seconds.
+# Request bodies need a Content-Length. Tool, command and ingest calls block,
+# so they run on a thread pool; the event loop only parses and writes.
+#
+# /events registers a listener on each home's actuator. The listener runs on
+# whatever thread applied the change and hands the event to the loop with
+# call_soon_threadsafe; a client whose queue fills up is disconnected rather
+# than slowing down the actuator.
+
+REASONS = {
+    200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+    408: "Request Timeout", 411: "Length Required", 413: "Payload Too Large",
+    500: "Internal Server Error",
+}
+
+MAX_HEADER_BYTES = 16 * 1024
+
+
+class HttpError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class Request:
+    __slots__ = ("method", "path", "query", "version", "headers", "body")
+
+    def __init__(self, method: str, target: str, version: str, headers: Dict[str, str], body: bytes):
+        url = urlsplit(target)
+        self.method = method
+        self.path = url.path.rstrip("/") or "/"
+        self.query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        self.version = version
+        self.headers = headers
+        self.body = body
+
+    @property
+    def keep_alive(self) -> bool:
+        connection = self.headers.get("connection", "").lower()
+        if self.version == "HTTP/1.0":
+            return connection == "keep-alive"
+        return connection != "close"
+
+    def json(self) -> Any:
+        if not self.body:
+            return {}
+        try:
+            return json.loads(self.body)
+        except ValueError as e:
+            raise HttpError(400, f"Invalid JSON body: {e}")
+
+
+class _Subscriber:
+    """One /events client: its queue and the home it follows (None: all homes)"""
+
+    __slots__ = ("queue", "home_id", "closed")
+
+    def __init__(self, queue: asyncio.Queue, home_id: Optional[str]):
+        self.queue = queue
+        self.home_id = home_id
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+        try:
+            # wake the stream up; a full queue is drained first, then it sees closed
+            self.queue.put_nowait(None)
+        except asyncio.QueueFull:
+            pass
+
+
+class ApiServer:
+    """asyncio HTTP/1.1 server in front of agent and tools"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8080, homes: Optional[Dict[str, tools.Home]] = None,
+                 max_workers: int = 8, max_body_bytes: int = 64 * 1024 * 1024,
+                 idle_timeout: float = 30.0, event_queue_size: int = 1000):
+        self.host = host
+        self.port = port
+        self.homes = homes if homes is not None else {tools.DEFAULT_HOME.home_id: tools.DEFAULT_HOME}
+        self.max_body_bytes = max_body_bytes
+        self.idle_timeout = idle_timeout
+        self.event_queue_size = event_queue_size
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="api")
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._subscribers = set()
+        self._listeners = {}
+
+    # Lifecycle
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self):
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def stop(self):
+        for home_id in list(self._listeners):
+            self.homes[home_id].actuator.remove_listener(self._listeners.pop(home_id))
+        for subscriber in list(self._subscribers):
+            subscriber.close()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        self._executor.shutdown(wait=False)
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    # Connections
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(self._read_request(reader), self.idle_timeout)
+                except asyncio.TimeoutError:
+                    break
+                except HttpError as e:
+                    await self._send_json(writer, e.status, {"error": e.message}, keep_alive=False)
+                    break
+                if request is None:
+                    break
+
+                if request.method == "GET" and request.path == "/events":
+                    await self._stream_events(request, writer)
+                    break
+
+                started = time.perf_counter()
+                status, body, content_type = await self._dispatch(request)
+                metrics.inc("http_requests_total", route=self._route_label(request), status=status)
+                metrics.observe("http_request_seconds", time.perf_counter() - started,
+                                route=self._route_label(request))
+                await self._send(writer, status, body, content_type, request.keep_alive)
+                if not request.keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Optional[Request]:
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.IncompleteReadError as e:
+            if e.partial.strip():
+                raise HttpError(400, "Incomplete request head")
+            return None
+        except asyncio.LimitOverrunError:
+            raise HttpError(413, "Request head too large")
+        if len(head) > MAX_HEADER_BYTES:
+            raise HttpError(413, "Request head too large")
+
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, version = lines[0].split(" ", 2)
+        except ValueError:
+            raise HttpError(400, "Malformed request line")
+
+        headers = {}
+        for line in lines[1:]:
+            if line:
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+
+        body = b""
+        if "transfer-encoding" in headers:
+            raise HttpError(411, "Chunked bodies are not supported; send Content-Length")
+        if "content-length" in headers:
+            try:
+                length = int(headers["content-length"])
+            except ValueError:
+                raise HttpError(400, "Invalid Content-Length")
+            if length > self.max_body_bytes:
+                raise HttpError(413, f"Body larger than {self.max_body_bytes} bytes")
+            body = await reader.readexactly(length)
+        elif method in ("POST", "PUT"):
+            raise HttpError(411, "Content-Length required")
+
+        return Request(method, target, version, headers, body)
+
+    @staticmethod
+    def _route_label(request: Request) -> str:
+        if request.path.startswith("/tools/"):
+            return "/tools/{name}"
+        return request.path
+
+    async def _send(self, writer: asyncio.StreamWriter, status: int, body: bytes, content_type: str,
+                    keep_alive: bool):
+        head = (
+            f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+            "\r\n"
+        )
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+    async def _send_json(self, writer, status: int, payload: Any, keep_alive: bool):
+        await self._send(writer, status, _dumps(payload), "application/json", keep_alive)
+
+    # Routing
+
+    async def _dispatch(self, request: Request) -> Tuple[int, bytes, str]:
+        try:
+            if request.path == "/metrics" and request.method == "GET":
+                return 200, metrics.to_prometheus().encode("utf-8"), "text/plain; version=0.0.4"
+            status, payload = await self._route(request)
+        except HttpError as e:
+            status, payload = e.status, {"error": e.message}
+        except Exception as e:
+            status, payload = 500, {"error": f"{type(e).__name__}: {e}"}
+        return status, _dumps(payload), "application/json"
+
+    async def _route(self, request: Request) -> Tuple[int, Any]:
+        path, method = request.path, request.method
+
+        if path == "/health":
+            self._allow(request, "GET")
+            return 200, {"status": "ok", "homes": sorted(self.homes), "startup": agent.startup_report()}
+
+        if path == "/tools":
+            self._allow(request, "GET")
+            return 200, {"tools": sorted(agent.TOOL_REGISTRY)}
+
+        home = self._home(request)
+
+        if path == "/command":
+            self._allow(request, "POST")
+            body = request.json()
+            message = body.get("message") if isinstance(body, dict) else None
+            if not isinstance(message, str) or not message.strip():
+                raise HttpError(400, 'Expected {"message": "<command>"}')
+            return 200, await self._run(agent.natural_language_command_agent, message, home)
+
+        if path.startswith("/tools/"):
+            self._allow(request, "POST")
+            name = path[len("/tools/"):]
+            if name not in agent.TOOL_REGISTRY:
+                raise HttpError(404, f"Unknown tool '{name}'")
+            args = request.json()
+            if not isinstance(args, dict):
+                raise HttpError(400, "Tool arguments must be a JSON object")
+            args = agent.normalize_args(args)
+            problem = agent.TOOL_SCHEMAS[name].check_args(args)
+            if problem is not None:
+                raise HttpError(400, problem)
+            try:
+                return 200, await self._run(agent.call_tool, name, args, home)
+            except ValueError as e:
+                # e.g. a timestamp argument pandas cannot parse
+                raise HttpError(400, f"Invalid argument: {e}")
+
+        if path == "/readings":
+            self._allow(request, "POST")
+            body = request.json()
+            readings = body.get("readings") if isinstance(body, dict) else body
+            if not isinstance(readings, list):
+                raise HttpError(400, 'Expected {"readings": [...]} or a list of readings')
+            # the whole payload is checked first: a 400 means nothing was applied
+            try:
+                parsed = await self._run(tools.parse_readings, readings)
+            except (KeyError, TypeError, ValueError) as e:
+                raise HttpError(400, f"Invalid reading: {e}")
+            return 200, await self._run(self._ingest, parsed, home)
+
+        raise HttpError(404, f"No route for {path}")
+
+    @staticmethod
+    def _allow(request: Request, method: str):
+        if request.method != method:
+            raise HttpError(405, f"{request.path} accepts {method} only")
+
+    def _home(self, request: Request) -> tools.Home:
+        home_id = request.query.get("home", tools.DEFAULT_HOME.home_id)
+        home = self.homes.get(home_id)
+        if home is None:
+            raise HttpError(404, f"Unknown home '{home_id}'")
+        return home
+
+    async def _run(self, fn, *args):
+        return await self._loop.run_in_executor(self._executor, fn, *args)
+
+    @staticmethod
+    def _ingest(readings: list, home: tools.Home) -> Dict[str, Any]:
+        with tools.use_home(home):
+            return tools.ingest_readings(readings)
+
+    # Device-state feed
+
+    def _subscribe(self, subscriber: _Subscriber):
+        self._subscribers.add(subscriber)
+        for home_id, home in self.homes.items():
+            if home_id not in self._listeners:
+                listener = self._listeners[home_id] = self._make_listener(home_id)
+                home.actuator.add_listener(listener)
+
+    def _unsubscribe(self, subscriber: _Subscriber):
+        self._subscribers.discard(subscriber)
+        if not self._subscribers:
+            for home_id in list(self._listeners):
+                self.homes[home_id].actuator.remove_listener(self._listeners.pop(home_id))
+
+    def _make_listener(self, home_id: str):
+        def on_change(applied, timestamp):
+            events = [{
+                "home": home_id,
+                "room": c.room,
+                "device": c.device,
+                "state": c.state,
+                "source": c.source,
+                "timestamp": str(timestamp),
+            } for c in applied]
+            self._loop.call_soon_threadsafe(self._publish, events)
+        return on_change
+
+    def _publish(self, events: list):
+        for subscriber in list(self._subscribers):
+            for event in events:
+                if subscriber.home_id is not None and event["home"] != subscriber.home_id:
+                    continue
+                try:
+                    subscriber.queue.put_nowait(event)
+                except asyncio.QueueFull:
+                    # too slow to keep up: end its stream, the client reconnects
+                    self._unsubscribe(subscriber)
+                    subscriber.close()
+                    metrics.inc("http_events_dropped_clients_total")
+                    break
+
+    async def _stream_events(self, request: Request, writer: asyncio.StreamWriter):
+        home_id = request.query.get("home")
+        if home_id is not None and home_id not in self.homes:
+            await self._send_json(writer, 404, {"error": f"Unknown home '{home_id}'"}, keep_alive=False)
+            return
+
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: text/event-stream\r\n"
+            b"Cache-Control: no-cache\r\n"
+            b"Connection: close\r\n"
+            b"\r\n"
+            b": connected\n\n"
+        )
+        await writer.drain()
+
+        subscriber = _Subscriber(asyncio.Queue(maxsize=self.event_queue_size), home_id)
+        self._subscribe(subscriber)
+        metrics.inc("http_requests_total", route="/events", status=200)
+        try:
+            while not subscriber.closed:
+                try:
+                    event = await asyncio.wait_for(subscriber.queue.get(), timeout=15.0)
+                except asyncio.TimeoutError:
+                    # comment line as heartbeat, also detects closed connections
+                    writer.write(b": keep-alive\n\n")
+                    await writer.drain()
+                    continue
+                if event is None or subscriber.closed:
+                    break
+                writer.write(b"event: device\ndata: " + _dumps(event) + b"\n\n")
+                await writer.drain()
+        finally:
+            self._unsubscribe(subscriber)
+
+
+def _dumps(payload: Any) -> bytes:
+    return json.dumps(payload, default=str).encode("utf-8")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=os.environ.get("HOME_AUTOMATION_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("HOME_AUTOMATION_PORT", "8080")))
+    parser.add_argument("--workers", type=int, default=8, help="threads for tool, command and ingest calls")
+    parser.add_argument("--llm-batch-size", type=int, default=int(os.environ.get("HOME_AUTOMATION_LLM_BATCH", "8") or 0),
+                        help="batch concurrent LLM calls up to this many prompts; 0 runs them one by one")
+    args = parser.parse_args()
+
+    agent.startup(warm_up_llm=os.environ.get("HOME_AUTOMATION_LLM_WARMUP", "1") != "0")
+    agent.use_llm_batching(args.llm_batch_size)
+    server = ApiServer(args.host, args.port, max_workers=args.workers)
+
+    async def run():
+        await server.start()
+        print(f"Listening on http://{server.host}:{server.port}")
+        await server.serve_forever()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+"""
+Offline benchmark suite for the sensor tools, the rule engine and the agent.
+
+    python benchmark.py --rows 1000000 --rules 10 1000 10000 --output bench.json
+
+A synthetic history in the sensor_data.csv schema (timestamp, room,
+sensor_name, value) is generated in a temporary directory. The suite times
+load_sensor_data (CSV and columnar cache), every query tool, check_rules at
+each rule count, extract_json on large outputs and the agent pipeline with
+llm.run_llm and llm.stream_llm replaced by stubs, so no model is needed. Results are written
+as JSON so runs can be diffed between releases.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+import metrics
+import tools
+import llm
+import agent
+
+SENSOR_SIGNALS = {
+    # name -> (baseline, daily amplitude, noise, decimals)
+    "temperature": (21.0, 5.0, 0.5, 2),
+    "light": (0.5, 0.45, 0.05, 3),
+    "motion": (0.2, 0.2, 0.3, 0),
+    "humidity": (45.0, 10.0, 2.0, 1),
+}
+
+
+def generate_sensor_csv(path: str, rooms: int = 3, sensors: int = 3, rows: int = 100_000,
+                        interval_seconds: int = 60, start: str = "2025-01-01", seed: int = 0) -> dict:
+    """Write a synthetic sensor history with about `rows` rows and return its shape"""
+    rng = np.random.default_rng(seed)
+    room_names = [f"room_{i}" for i in range(rooms)]
+    sensor_names = (list(SENSOR_SIGNALS) + [f"sensor_{i}" for i in range(sensors)])[:sensors]
+    steps = max(1, rows // (rooms * sensors))
+
+    ts = pd.Timestamp(start).value + np.arange(steps, dtype="int64") * interval_seconds * 1_000_000_000
+    day_phase = 2 * np.pi * ((ts // 1_000_000_000) % 86400) / 86400
+
+    frames = []
+    for room in room_names:
+        for sensor in sensor_names:
+            base, amp, noise, decimals = SENSOR_SIGNALS.get(sensor, (10.0, 5.0, 1.0, 2))
+            values = base + amp * np.sin(day_phase - np.pi / 2) + rng.normal(0, noise, steps)
+            if sensor == "motion":
+                values = (values > 0.5).astype(float)
+            frames.append(pd.DataFrame({
+                "timestamp": pd.to_datetime(ts),
+                "room": room,
+                "sensor_name": sensor,
+                "value": np.round(values, decimals),
+            }))
+
+    df = pd.concat(frames).sort_values("timestamp", kind="stable")
+    df.to_csv(path, index=False)
+    return {"rows": len(df), "rooms": room_names, "sensors": sensor_names,
+            "start": str(pd.Timestamp(ts[0])), "end": str(pd.Timestamp(ts[-1]))}
+
+
+def measure(fn, repeat: int = 5, warmup: int = 1) -> dict:
+    """Run fn repeatedly; timings in milliseconds"""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return {
+        "repeat": repeat,
+        "min_ms": round(min(samples), 4),
+        "median_ms": round(statistics.median(samples), 4),
+        "mean_ms": round(statistics.fmean(samples), 4),
+    }
+
+
+def reset_rules(home=None):
+    home = home or tools.current_home()
+    home.automation_rules.clear()
+    home.rule_index.clear()
+    home.device_states.clear()
+    home.actuator.reset()
+
+
+def add_random_rules(count: int, rooms, sensors, seed: int = 0):
+    rnd = random.Random(seed)
+    devices = ["fan", "heater", "light", "ac"]
+    for i in range(count):
+        sensor = rnd.choice(sensors)
+        base, amp, _, _ = SENSOR_SIGNALS.get(sensor, (10.0, 5.0, 1.0, 2))
+        tools.add_automation_rule(f"benchmark rule {i}", {
+            "room": rnd.choice(rooms),
+            "sensor_name": sensor,
+            "operator": rnd.choice([">", ">=", "<", "<="]),
+            "threshold_value": round(rnd.uniform(base - amp, base + amp), 2),
+            "device": rnd.choice(devices),
+            "state": rnd.choice(["on", "off"]),
+        })
+
+
+# Benchmarks
+
+def bench_load(csv_path: str, repeat: int) -> dict:
+    cache = csv_path + ".cache"
+
+    def from_csv():
+        tools.load_sensor_data(csv_path, use_cache=False)
+
+    def write_cache():
+        shutil.rmtree(cache, ignore_errors=True)
+        tools.load_sensor_data(csv_path, use_cache=True)
+
+    def from_cache():
+        assert tools.load_sensor_data(csv_path, use_cache=True)["source"] == "cache"
+
+    return {
+        "csv": measure(from_csv, repeat, warmup=0),
+        "csv_and_write_cache": measure(write_cache, repeat, warmup=0),
+        "cache": measure(from_cache, repeat),
+    }
+
+
+def bench_queries(shape: dict, repeat: int) -> dict:
+    room = shape["rooms"][0]
+    sensor = shape["sensors"][0]
+    start = pd.Timestamp(shape["start"])
+    end = pd.Timestamp(shape["end"])
+    mid = start + (end - start) / 2
+    window = (str(start), str(end))
+
+    calls = {
+        "get_latest_sensor_data": lambda: tools.get_latest_sensor_data(room, sensor),
+        "get_sensor_data_by_timestamp": lambda: tools.get_sensor_data_by_timestamp(room, sensor, str(start)),
+        "avg_sensor_data": lambda: tools.avg_sensor_data(room, sensor, *window),
+        "min_sensor_data": lambda: tools.min_sensor_data(room, sensor, *window),
+        "max_sensor_data": lambda: tools.max_sensor_data(room, sensor, *window),
+        "sum_sensor_data": lambda: tools.sum_sensor_data(room, sensor, *window),
+        "count_sensor_data": lambda: tools.count_sensor_data(room, sensor, *window),
+        "percentile_sensor_data": lambda: tools.percentile_sensor_data(room, sensor, *window, 95),
+        "avg_sensor_data_half_window": lambda: tools.avg_sensor_data(room, sensor, str(mid), str(end)),
+        "get_latest_sensor_data_time_filtered": lambda: tools.get_latest_sensor_data_time_filtered(
+            room, sensor, "evening"),
+        "avg_sensor_data_by_period": lambda: tools.avg_sensor_data_by_period(room, sensor, "morning", 30),
+        "list_automation_rules": tools.list_automation_rules,
+    }
+    return {name: measure(fn, repeat) for name, fn in calls.items()}
+
+
+def bench_rules(shape: dict, rule_counts, repeat: int) -> dict:
+    results = {}
+    for count in rule_counts:
+        reset_rules()
+        started = time.perf_counter()
+        add_random_rules(count, shape["rooms"], shape["sensors"])
+        add_ms = (time.perf_counter() - started) * 1000
+
+        results[str(count)] = {
+            "add_rules_ms": round(add_ms, 4),
+            "check_rules": measure(tools.check_rules, repeat),
+            "check_rules_evening": measure(lambda: tools.check_rules("evening"), repeat),
+            "backtest_rules": measure(tools.backtest_rules, max(1, repeat // 5), warmup=0),
+        }
+    reset_rules()
+    return results
+
+
+def _tool_call(i: int) -> dict:
+    return {"tool": "add_automation_rule", "args": {
+        "rule_text": f"if temperature in room_{i % 3} is above {20 + i % 10} turn on the fan " * 4,
+        "structured_rule": {"sensor_name": "temperature", "threshold_value": 20 + i % 10,
+                            "device": "fan", "state": "on", "room": f"room_{i % 3}"},
+    }}
+
+
+def bench_extract_json(repeat: int) -> dict:
+    single = json.dumps(_tool_call(0))
+    many = json.dumps([_tool_call(i) for i in range(200)])
+    # free text around the call, with other JSON-looking objects, as an
+    # unconstrained model would produce it
+    chatter = " ".join(json.dumps({"note": i, "detail": {"x": i}}) for i in range(500))
+    noisy = f"Let me think. {chatter}\nThe answer is:\n{single}\nDone."
+
+    return {
+        f"single_{len(single)}_chars": measure(lambda: agent.extract_json(single), repeat),
+        f"list_200_calls_{len(many)}_chars": measure(lambda: agent.extract_json(many), repeat),
+        f"noisy_{len(noisy)}_chars": measure(lambda: agent.extract_json(noisy), repeat),
+    }
+
+
+def bench_agent(shape: dict, repeat: int) -> dict:
+    room = shape["rooms"][0]
+    sensor = shape["sensors"][0]
+    canned = json.dumps({"tool": "avg_sensor_data", "args": {
+        "room": room, "sensor_name": sensor, "start_time": shape["start"], "end_time": shape["end"]}})
+    canned_plan = json.dumps([
+        {"tool": "get_latest_sensor_data", "args": {"room": r, "sensor_name": sensor}}
+        for r in shape["rooms"]
+    ])
+
+    real_run_llm, real_stream_llm = llm.run_llm, llm.stream_llm
+    try:
+        stub_output = canned
+        llm.run_llm = lambda prompt, prefix=None, tool_names=None, max_new_tokens=256: stub_output
+
+        def stub_stream(prompt, prefix=None, tool_names=None, max_new_tokens=256, stop_event=None):
+            # a few characters per piece, about one token each
+            for i in range(0, len(stub_output), 4):
+                yield stub_output[i:i + 4]
+
+        llm.stream_llm = stub_stream
+
+        def llm_path():
+            agent.COMMAND_CACHE.clear()
+            agent.natural_language_command_agent(f"average {sensor} in {room} over the whole history")
+
+        def cache_path():
+            agent.natural_language_command_agent(f"average {sensor} in {room} over the whole history")
+
+        def fast_path():
+            agent.natural_language_command_agent("list rules")
+
+        results = {
+            "llm_stub": measure(llm_path, repeat),
+            "command_cache": measure(cache_path, repeat),
+            "fast_path": measure(fast_path, repeat),
+        }
+
+        stub_output = canned_plan
+
+        def plan_path():
+            agent.COMMAND_CACHE.clear()
+            agent.natural_language_command_agent(f"latest {sensor} in every room and compare them")
+
+        results[f"llm_stub_plan_{len(shape['rooms'])}_calls"] = measure(plan_path, repeat)
+        return results
+    finally:
+        llm.run_llm, llm.stream_llm = real_run_llm, real_stream_llm
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--rooms", type=int, default=3)
+    parser.add_argument("--sensors", type=int, default=3)
+    parser.add_argument("--interval", type=int, default=60, help="seconds between readings")
+    parser.add_argument("--rules", type=int, nargs="+", default=[10, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    metrics.set_debug(False)
+    workdir = tempfile.mkdtemp(prefix="home_automation_bench_")
+    try:
+        csv_path = os.path.join(workdir, "sensor_data.csv")
+        started = time.perf_counter()
+        shape = generate_sensor_csv(csv_path, args.rooms, args.sensors, args.rows, args.interval, seed=args.seed)
+        print(f"Generated {shape['rows']} rows in {time.perf_counter() - started:.1f}s")
+
+        results = {
+            "environment": {
+                "python": sys.version.split()[0],
+                "platform": platform.platform(),
+                "numpy": np.__version__,
+                "pandas": pd.__version__,
+            },
+            "parameters": vars(args),
+            "data": shape,
+        }
+
+        print("Timing load_sensor_data ...")
+        results["load_sensor_data"] = bench_load(csv_path, max(1, args.repeat // 5))
+        print("Timing query tools ...")
+        results["query_tools"] = bench_queries(shape, args.repeat)
+        print("Timing check_rules ...")
+        results["rules"] = bench_rules(shape, args.rules, args.repeat)
+        print("Timing extract_json ...")
+        results["extract_json"] = bench_extract_json(args.repeat)
+        print("Timing agent pipeline (stub LLM) ...")
+        results["agent"] = bench_agent(shape, args.repeat)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    text = json.dumps(results, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Compare LLM inference backends on a fixed command set.
+
+    python benchmark_llm.py --backends fp32 int8 --output llm_benchmark.json
+
+Each backend runs in its own subprocess so memory is measured per backend.
+Reported per backend: load time, generated tokens/sec, mean latency, RSS right
+after loading (what the loaded model keeps resident), peak RSS (including
+transient loading buffers) and tool-call accuracy (tool name and expected args
+match).
+"""
+import argparse
+import gc
+import json
+import os
+import subprocess
+import sys
+import time
+
+# (command, expected tool, expected args subset)
+COMMANDS = [
+    ("turn on the bedroom light", "set_device_state",
+     {"room": "bedroom", "device": "light", "state": "on"}),
+    ("What is the latest temperature in the kitchen", "get_latest_sensor_data",
+     {"room": "kitchen", "sensor_name": "temperature"}),
+    ("if temperature is less than 15 in bedroom turn on heater", "add_automation_rule", {}),
+    ("When it's too hot in the living room, turn on the fan", "add_automation_rule", {}),
+    ("check rules for the evening", "check_rules", {"time_period": "evening"}),
+    ("show me all my automation rules", "list_automation_rules", {}),
+    ("what was the kitchen temperature this morning", "get_latest_sensor_data_time_filtered",
+     {"room": "kitchen", "sensor_name": "temperature", "time_period": "morning"}),
+    ("average living room temperature between 2025-01-01 06:00 and 2025-01-01 12:00", "avg_sensor_data",
+     {"room": "living_room", "sensor_name": "temperature"}),
+    ("switch off the kitchen fan", "set_device_state",
+     {"room": "kitchen", "device": "fan", "state": "off"}),
+    ("highest bedroom temperature on 2025-01-01", "max_sensor_data",
+     {"room": "bedroom", "sensor_name": "temperature"}),
+]
+
+
+def peak_rss_mb() -> float:
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on Linux, bytes on macOS
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    except ImportError:
+        import psutil
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss) / (1024 * 1024)
+
+
+def rss_mb() -> float:
+    """Current resident set size"""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / (1024 * 1024)
+    except ImportError:
+        with open("/proc/self/statm", "r") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+def _matches(tool_call, tool, expected_args) -> bool:
+    if not tool_call or tool_call.get("tool") != tool:
+        return False
+    args = tool_call.get("args") or {}
+    return all(args.get(k) == v for k, v in expected_args.items())
+
+
+def run_worker(backend: str) -> dict:
+    """Benchmark one backend in this process"""
+    import llm
+    import agent
+
+    llm.set_backend(backend)
+    started = time.perf_counter()
+    llm.load_model()
+    load_seconds = time.perf_counter() - started
+    gc.collect()
+    loaded_rss = rss_mb()
+    llm.warm_prefix(agent.PROMPT_PREFIX)
+
+    tool_names = list(agent.TOOL_REGISTRY)
+    tokens = 0
+    correct = 0
+    latencies = []
+
+    for command, tool, expected_args in COMMANDS:
+        prompt = agent.PROMPT_BUILDER.user_prompt(command)
+        t0 = time.perf_counter()
+        output = llm.run_llm(prompt, prefix=agent.PROMPT_PREFIX, tool_names=tool_names)
+        latencies.append(time.perf_counter() - t0)
+
+        tokens += len(llm.tokenizer(output, add_special_tokens=False).input_ids)
+        if _matches(agent.extract_json(output), tool, expected_args):
+            correct += 1
+
+    total = sum(latencies)
+    return {
+        "backend": backend,
+        "load_seconds": round(load_seconds, 2),
+        "tokens_per_second": round(tokens / total, 2) if total else 0.0,
+        "mean_latency_seconds": round(total / len(latencies), 3),
+        "rss_after_load_mb": round(loaded_rss, 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "tool_call_accuracy": correct / len(COMMANDS),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=["fp32", "int8"])
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        result = run_worker(args.worker)
+        print("BENCHMARK_RESULT " + json.dumps(result))
+        return
+
+    results = []
+    for backend in args.backends:
+        print(f"Benchmarking backend {backend} ...")
+        proc = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--worker", backend],
+            capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+        )
+        lines = [l for l in proc.stdout.splitlines() if l.startswith("BENCHMARK_RESULT ")]
+        if proc.returncode != 0 or not lines:
+            results.append({"backend": backend, "error": proc.stderr.strip()[-2000:]})
+            continue
+        results.append(json.loads(lines[-1][len("BENCHMARK_RESULT "):]))
+
+    baseline = next((r for r in results if r.get("backend") == "fp32" and "error" not in r), None)
+    for r in results:
+        if baseline and "error" not in r and r is not baseline:
+            r["speedup_vs_fp32"] = round(r["tokens_per_second"] / baseline["tokens_per_second"], 2) \
+                if baseline["tokens_per_second"] else None
+            r["rss_ratio_vs_fp32"] = round(r["rss_after_load_mb"] / baseline["rss_after_load_mb"], 2)
+            r["peak_rss_ratio_vs_fp32"] = round(r["peak_rss_mb"] / baseline["peak_rss_mb"], 2)
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import copy
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+import numpy as np
+
+# Cache of parsed tool calls for natural-language commands
+#
+# Maps normalized user text to the tool call extract_json produced for it
+# (never to the tool result, so a hit still runs the tool on live data).
+# Entries are evicted least-recently-used beyond max_entries and expire after
+# ttl_seconds. With an embedder (text -> vector) a miss on the exact text
+# falls back to the most similar cached command above similarity_threshold.
+# Commands run on several threads (api_server), so get/put hold a lock; the
+# embedder runs outside it.
+
+
+def normalize_command(text: str) -> str:
+    text = text.lower().replace("'", "")
+    text = re.sub(r"[^a-z0-9<>=.\-\s]", " ", text)
+    # a dot or minus belongs to a number ("-5", "17.5"); elsewhere it separates words
+    text = re.sub(r"\.(?!\d)|-(?!\.?\d)", " ", text)
+    return " ".join(text.split())
+
+
+class CommandCache:
+    def __init__(self, max_entries: int = 256, ttl_seconds: Optional[float] = 3600.0,
+                 embedder: Optional[Callable[[str], Any]] = None,
+                 similarity_threshold: float = 0.92,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.embedder = embedder
+        self.similarity_threshold = similarity_threshold
+        self._clock = clock
+        # normalized text -> (tool_call, expires_at, unit embedding or None)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.stats = {"hits": 0, "semantic_hits": 0, "misses": 0}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _embed(self, text: str) -> Optional[np.ndarray]:
+        if self.embedder is None:
+            return None
+        vec = np.asarray(self.embedder(text), dtype="float32").ravel()
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def _expired(self, expires_at: Optional[float], now: float) -> bool:
+        return expires_at is not None and now >= expires_at
+
+    def _evict_expired(self, now: float):
+        for key in [k for k, (_, exp, _) in self._entries.items() if self._expired(exp, now)]:
+            del self._entries[key]
+
+    def get(self, user_message: str) -> Optional[Dict[str, Any]]:
+        """Cached tool call for user_message (a copy), or None"""
+        key = normalize_command(user_message)
+        now = self._clock()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if not self._expired(entry[1], now):
+                    self._entries.move_to_end(key)
+                    self.stats["hits"] += 1
+                    return copy.deepcopy(entry[0])
+                del self._entries[key]
+            search = self.embedder is not None and bool(self._entries)
+
+        query = self._embed(key) if search else None
+        with self._lock:
+            if query is not None:
+                self._evict_expired(now)
+                keys = [k for k, e in self._entries.items() if e[2] is not None]
+                if keys:
+                    matrix = np.stack([self._entries[k][2] for k in keys])
+                    scores = matrix @ query
+                    best = int(np.argmax(scores))
+                    if scores[best] >= self.similarity_threshold:
+                        self._entries.move_to_end(keys[best])
+                        self.stats["semantic_hits"] += 1
+                        return copy.deepcopy(self._entries[keys[best]][0])
+
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, user_message: str, tool_call: Dict[str, Any]):
+        key = normalize_command(user_message)
+        tool_call = copy.deepcopy(tool_call)
+        vector = self._embed(key)
+        with self._lock:
+            expires_at = self._clock() + self.ttl_seconds if self.ttl_seconds is not None else None
+            self._entries[key] = (tool_call, expires_at, vector)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
@@ -0,0 +1,98 @@
+import torch
+from transformers import LogitsProcessor, StoppingCriteria
+
+from tool_call_grammar import ToolCallValidator
+
+# Grammar-constrained decoding for tool calls.
+# Only tokens that keep the output a valid prefix of a {"tool": ..., "args": {...}}
+# object, or of a list of them, are allowed, and generation stops as soon as
+# the object (or the list) closes.
+# Imported lazily by llm.py, together with the model.
+
+
+class ToolCallLogitsProcessor(LogitsProcessor):
+    """
+    Masks every candidate token that would break the tool-call grammar.
+    Candidates are checked in score order, first the top_k then a wider
+    window, so the cost per step stays small. Each batch row has its own validator.
+    """
+
+    def __init__(self, tokenizer, tool_names, prompt_len: int, batch_size: int = 1,
+                 top_k: int = 64, wide_k: int = 4096):
+        self.tokenizer = tokenizer
+        self.validators = [ToolCallValidator(tool_names) for _ in range(batch_size)]
+        self.prompt_len = prompt_len
+        self.consumed = 0
+        self.top_k = top_k
+        self.wide_k = wide_k
+
+    def _token_text(self, token_id: int) -> str:
+        return token_text(self.tokenizer, token_id)
+
+    def sync(self, input_ids):
+        """Feed the tokens generated since the last call into the validators"""
+        generated = input_ids[:, self.prompt_len + self.consumed:].tolist()
+        for validator, new_tokens in zip(self.validators, generated):
+            for token_id in new_tokens:
+                # finished rows are padded by generate(); ignore that
+                if not validator.done:
+                    validator.feed(self._token_text(token_id))
+        self.consumed = input_ids.shape[-1] - self.prompt_len
+
+    @property
+    def done(self):
+        return [v.done for v in self.validators]
+
+    def _allowed(self, validator, row_scores, k: int):
+        allowed = []
+        for token_id in torch.topk(row_scores, min(k, row_scores.shape[-1])).indices.tolist():
+            text = self._token_text(token_id)
+            if text and validator.copy().feed(text):
+                allowed.append(token_id)
+        return allowed
+
+    def __call__(self, input_ids, scores):
+        self.sync(input_ids)
+
+        eos = self.tokenizer.eos_token_id
+        mask = torch.full_like(scores, float("-inf"))
+        for row, validator in enumerate(self.validators):
+            if validator.done:
+                allowed = [eos]
+            else:
+                allowed = (self._allowed(validator, scores[row], self.top_k)
+                           or self._allowed(validator, scores[row], self.wide_k)
+                           or [eos])
+            mask[row, allowed] = 0
+        return scores + mask
+
+
+class ToolCallComplete(StoppingCriteria):
+    """Stops generation once the tool call (or list of tool calls) is closed"""
+
+    def __init__(self, processor: ToolCallLogitsProcessor):
+        self.processor = processor
+
+    def __call__(self, input_ids, scores, **kwargs):
+        self.processor.sync(input_ids)
+        return torch.tensor(self.processor.done, dtype=torch.bool, device=input_ids.device)
+
+
+_TOKEN_TEXT = {}
+
+
+def token_text(tokenizer, token_id: int) -> str:
+    text = _TOKEN_TEXT.get(token_id)
+    if text is None:
+        text = _TOKEN_TEXT[token_id] = tokenizer.decode([token_id])
+    return text
+
+
+class StopOnEvent(StoppingCriteria):
+    """Stops generation once event is set; llm.stream_llm uses it to abort from another thread"""
+
+    def __init__(self, event):
+        self.event = event
+
+    def __call__(self, input_ids, scores, **kwargs):
+        return torch.full((input_ids.shape[0],), self.event.is_set(), dtype=torch.bool, device=input_ids.device)
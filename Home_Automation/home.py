@@ -0,0 +1,118 @@
+import contextvars
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+from actuator import Actuator, Command
+from metrics import debug
+from rule_engine import RuleIndex
+from sensor_store import RetentionPolicy, SensorStore
+
+# Per-home state
+#
+# A Home owns everything the tools used to keep in module globals: the loaded
+# sensor data, the rules and their index, device states, the actuator and the
+# persistence log. The tools in tools.py act on current_home(), which is the
+# home installed with use_home() in the current context (thread or asyncio
+# task) and DEFAULT_HOME otherwise, so one process can serve many homes:
+#
+#     with use_home(homes["flat_12"]):
+#         tools.check_rules()
+#
+# Context variables do not cross into executor threads by themselves; code
+# that hands tool calls to a pool passes the home along (see agent.call_tool).
+
+# Clock used for "now" (time periods, action timestamps), shared by all homes.
+# None means wall-clock time; replay.SimulationClock can be installed with set_clock.
+CLOCK = None
+
+
+def set_clock(clock):
+    """Install a clock object with a now() -> pd.Timestamp method (None for wall-clock)"""
+    global CLOCK
+    CLOCK = clock
+
+
+def now() -> pd.Timestamp:
+    return pd.Timestamp.now() if CLOCK is None else CLOCK.now()
+
+
+class Home:
+    """Sensor data, rules and device states of one home"""
+
+    def __init__(self, home_id: str = "default"):
+        self.home_id = home_id
+        self.sensor_data: Optional[pd.DataFrame] = None
+        self.sensor_store: Optional[SensorStore] = None
+        self.automation_rules: List[Dict[str, Any]] = []
+        self.device_states: Dict[str, Dict[str, str]] = {}
+        self.rule_index = RuleIndex()
+        # sensor_store.RetentionPolicy; None keeps every raw reading
+        self.retention: Optional[RetentionPolicy] = None
+        # sensor time at which the policy is applied next (cutoffs are hour-aligned)
+        self.retention_due: Optional[int] = None
+        # persistence.StateLog for rule and device changes; None keeps them in memory only
+        self.state_log = None
+        # tools that change rules or device states hold this lock, so tool
+        # calls of one home can run on several threads
+        self.lock = threading.RLock()
+        # every device command goes through the actuator (see actuator.py)
+        self.actuator = Actuator(current=self.device_state, apply=self._apply_device_state, clock=now)
+
+    def __repr__(self):
+        return f"Home({self.home_id!r}, rules={len(self.automation_rules)})"
+
+    def device_state(self, room: str, device: str) -> Optional[str]:
+        return self.device_states.get(room, {}).get(device)
+
+    def _apply_device_state(self, room: str, device: str, state: str):
+        """Actually switch a device; only the actuator calls this"""
+        self.device_states.setdefault(room, {})[device] = state
+        self.log_change({"op": "device", "room": room, "device": device, "state": state})
+        where = "" if self.home_id == "default" else f"[{self.home_id}] "
+        debug(f" DEVICE ACTION: {where}{room}.{device} -> {state}")
+
+    def fire_rules(self, rules) -> Dict[str, List[str]]:
+        """
+        Send the actions of the given rules (rule_engine.CompiledRule) to the actuator
+        as one cycle; caller holds self.lock. Rules with a higher priority win a
+        device; between equal priorities the newest rule wins.
+        """
+        rules = sorted(rules, key=lambda r: r.rule_id)
+        commands = [Command(r.room, r.device, r.state, r.priority, source=f"rule:{r.rule_id}") for r in rules]
+        outcome = self.actuator.dispatch(commands)
+        return {
+            "rules_triggered": [f"{r.room}.{r.device} → {r.state} (rule: {r.rule_text[:50]}...)" for r in rules],
+            "actions": [f"{c.room}.{c.device} → {c.state}" for c in outcome["applied"]],
+            "actions_throttled": [f"{c.room}.{c.device} → {c.state} ({reason})" for c, reason in outcome["throttled"]]
+        }
+
+    def log_change(self, record: Dict[str, Any]):
+        """Append a change to the state log, compacting it when its tail gets long; caller holds self.lock"""
+        if self.state_log is None:
+            return
+        self.state_log.append(record)
+        if self.state_log.should_compact():
+            self.state_log.compact(self.automation_rules, self.device_states)
+
+
+DEFAULT_HOME = Home("default")
+
+_CURRENT_HOME: contextvars.ContextVar = contextvars.ContextVar("current_home", default=None)
+
+
+def current_home() -> Home:
+    home = _CURRENT_HOME.get()
+    return DEFAULT_HOME if home is None else home
+
+
+@contextmanager
+def use_home(home: Home):
+    """Make home the current home of this context for the duration of the block"""
+    token = _CURRENT_HOME.set(home)
+    try:
+        yield home
+    finally:
+        _CURRENT_HOME.reset(token)
@@ -0,0 +1,116 @@
+import re
+from typing import Optional, Tuple, Dict, Any, Iterable
+
+# Deterministic fast path in front of the LLM
+#
+# Short, well-structured commands ("list rules", "check rules evening",
+# "latest kitchen temperature", "turn on the bedroom light") are matched by
+# keyword classification. A command is routed only when every word is
+# accounted for (a known keyword or filler word); anything else falls through
+# to the LLM, so the router trades recall for precision.
+
+ROOMS = {"living_room", "bedroom", "kitchen"}
+ROOM_ALIASES = {"living room": "living_room", "livingroom": "living_room", "lounge": "living_room"}
+
+SENSORS = {"temperature": "temperature", "temp": "temperature", "light": "light", "motion": "motion"}
+DEVICES = {"light": "light", "lights": "light", "lamp": "light", "fan": "fan", "heater": "heater",
+           "ac": "ac", "aircon": "ac"}
+PERIODS = {"morning", "afternoon", "evening", "night"}
+STATES = {"on", "off"}
+
+FILLER = {"the", "a", "an", "in", "of", "for", "at", "on", "please", "me", "my", "is", "s",
+          "what", "whats", "tell", "show", "get", "give", "during", "this", "now", "all", "room"}
+QUERY_WORDS = {"latest", "current", "currently", "reading", "value", "level"}
+LIST_WORDS = {"list", "show"}
+CHECK_WORDS = {"check", "run", "evaluate"}
+SWITCH_WORDS = {"turn", "switch", "set"}
+RULE_WORDS = {"rules", "rule", "automation", "automations"}
+
+# words that mean the command needs the LLM (rules, ranges, aggregates)
+LLM_ONLY = {"if", "when", "whenever", "average", "avg", "mean", "between", "from", "until",
+            "minimum", "maximum", "min", "max", "total", "percentile", "median", "and", "or"}
+
+ROUTER_STATS: Dict[str, Any] = {"hits": 0, "misses": 0, "by_tool": {}}
+
+
+def register_rooms(rooms: Iterable[str]):
+    """Add rooms known from the loaded sensor data"""
+    ROOMS.update(rooms)
+
+
+def _tokenize(text: str):
+    text = text.lower().replace("'", "")
+    for alias, room in ROOM_ALIASES.items():
+        text = text.replace(alias, room)
+    return re.findall(r"[a-z0-9_]+", text)
+
+
+def _classify(tokens):
+    words = set(tokens)
+    if not words or words & LLM_ONLY:
+        return None
+
+    rooms = [t for t in tokens if t in ROOMS]
+    periods = [t for t in tokens if t in PERIODS]
+    if len(set(periods)) > 1 or len(set(rooms)) > 1:
+        return None
+    period = periods[0] if periods else None
+    room = rooms[0] if rooms else None
+
+    # list rules
+    if words & LIST_WORDS and words & RULE_WORDS and not rooms and not periods:
+        if words <= LIST_WORDS | RULE_WORDS | FILLER:
+            return "list_automation_rules", {}
+
+    # check rules [period]
+    if words & CHECK_WORDS and words & RULE_WORDS and not rooms:
+        if words <= CHECK_WORDS | RULE_WORDS | FILLER | PERIODS:
+            return "check_rules", ({"time_period": period} if period else {})
+
+    # turn on/off <room> <device>
+    if words & SWITCH_WORDS and room:
+        states = words & STATES
+        devices = {DEVICES[t] for t in tokens if t in DEVICES}
+        if len(states) == 1 and len(devices) == 1 and not periods:
+            if words <= SWITCH_WORDS | STATES | FILLER | set(DEVICES) | {room}:
+                return "set_device_state", {"room": room, "device": devices.pop(), "state": states.pop()}
+        return None
+
+    # latest [period] <room> <sensor>
+    sensors = {SENSORS[t] for t in tokens if t in SENSORS}
+    if room and len(sensors) == 1:
+        if words <= QUERY_WORDS | FILLER | PERIODS | set(SENSORS) | {room}:
+            args = {"room": room, "sensor_name": sensors.pop()}
+            if period:
+                args["time_period"] = period
+                return "get_latest_sensor_data_time_filtered", args
+            return "get_latest_sensor_data", args
+
+    return None
+
+
+def route(user_message: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """
+    Return (tool_name, args) for a confidently recognized command, or None
+    to fall back to the LLM. Updates ROUTER_STATS either way.
+    """
+    match = _classify(_tokenize(user_message))
+
+    if match is None:
+        ROUTER_STATS["misses"] += 1
+        return None
+
+    ROUTER_STATS["hits"] += 1
+    by_tool = ROUTER_STATS["by_tool"]
+    by_tool[match[0]] = by_tool.get(match[0], 0) + 1
+    return match
+
+
+def router_stats() -> Dict[str, Any]:
+    total = ROUTER_STATS["hits"] + ROUTER_STATS["misses"]
+    return {
+        "hits": ROUTER_STATS["hits"],
+        "misses": ROUTER_STATS["misses"],
+        "hit_rate": ROUTER_STATS["hits"] / total if total else 0.0,
+        "by_tool": dict(ROUTER_STATS["by_tool"])
+    }
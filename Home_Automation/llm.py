@@ -1,26 +1,284 @@
-from transformers import AutoTokenizer, AutoModelForCausalLM
-import torch
+import copy
+import os
+import threading
+import time
 from pathlib import Path
 
-# Define model path with Path and resolve (Update this path accordingy to your folder structure)
-MODEL_PATH = Path(r"E:\Home_Automation\qwen2.5_local").resolve() 
+import metrics
 
-print(f"Loading model from: {MODEL_PATH.as_posix()}")
+# The model is loaded lazily, on the first call that needs it (or by warm_up),
+# so importing this module does not import torch/transformers or read weights.
 
-tokenizer = AutoTokenizer.from_pretrained(str(MODEL_PATH.as_posix()))
-model = AutoModelForCausalLM.from_pretrained(
-    str(MODEL_PATH.as_posix()),
-    device_map="auto",
-    torch_dtype=torch.float16 if torch.cuda.is_available() else torch.float32,
-)
+# Model folder: HOME_AUTOMATION_MODEL_PATH, or qwen2.5_local next to this file
+MODEL_PATH = Path(
+    os.environ.get("HOME_AUTOMATION_MODEL_PATH", Path(__file__).resolve().parent / "qwen2.5_local")
+).resolve()
 
-print("Model loaded successfully.")
+# Inference backend (HOME_AUTOMATION_LLM_BACKEND):
+#   auto  float16 on CUDA, float32 on CPU
+#   fp32 / fp16 / bf16  that dtype
+#   int8  float32 weights with torch dynamic int8 quantization of every
+#         nn.Linear; CPU only, roughly 1/4 of the fp32 linear-layer memory
+BACKENDS = ("auto", "fp32", "fp16", "bf16", "int8")
+BACKEND = os.environ.get("HOME_AUTOMATION_LLM_BACKEND", "auto")
 
-def run_llm(prompt: str) -> str:
-    inputs = tokenizer(prompt, return_tensors="pt").to(model.device)
-    outputs = model.generate(**inputs, max_new_tokens=256)
-    decoded = tokenizer.decode(outputs[0], skip_special_tokens=True)
-    print("\n[RAW LLM OUTPUT]\n", decoded)  # <-- Add this debug print
+tokenizer = None
+model = None
+LOAD_SECONDS = None
+
+_LOAD_LOCK = threading.Lock()
+_WARMUP_THREAD = None
+
+# The model is not thread-safe: every forward pass (prefix warm-up, run_llm,
+# run_llm_batch, stream_llm) holds this lock, whichever caller it comes from
+# (agent, llm_server.BatchingLLMServer, benchmarks)
+MODEL_LOCK = threading.RLock()
+
+
+def set_backend(name: str):
+    """Select the inference backend; must be called before the model is loaded"""
+    global BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown LLM backend '{name}', expected one of {BACKENDS}")
+    if model is not None and name != BACKEND:
+        raise RuntimeError(f"Model already loaded with backend '{BACKEND}'")
+    BACKEND = name
+
+
+def _load_weights(torch, AutoModelForCausalLM):
+    path = str(MODEL_PATH.as_posix())
+
+    if BACKEND == "int8":
+        mdl = AutoModelForCausalLM.from_pretrained(path, device_map="cpu", torch_dtype=torch.float32)
+        # in place: a copy would hold the fp32 and int8 models at once while loading
+        return torch.ao.quantization.quantize_dynamic(mdl, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+    dtypes = {"fp32": torch.float32, "fp16": torch.float16, "bf16": torch.bfloat16}
+    dtype = dtypes.get(BACKEND, torch.float16 if torch.cuda.is_available() else torch.float32)
+    return AutoModelForCausalLM.from_pretrained(path, device_map="auto", torch_dtype=dtype)
+
+
+def load_model():
+    """Load tokenizer and weights once; safe to call from several threads"""
+    global tokenizer, model, LOAD_SECONDS
+
+    if model is not None:
+        return tokenizer, model
+
+    with _LOAD_LOCK:
+        if model is None:
+            started = time.perf_counter()
+
+            import torch
+            from transformers import AutoTokenizer, AutoModelForCausalLM
+
+            if BACKEND not in BACKENDS:
+                raise ValueError(f"Unknown LLM backend '{BACKEND}', expected one of {BACKENDS}")
+
+            print(f"Loading model from: {MODEL_PATH.as_posix()} (backend: {BACKEND})")
+
+            tok = AutoTokenizer.from_pretrained(str(MODEL_PATH.as_posix()))
+            mdl = _load_weights(torch, AutoModelForCausalLM)
+
+            # batched generation pads on the left so every row ends at the same position
+            tok.padding_side = "left"
+            if tok.pad_token is None:
+                tok.pad_token = tok.eos_token
+
+            tokenizer = tok
+            model = mdl
+            LOAD_SECONDS = time.perf_counter() - started
+            print(f"Model loaded successfully in {LOAD_SECONDS:.2f}s.")
+
+    return tokenizer, model
+
+
+def is_loaded() -> bool:
+    return model is not None
+
+
+def warm_up(prefix: str = None, background: bool = True):
+    """
+    Load the model, and the KV cache of prefix if given, before the first
+    request needs it. With background=True this runs on a daemon thread.
+    """
+    global _WARMUP_THREAD
+
+    def _work():
+        load_model()
+        if prefix is not None:
+            warm_prefix(prefix)
+
+    if not background:
+        _work()
+        return None
+
+    if _WARMUP_THREAD is None:
+        _WARMUP_THREAD = threading.Thread(target=_work, name="llm-warmup", daemon=True)
+        _WARMUP_THREAD.start()
+    return _WARMUP_THREAD
+
+
+# Prompt prefix cache: prefix text -> (prefix input_ids, past_key_values).
+# The static system instructions are encoded once; later requests only
+# prefill their own tokens on top of a copy of the cached key/values.
+_PREFIX_CACHE = {}
+
+
+def warm_prefix(prefix: str):
+    """Run the prefill for a static prompt prefix once and keep its KV cache"""
+    cached = _PREFIX_CACHE.get(prefix)
+    if cached is None:
+        import torch
+        load_model()
+        with MODEL_LOCK:
+            cached = _PREFIX_CACHE.get(prefix)
+            if cached is None:
+                prefix_ids = tokenizer(prefix, return_tensors="pt").input_ids.to(model.device)
+                with torch.no_grad():
+                    out = model(input_ids=prefix_ids, use_cache=True)
+                cached = (prefix_ids, out.past_key_values)
+                _PREFIX_CACHE[prefix] = cached
+    return cached
+
+
+def _constraint_kwargs(tool_names, prompt_len: int, batch_size: int = 1) -> dict:
+    """generate() kwargs that constrain decoding to a tool call or a list of tool calls"""
+    if not tool_names:
+        return {}
+
+    from transformers import LogitsProcessorList, StoppingCriteriaList
+    from constrained_decoding import ToolCallLogitsProcessor, ToolCallComplete
+
+    processor = ToolCallLogitsProcessor(tokenizer, tool_names, prompt_len, batch_size=batch_size)
+    return {
+        "logits_processor": LogitsProcessorList([processor]),
+        "stopping_criteria": StoppingCriteriaList([ToolCallComplete(processor)]),
+    }
+
+
+def _prepare(prompt: str, prefix: str, tool_names, max_new_tokens: int):
+    """input_ids of prefix + prompt and the generate() kwargs shared by run_llm and stream_llm"""
+    import torch
+
+    gen_kwargs = {"max_new_tokens": max_new_tokens}
+
+    with metrics.span("tokenize"):
+        if prefix is None:
+            input_ids = tokenizer(prompt, return_tensors="pt").input_ids.to(model.device)
+        else:
+            prefix_ids, prefix_kv = warm_prefix(prefix)
+            prompt_ids = tokenizer(prompt, return_tensors="pt", add_special_tokens=False).input_ids.to(model.device)
+            input_ids = torch.cat([prefix_ids, prompt_ids], dim=-1)
+            # generate() appends to the cache, so every request gets its own copy
+            gen_kwargs["past_key_values"] = copy.deepcopy(prefix_kv)
+
+    gen_kwargs.update(_constraint_kwargs(tool_names, input_ids.shape[-1]))
+    gen_kwargs["attention_mask"] = torch.ones_like(input_ids)
+    return input_ids, gen_kwargs
+
+
+def run_llm(prompt: str, prefix: str = None, tool_names=None, max_new_tokens: int = 256) -> str:
+    """
+    Generate a completion for prefix + prompt and return only the new text.
+    When prefix is given its past-key-values come from the prefix cache,
+    so only the tokens of prompt are prefilled.
+    When tool_names is given decoding is constrained to a
+    {"tool": <one of tool_names>, "args": {...}} object, or a list of them,
+    and stops when it closes.
+    """
+    load_model()
+    with MODEL_LOCK:
+        input_ids, gen_kwargs = _prepare(prompt, prefix, tool_names, max_new_tokens)
+        with metrics.span("generate"):
+            outputs = model.generate(input_ids=input_ids, **gen_kwargs)
+
+    new_tokens = outputs[0, input_ids.shape[-1]:]
+    metrics.inc("llm_prompt_tokens_total", input_ids.shape[-1])
+    metrics.inc("llm_generated_tokens_total", new_tokens.shape[-1])
+
+    with metrics.span("decode"):
+        decoded = tokenizer.decode(new_tokens, skip_special_tokens=True)
+    metrics.debug("\n[RAW LLM OUTPUT]\n", decoded)
     return decoded
 
 
+def stream_llm(prompt: str, prefix: str = None, tool_names=None, max_new_tokens: int = 256,
+               stop_event: threading.Event = None):
+    """
+    Like run_llm, but a generator of the new text, piece by piece, while
+    generate() runs on a background thread. Closing the generator, or
+    setting stop_event, stops generation after the current token; the
+    caller can act on a complete tool call without waiting for the rest.
+    """
+    from transformers import StoppingCriteriaList, TextIteratorStreamer
+    from constrained_decoding import StopOnEvent
+
+    load_model()
+    # held until generation has stopped, across the yields
+    with MODEL_LOCK:
+        input_ids, gen_kwargs = _prepare(prompt, prefix, tool_names, max_new_tokens)
+
+        stop_event = stop_event or threading.Event()
+        streamer = TextIteratorStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True)
+        criteria = gen_kwargs.pop("stopping_criteria", None) or StoppingCriteriaList()
+        criteria.append(StopOnEvent(stop_event))
+        errors = []
+
+        def _generate():
+            try:
+                model.generate(input_ids=input_ids, streamer=streamer, stopping_criteria=criteria, **gen_kwargs)
+            except BaseException as e:
+                errors.append(e)
+                # unblock the consumer
+                streamer.end()
+
+        metrics.inc("llm_prompt_tokens_total", input_ids.shape[-1])
+        metrics.inc("llm_streams_total")
+        started = time.perf_counter()
+        worker = threading.Thread(target=_generate, name="llm-stream", daemon=True)
+        worker.start()
+        first = True
+        try:
+            for piece in streamer:
+                if not piece:
+                    continue
+                if first:
+                    metrics.observe("llm_first_text_seconds", time.perf_counter() - started)
+                    first = False
+                yield piece
+        finally:
+            if worker.is_alive():
+                stop_event.set()
+                metrics.inc("llm_streams_aborted_total")
+            worker.join()
+            metrics.observe("llm_stream_seconds", time.perf_counter() - started)
+
+        if errors:
+            raise errors[0]
+
+
+def run_llm_batch(prompts, prefix: str = None, tool_names=None, max_new_tokens: int = 256):
+    """
+    Generate completions for several prompts in one left-padded batch.
+    Returns the new text of each prompt, in order. The prefix KV cache is
+    not used here: padding sits in front of the prefix, so each row is
+    encoded as prefix + prompt.
+    """
+    load_model()
+
+    texts = [(prefix or "") + p for p in prompts]
+    with metrics.span("tokenize", batch="1"):
+        enc = tokenizer(texts, return_tensors="pt", padding=True).to(model.device)
+    prompt_len = enc.input_ids.shape[-1]
+
+    gen_kwargs = {"max_new_tokens": max_new_tokens, "pad_token_id": tokenizer.pad_token_id}
+    gen_kwargs.update(_constraint_kwargs(tool_names, prompt_len, batch_size=len(texts)))
+
+    with MODEL_LOCK, metrics.span("generate", batch="1"):
+        outputs = model.generate(**enc, **gen_kwargs)
+    metrics.inc("llm_batches_total")
+    metrics.inc("llm_batch_rows_total", len(texts))
+
+    with metrics.span("decode", batch="1"):
+        return [tokenizer.decode(row[prompt_len:], skip_special_tokens=True) for row in outputs]
@@ -0,0 +1,154 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Sequence
+
+# Dynamic batching in front of llm.run_llm_batch
+#
+# Concurrent callers await generate(); their requests are queued and a single
+# worker collects them into batches of at most max_batch_size, waiting at most
+# max_wait_ms after the first request of a batch. Each batch runs in one
+# model.generate call on a dedicated thread (the model is not thread-safe),
+# and every caller gets back only its own completion.
+#
+# Threaded callers (agent.run_local_llm on the api_server worker pool) use
+# generate_blocking(), which submits to the same queue through an event loop
+# the server runs on its own daemon thread. llm.MODEL_LOCK is shared with the
+# unbatched run_llm/stream_llm paths, so a batch never overlaps them.
+
+
+class _Request:
+    __slots__ = ("prompt", "prefix", "tool_names", "future")
+
+    def __init__(self, prompt: str, prefix: Optional[str], tool_names: Optional[tuple], future):
+        self.prompt = prompt
+        self.prefix = prefix
+        self.tool_names = tool_names
+        self.future = future
+
+
+class BatchingLLMServer:
+    """
+    asyncio front-end that batches concurrent run_llm calls.
+    generate_batch(prompts, prefix=..., tool_names=...) -> List[str] defaults to
+    llm.run_llm_batch and can be replaced, e.g. by a stub for tests.
+    """
+
+    def __init__(self, max_batch_size: int = 8, max_wait_ms: float = 20.0,
+                 generate_batch: Optional[Callable[..., List[str]]] = None):
+        if generate_batch is None:
+            from llm import run_llm_batch
+            generate_batch = run_llm_batch
+
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.generate_batch = generate_batch
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[threading.Thread] = None
+        self._loop_guard = threading.Lock()
+        self.stats = {"requests": 0, "batches": 0, "max_batch": 0}
+
+    async def start(self):
+        if self._worker is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="llm-batch")
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+            self._executor.shutdown(wait=False)
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    async def generate(self, prompt: str, prefix: str = None,
+                       tool_names: Optional[Sequence[str]] = None) -> str:
+        await self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put(_Request(prompt, prefix, tuple(tool_names) if tool_names else None, future))
+        return await future
+
+    def generate_blocking(self, prompt: str, prefix: str = None,
+                          tool_names: Optional[Sequence[str]] = None, timeout: float = None) -> str:
+        """generate() for a caller that is not on an event loop; blocks the calling thread"""
+        future = asyncio.run_coroutine_threadsafe(self.generate(prompt, prefix, tool_names), self._thread_loop())
+        return future.result(timeout)
+
+    def _thread_loop(self) -> asyncio.AbstractEventLoop:
+        with self._loop_guard:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._loop_thread = threading.Thread(target=self._loop.run_forever, name="llm-batcher", daemon=True)
+                self._loop_thread.start()
+            return self._loop
+
+    def close(self):
+        """Stop the worker and the loop thread started by generate_blocking"""
+        with self._loop_guard:
+            loop, self._loop = self._loop, None
+        if loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self.stop(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        self._loop_thread.join()
+        loop.close()
+
+    async def _collect(self) -> List[_Request]:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+
+            # one generate call per distinct (prefix, tool_names) in the batch
+            groups = {}
+            for req in batch:
+                groups.setdefault((req.prefix, req.tool_names), []).append(req)
+
+            for (prefix, tool_names), reqs in groups.items():
+                prompts = [r.prompt for r in reqs]
+                try:
+                    outputs = await loop.run_in_executor(
+                        self._executor,
+                        lambda: self.generate_batch(prompts, prefix=prefix,
+                                                    tool_names=list(tool_names) if tool_names else None),
+                    )
+                except Exception as e:
+                    for r in reqs:
+                        if not r.future.done():
+                            r.future.set_exception(e)
+                    continue
+
+                for r, out in zip(reqs, outputs):
+                    if not r.future.done():
+                        r.future.set_result(out)
+
+                self.stats["requests"] += len(reqs)
+                self.stats["batches"] += 1
+                self.stats["max_batch"] = max(self.stats["max_batch"], len(reqs))
@@ -0,0 +1,217 @@
+import functools
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict, Tuple
+
+# In-process metrics: counters, latency histograms and timing spans
+#
+#   with span("generate"): ...            time a block
+#   @timed("tool")                        time every call of a function
+#   inc("commands_total", path="llm")     count something
+#
+# Every span feeds the histogram span_seconds{span=<name>, ...labels} and the
+# ring buffer of recent spans. to_prometheus() renders the Prometheus text
+# format, to_json() a dict for logs or an HTTP endpoint.
+#
+# Debug output goes through debug(), which is silent when HOME_AUTOMATION_DEBUG
+# is 0 (or after set_debug(False)); printing large LLM outputs is not free.
+
+PREFIX = "home_automation_"
+
+# histogram bucket upper bounds, in seconds
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+           1.0, 2.5, 5.0, 10.0, 30.0, 60.0, float("inf"))
+
+DEBUG = os.environ.get("HOME_AUTOMATION_DEBUG", "1") != "0"
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def set_debug(enabled: bool):
+    global DEBUG
+    DEBUG = enabled
+
+
+def debug(*args, **kwargs):
+    """print() that only prints while debug output is enabled"""
+    if DEBUG:
+        print(*args, **kwargs)
+
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram"""
+
+    __slots__ = ("counts", "sum", "count", "max")
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile"""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for bound, n in zip(BUCKETS, self.counts):
+            seen += n
+            if seen >= target:
+                return min(bound, self.max)
+        return self.max
+
+
+class MetricsRegistry:
+    def __init__(self, recent_spans: int = 1000):
+        self._lock = threading.Lock()
+        self.counters: Dict[str, Dict[LabelKey, float]] = {}
+        self.histograms: Dict[str, Dict[LabelKey, Histogram]] = {}
+        self.recent = deque(maxlen=recent_spans)
+
+    def inc(self, name: str, value: float = 1, /, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            family = self.counters.setdefault(name, {})
+            family[key] = family.get(key, 0) + value
+
+    def observe(self, name: str, value: float, /, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            family = self.histograms.setdefault(name, {})
+            hist = family.get(key)
+            if hist is None:
+                hist = family[key] = Histogram()
+            hist.observe(value)
+
+    @contextmanager
+    def span(self, name: str, /, **labels):
+        started = time.perf_counter()
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            self.observe("span_seconds", elapsed, span=name, **labels)
+            if error is not None:
+                self.inc("span_errors_total", span=name, error=error, **labels)
+            self.recent.append({
+                "span": name,
+                "labels": labels,
+                "start": time.time() - elapsed,
+                "seconds": elapsed,
+                "error": error,
+            })
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+            self.recent.clear()
+
+    # Export
+
+    def to_prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            for name, family in sorted(self.counters.items()):
+                metric = PREFIX + name
+                lines.append(f"# TYPE {metric} counter")
+                for key, value in sorted(family.items()):
+                    lines.append(f"{metric}{_render_labels(key)} {value:g}")
+
+            for name, family in sorted(self.histograms.items()):
+                metric = PREFIX + name
+                lines.append(f"# TYPE {metric} histogram")
+                for key, hist in sorted(family.items()):
+                    cumulative = 0
+                    for bound, n in zip(BUCKETS, hist.counts):
+                        cumulative += n
+                        le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                        lines.append(f"{metric}_bucket{_render_labels(key + (('le', le),))} {cumulative}")
+                    lines.append(f"{metric}_sum{_render_labels(key)} {hist.sum:.9g}")
+                    lines.append(f"{metric}_count{_render_labels(key)} {hist.count}")
+        return "\n".join(lines) + "\n"
+
+    def to_json(self, recent: int = 0) -> Dict[str, Any]:
+        with self._lock:
+            out = {
+                "counters": {
+                    name: [{"labels": dict(key), "value": value} for key, value in sorted(family.items())]
+                    for name, family in sorted(self.counters.items())
+                },
+                "histograms": {
+                    name: [
+                        {
+                            "labels": dict(key),
+                            "count": h.count,
+                            "sum": h.sum,
+                            "mean": h.sum / h.count if h.count else 0.0,
+                            "p50": h.quantile(0.5),
+                            "p95": h.quantile(0.95),
+                            "max": h.max,
+                        }
+                        for key, h in sorted(family.items())
+                    ]
+                    for name, family in sorted(self.histograms.items())
+                },
+            }
+            if recent:
+                out["recent_spans"] = list(self.recent)[-recent:]
+        return out
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _render_labels(key: LabelKey) -> str:
+    if not key:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in key) + "}"
+
+
+METRICS = MetricsRegistry()
+
+inc = METRICS.inc
+observe = METRICS.observe
+span = METRICS.span
+to_prometheus = METRICS.to_prometheus
+
+
+def to_json(recent: int = 0) -> Dict[str, Any]:
+    return METRICS.to_json(recent)
+
+
+def dumps(recent: int = 0) -> str:
+    return json.dumps(METRICS.to_json(recent), indent=2, default=str)
+
+
+def timed(span_name: str):
+    """Decorator: run every call of the function inside span(span_name, name=<function name>)"""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with METRICS.span(span_name, name=fn.__name__):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
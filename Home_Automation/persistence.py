@@ -0,0 +1,211 @@
+import atexit
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+# Durable store for automation rules and device states
+#
+# A directory with two files:
+#   snapshot.json  full state as of a log sequence number (seq)
+#   wal.jsonl      one JSON record per change made after that snapshot
+# Writers only queue a record; a flusher thread writes every queued record,
+# then fsyncs once per batch (group commit), so a burst of device actions
+# costs one fsync. flush() waits until everything queued so far is durable.
+# Recovery loads the snapshot and replays the log tail. compact() writes a
+# new snapshot and truncates the log, which keeps that tail short.
+#
+# Record shapes:
+#   {"seq": n, "op": "rule", "rule": {...}}                    a stored rule
+#   {"seq": n, "op": "device", "room", "device", "state"}      a device state
+
+SNAPSHOT_FILE = "snapshot.json"
+WAL_FILE = "wal.jsonl"
+SNAPSHOT_VERSION = 1
+
+
+def _fsync_dir(directory: str):
+    # makes renames durable; not supported on Windows
+    if hasattr(os, "O_DIRECTORY"):
+        fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+class StateLog:
+    """Append-only, group-committed log of rule and device-state changes"""
+
+    def __init__(self, directory: str, flush_interval_ms: float = 10.0, compact_every: int = 2000):
+        self.directory = directory
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.compact_every = compact_every
+        os.makedirs(directory, exist_ok=True)
+
+        self._cond = threading.Condition()
+        self._pending: List[str] = []
+        self._seq = 0            # last sequence number handed out
+        self._durable_seq = 0    # last sequence number known to be on disk
+        self._tail_records = 0   # records in the log since the last snapshot
+        self._closed = False
+        self._flush_requested = False
+        self._wal = None
+        self._flusher: Optional[threading.Thread] = None
+        self.stats = {"records": 0, "fsyncs": 0, "compactions": 0}
+
+    # Recovery
+
+    def recover(self) -> Tuple[List[Dict[str, Any]], Dict[str, Dict[str, str]]]:
+        """Rebuild (rules, device_states) from the snapshot and the log tail, then open the log"""
+        rules: List[Dict[str, Any]] = []
+        device_states: Dict[str, Dict[str, str]] = {}
+        seq = 0
+
+        snapshot_path = os.path.join(self.directory, SNAPSHOT_FILE)
+        if os.path.exists(snapshot_path):
+            with open(snapshot_path, "r", encoding="utf-8") as f:
+                snapshot = json.load(f)
+            seq = snapshot.get("seq", 0)
+            rules = snapshot.get("rules", [])
+            device_states = snapshot.get("device_states", {})
+
+        tail = 0
+        wal_path = os.path.join(self.directory, WAL_FILE)
+        if os.path.exists(wal_path):
+            with open(wal_path, "r+b") as f:
+                valid_end = 0
+                for line in f:
+                    try:
+                        if not line.endswith(b"\n"):
+                            raise ValueError("incomplete record")
+                        record = json.loads(line)
+                    except ValueError:
+                        # torn write at the end of the log: cut it off so new
+                        # records do not land on the same line
+                        f.truncate(valid_end)
+                        break
+                    valid_end += len(line)
+                    if record.get("seq", 0) <= seq:
+                        continue
+                    seq = record["seq"]
+                    tail += 1
+                    if record.get("op") == "rule":
+                        rules.append(record["rule"])
+                    elif record.get("op") == "device":
+                        device_states.setdefault(record["room"], {})[record["device"]] = record["state"]
+
+        self._seq = self._durable_seq = seq
+        self._tail_records = tail
+        self._open()
+        return rules, device_states
+
+    def _open(self):
+        if self._wal is None:
+            self._wal = open(os.path.join(self.directory, WAL_FILE), "a", encoding="utf-8")
+            self._flusher = threading.Thread(target=self._run, name="state-log-flush", daemon=True)
+            self._flusher.start()
+            atexit.register(self.close)
+
+    # Writing
+
+    def append(self, record: Dict[str, Any], wait: bool = False) -> int:
+        """Queue a record for the next group commit. Returns its seq"""
+        with self._cond:
+            if self._wal is None:
+                raise RuntimeError("StateLog is not open; call recover() first")
+            self._seq += 1
+            seq = self._seq
+            self._pending.append(json.dumps(dict(record, seq=seq), default=str))
+            self._tail_records += 1
+            self._cond.notify_all()
+            if wait:
+                while self._durable_seq < seq:
+                    self._cond.wait()
+        return seq
+
+    def flush(self):
+        """Block until every record queued so far is on disk"""
+        with self._cond:
+            target = self._seq
+            if self._pending:
+                self._flush_requested = True
+            self._cond.notify_all()
+            while self._durable_seq < target and self._wal is not None:
+                self._cond.wait()
+
+    def _write_batch(self):
+        """Write and fsync the queued records; caller holds self._cond"""
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        self._flush_requested = False
+        self._wal.write("\n".join(batch) + "\n")
+        self._wal.flush()
+        os.fsync(self._wal.fileno())
+        self._durable_seq = self._seq
+        self.stats["records"] += len(batch)
+        self.stats["fsyncs"] += 1
+        self._cond.notify_all()
+
+    def _run(self):
+        with self._cond:
+            while not self._closed:
+                if not self._pending:
+                    self._cond.wait()
+                    continue
+                # let a burst accumulate, then commit it as one batch
+                deadline = time.monotonic() + self.flush_interval
+                while not (self._closed or self._flush_requested):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if self._wal is not None:
+                    self._write_batch()
+
+    # Compaction
+
+    def should_compact(self) -> bool:
+        return self._tail_records >= self.compact_every
+
+    def compact(self, rules: List[Dict[str, Any]], device_states: Dict[str, Dict[str, str]]):
+        """
+        Replace the snapshot with the given state and truncate the log.
+        The state must include every record appended so far, so callers hold
+        the lock that serializes their writes.
+        """
+        with self._cond:
+            self._write_batch()
+            snapshot = {
+                "version": SNAPSHOT_VERSION,
+                "seq": self._seq,
+                "rules": rules,
+                "device_states": device_states,
+            }
+            tmp_path = os.path.join(self.directory, SNAPSHOT_FILE + ".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f, default=str)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, os.path.join(self.directory, SNAPSHOT_FILE))
+            _fsync_dir(self.directory)
+
+            # records up to seq are in the snapshot, so the log can start over
+            self._wal.close()
+            self._wal = open(os.path.join(self.directory, WAL_FILE), "w", encoding="utf-8")
+            self._tail_records = 0
+            self.stats["compactions"] += 1
+
+    def close(self):
+        with self._cond:
+            if self._wal is None:
+                return
+            self._write_batch()
+            self._closed = True
+            self._wal.close()
+            self._wal = None
+            self._cond.notify_all()
+        if self._flusher is not None and self._flusher is not threading.current_thread():
+            self._flusher.join(timeout=1.0)
@@ -0,0 +1,199 @@
+import inspect
+import re
+import typing
+from typing import Any, Callable, Dict, List, Optional, Sequence, Union
+
+# Prompt builder with a tool-schema registry
+#
+# The tool specs in the system prompt are generated from the signatures of
+# the tool functions (unwrapped through @timed/@_locked via __wrapped__), so
+# the dispatcher registry, the allowed tool names and the prompt cannot drift
+# apart. The rest of the prompt is a list of hand-written sections.
+#
+# Two modes:
+#   full     every section, tool specs with argument types
+#   compact  only the sections marked compact, whitespace collapsed and tool
+#            specs without the string types; a shorter prefix is a cheaper
+#            prefill and a shorter attention span for every generated token
+#
+# report() counts the tokens of each section and of a whole prompt, with the
+# model tokenizer when one is given and a character-class estimate otherwise.
+
+# annotation -> type name shown to the model
+TYPE_NAMES = {
+    str: "string",
+    int: "number",
+    float: "number",
+    bool: "boolean",
+    dict: "object",
+    list: "array",
+    Any: "any",
+}
+
+# placeholder section text: replaced by the generated tool specs
+TOOL_SPECS = None
+
+
+def _type_name(annotation) -> str:
+    if annotation is inspect.Parameter.empty:
+        return "any"
+    origin = typing.get_origin(annotation)
+    if origin is Union:
+        # Optional[X] is X; optionality comes from the default value
+        args = [a for a in typing.get_args(annotation) if a is not type(None)]
+        return _type_name(args[0]) if len(args) == 1 else "any"
+    return TYPE_NAMES.get(origin or annotation, "any")
+
+
+class ToolParam:
+    __slots__ = ("name", "type", "required")
+
+    def __init__(self, name: str, type: str, required: bool):
+        self.name = name
+        self.type = type
+        self.required = required
+
+    def render(self, compact: bool) -> str:
+        if compact:
+            # string is the default type; only the others are spelled out
+            text = self.name + ("" if self.required else "?")
+            return text if self.type == "string" else f"{text}:{self.type}"
+        text = f"{self.name}: {self.type}"
+        return text if self.required else text + " (optional)"
+
+
+class ToolSchema:
+    """Name and parameters of one tool, read from its function signature"""
+
+    __slots__ = ("name", "params", "extra_args")
+
+    def __init__(self, name: str, params: List[ToolParam], extra_args: bool = False):
+        self.name = name
+        self.params = params
+        # the function takes **kwargs
+        self.extra_args = extra_args
+
+    @classmethod
+    def from_function(cls, name: str, fn: Callable) -> "ToolSchema":
+        signature = inspect.signature(inspect.unwrap(fn))
+        hints = typing.get_type_hints(inspect.unwrap(fn))
+        params = [
+            ToolParam(p.name, _type_name(hints.get(p.name, p.annotation)), p.default is inspect.Parameter.empty)
+            for p in signature.parameters.values()
+            if p.kind in (p.POSITIONAL_OR_KEYWORD, p.KEYWORD_ONLY)
+        ]
+        extra = any(p.kind == p.VAR_KEYWORD for p in signature.parameters.values())
+        return cls(name, params, extra)
+
+    def check_args(self, args: Dict[str, Any]) -> Optional[str]:
+        """Why args cannot be passed to the tool (missing or unexpected names), or None"""
+        names = {p.name for p in self.params}
+        missing = [p.name for p in self.params if p.required and p.name not in args]
+        if missing:
+            return f"{self.name} is missing required argument(s): {', '.join(missing)}"
+        unexpected = [] if self.extra_args else sorted(set(args) - names)
+        if unexpected:
+            return f"{self.name} got unexpected argument(s): {', '.join(unexpected)}"
+        return None
+
+    def render_params(self, compact: bool) -> str:
+        return ("," if compact else ", ").join(p.render(compact) for p in self.params)
+
+
+def build_registry(functions: Dict[str, Callable]) -> Dict[str, ToolSchema]:
+    """name -> ToolSchema for a name -> function dispatch table, in its order"""
+    return {name: ToolSchema.from_function(name, fn) for name, fn in functions.items()}
+
+
+def render_tool_specs(schemas: Dict[str, ToolSchema], compact: bool = False) -> str:
+    """One line per distinct parameter list; tools that share one share the line"""
+    groups: Dict[str, List[str]] = {}
+    for schema in schemas.values():
+        groups.setdefault(schema.render_params(compact), []).append(schema.name)
+    if compact:
+        return "TOOLS:\n" + "\n".join(f"{'|'.join(names)}({params})" for params, names in groups.items())
+    return "TOOL SPECS:\n" + "\n".join(f"• {' / '.join(names)}({params})" for params, names in groups.items())
+
+
+class PromptSection:
+    """A block of the system prompt; text TOOL_SPECS stands for the generated specs"""
+
+    __slots__ = ("name", "text", "compact")
+
+    def __init__(self, name: str, text: Optional[str], compact: bool = True):
+        self.name = name
+        self.text = text
+        # kept in compact mode
+        self.compact = compact
+
+
+def _compact_text(text: str) -> str:
+    lines = (re.sub(r"[ \t]+", " ", line).strip() for line in text.splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+# words and numbers are about one token each (long ones more), symbols one each
+_TOKEN_PIECES = re.compile(r"[A-Za-z]+|\d+|[^\sA-Za-z\d]")
+
+
+def estimate_tokens(text: str) -> int:
+    return sum(1 + len(piece) // 8 for piece in _TOKEN_PIECES.findall(text))
+
+
+def count_tokens(text: str, tokenizer=None) -> int:
+    if tokenizer is None:
+        return estimate_tokens(text)
+    return len(tokenizer(text, add_special_tokens=False).input_ids)
+
+
+class PromptBuilder:
+    """Builds the static prompt prefix and the per-request prompt"""
+
+    def __init__(self, schemas: Dict[str, ToolSchema], sections: Sequence[PromptSection],
+                 compact: bool = False, request_suffix: str = "Respond ONLY in JSON with keys: tool, args"):
+        self.schemas = schemas
+        self.sections = list(sections)
+        self.compact = compact
+        self.request_suffix = request_suffix
+
+    def section_texts(self) -> Dict[str, str]:
+        """name -> rendered text of every section used in this mode"""
+        texts = {}
+        for section in self.sections:
+            if self.compact and not section.compact:
+                continue
+            if section.text is TOOL_SPECS:
+                text = render_tool_specs(self.schemas, self.compact)
+            else:
+                text = _compact_text(section.text) if self.compact else section.text.strip("\n")
+            texts[section.name] = text
+        return texts
+
+    def system_instructions(self) -> str:
+        return ("\n" if self.compact else "\n\n").join(self.section_texts().values())
+
+    def prefix(self) -> str:
+        """Static head of every prompt; llm.py caches its KV"""
+        if self.compact:
+            return f"{self.system_instructions()}\nUser request:\n"
+        return f"\n{self.system_instructions()}\n\nUser request:\n"
+
+    def user_prompt(self, user_message: str) -> str:
+        """The part after prefix() for one request"""
+        if self.compact:
+            return f"{user_message}\n{self.request_suffix}\n"
+        return f"{user_message}\n\n{self.request_suffix}\n"
+
+    def report(self, user_message: str = None, tokenizer=None) -> Dict[str, Any]:
+        """Token counts per section, of the prefix and of the prompt for user_message"""
+        sections = {name: count_tokens(text, tokenizer) for name, text in self.section_texts().items()}
+        report = {
+            "mode": "compact" if self.compact else "full",
+            "counted_with": "estimate" if tokenizer is None else "tokenizer",
+            "sections": sections,
+            "prefix_tokens": count_tokens(self.prefix(), tokenizer),
+        }
+        if user_message is not None:
+            report["request_tokens"] = count_tokens(self.user_prompt(user_message), tokenizer)
+            report["prompt_tokens"] = report["prefix_tokens"] + report["request_tokens"]
+        return report
@@ -0,0 +1,260 @@
+import operator
+from bisect import bisect_left, bisect_right
+from typing import Dict, Any, List, Tuple
+
+# Compiled rule engine
+#
+# add_automation_rule compiles each stored rule once into a CompiledRule with
+# a fixed comparison operator. Rules are indexed by (room, sensor_name) and,
+# within a sensor, by operator with thresholds kept sorted. Evaluating a sensor
+# value against all of its rules is then a bisect per operator, so check_rules
+# costs O(distinct sensors * log rules) plus the number of rules that fire.
+#
+# For streaming ingestion each bucket also remembers which index range was
+# satisfied last time, so evaluate_edges only returns rules whose predicate
+# went from false to true (O(log rules + edges) per reading).
+#
+# check_rules reads the current value of each (room, sensor_name) once and
+# hands them to evaluate_groups, one bisect per operator bucket of each group.
+
+OPERATORS = {
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+    "==": operator.eq,
+}
+
+OPERATOR_ALIASES = {
+    "gt": ">", "above": ">", "greater_than": ">",
+    "ge": ">=", "gte": ">=",
+    "lt": "<", "below": "<", "less_than": "<",
+    "le": "<=", "lte": "<=",
+    "eq": "==", "=": "==",
+}
+
+OP_CODES = {op: code for code, op in enumerate(OPERATORS)}
+
+DEFAULT_ROOM = "living_room"
+
+
+class CompiledRule:
+    """Normalized predicate `value <op> threshold` on one sensor plus its action"""
+
+    __slots__ = ("rule_id", "rule_text", "room", "sensor_name", "op", "threshold", "device", "state",
+                 "priority")
+
+    def __init__(self, rule_id: int, rule_text: str, room: str, sensor_name: str,
+                 op: str, threshold: float, device: str, state: str, priority: int = 0):
+        self.rule_id = rule_id
+        self.rule_text = rule_text
+        self.room = room
+        self.sensor_name = sensor_name
+        self.op = op
+        self.threshold = threshold
+        self.device = device
+        self.state = state
+        self.priority = priority
+
+    @property
+    def key(self) -> Tuple[str, str]:
+        return self.room, self.sensor_name
+
+    def matches(self, value: float) -> bool:
+        return OPERATORS[self.op](value, self.threshold)
+
+    def __repr__(self):
+        return (f"CompiledRule({self.rule_id}: {self.room}.{self.sensor_name} {self.op} "
+                f"{self.threshold} -> {self.device}={self.state})")
+
+
+def normalize_operator(op: str) -> str:
+    op = str(op).strip().lower()
+    op = OPERATOR_ALIASES.get(op, op)
+    if op not in OPERATORS:
+        raise ValueError(f"Unsupported comparison operator '{op}'")
+    return op
+
+
+def compile_rule(rule_id: int, rule_text: str, structured: Dict[str, Any]) -> CompiledRule:
+    """
+    Normalize the accepted structured_rule shapes into one CompiledRule.
+    Raises ValueError if the rule cannot be compiled.
+
+    Flat:      {"sensor_name", "threshold_value", "device", "state", "room"?, "operator"?}
+    Condition: {"condition": {"sensor": {"room", "sensor_name"}, "comparison_operator", "value"},
+                "actions": [{"device", "state"}]}
+    Both may carry a "priority" (default 0) used when rules command the same device.
+    """
+    if "condition" in structured:
+        cond = structured["condition"] or {}
+        sensor_info = cond.get("sensor", {})
+        actions = structured.get("actions") or [{}]
+        room = sensor_info.get("room", DEFAULT_ROOM)
+        sensor_name = sensor_info.get("sensor_name", "temperature")
+        op = cond.get("comparison_operator", cond.get("operator", ">"))
+        threshold = cond.get("value")
+        device = actions[0].get("device")
+        state = actions[0].get("state")
+    else:
+        room = structured.get("room", DEFAULT_ROOM)
+        sensor_name = structured.get("sensor_name")
+        op = structured.get("comparison_operator", structured.get("operator", ">"))
+        threshold = structured.get("threshold_value")
+        device = structured.get("device")
+        state = structured.get("state")
+
+    if not sensor_name or not device or not state:
+        raise ValueError("Rule needs a sensor_name, device and state")
+
+    try:
+        threshold = float(threshold)
+    except (TypeError, ValueError):
+        raise ValueError(f"threshold must be a number, got {threshold!r}")
+
+    try:
+        priority = int(structured.get("priority", 0))
+    except (TypeError, ValueError):
+        raise ValueError(f"priority must be an integer, got {structured.get('priority')!r}")
+
+    return CompiledRule(rule_id, rule_text, room, sensor_name, normalize_operator(op),
+                        threshold, device, state, priority)
+
+
+class _ThresholdBucket:
+    """Rules sharing one sensor and one operator, sorted by threshold"""
+
+    __slots__ = ("op", "thresholds", "rules", "last_range", "pending")
+
+    def __init__(self, op: str):
+        self.op = op
+        self.thresholds: List[float] = []
+        self.rules: List[CompiledRule] = []
+        # satisfied [lo, hi) at the last edge evaluation, None before the first one
+        self.last_range = None
+        # rules added since the last edge evaluation; they start out inactive
+        self.pending: List[CompiledRule] = []
+
+    def add(self, rule: CompiledRule) -> int:
+        pos = bisect_right(self.thresholds, rule.threshold)
+        self.thresholds.insert(pos, rule.threshold)
+        self.rules.insert(pos, rule)
+
+        if self.last_range is not None:
+            lo, hi = self.last_range
+            if pos <= lo:
+                lo, hi = lo + 1, hi + 1
+            elif pos < hi:
+                hi += 1
+            self.last_range = (lo, hi)
+            self.pending.append(rule)
+        return pos
+
+    def match_range(self, value: float) -> Tuple[int, int]:
+        """Index range [lo, hi) of rules whose predicate holds for value"""
+        th = self.thresholds
+        op = self.op
+        if op == ">":
+            return 0, bisect_left(th, value)
+        if op == ">=":
+            return 0, bisect_right(th, value)
+        if op == "<":
+            return bisect_right(th, value), len(th)
+        if op == "<=":
+            return bisect_left(th, value), len(th)
+        return bisect_left(th, value), bisect_right(th, value)
+
+    def matching(self, value: float) -> List[CompiledRule]:
+        lo, hi = self.match_range(value)
+        return self.rules[lo:hi]
+
+    def rising(self, value: float) -> List[CompiledRule]:
+        """Rules satisfied by value that were not satisfied at the previous call"""
+        lo, hi = self.match_range(value)
+        rules = self.rules
+
+        if self.last_range is None:
+            edges = rules[lo:hi]
+        else:
+            old_lo, old_hi = self.last_range
+            edges = rules[lo:min(hi, old_lo)] + rules[max(lo, old_hi):hi]
+            if self.pending:
+                seen = {r.rule_id for r in edges}
+                edges.extend(r for r in self.pending if r.rule_id not in seen and r.matches(value))
+
+        self.last_range = (lo, hi)
+        self.pending = []
+        return edges
+
+    def reset_edges(self):
+        """Forget the last edge evaluation; the next value's matches all count as rising"""
+        self.last_range = None
+        self.pending = []
+
+
+class RuleIndex:
+    """Compiled rules grouped by (room, sensor_name) and operator"""
+
+    def __init__(self):
+        self._groups: Dict[Tuple[str, str], Dict[str, _ThresholdBucket]] = {}
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def add(self, rule: CompiledRule):
+        buckets = self._groups.setdefault(rule.key, {})
+        bucket = buckets.get(rule.op)
+        if bucket is None:
+            bucket = buckets[rule.op] = _ThresholdBucket(rule.op)
+        bucket.add(rule)
+        self._count += 1
+
+    def clear(self):
+        self._groups.clear()
+        self._count = 0
+
+    def keys(self):
+        return self._groups.keys()
+
+    def reset_edges(self):
+        """Forget the edge state of every bucket, e.g. before replaying a new recording"""
+        for buckets in self._groups.values():
+            for bucket in buckets.values():
+                bucket.reset_edges()
+
+    def rules(self) -> List[CompiledRule]:
+        out = [r for buckets in self._groups.values() for b in buckets.values() for r in b.rules]
+        out.sort(key=lambda r: r.rule_id)
+        return out
+
+    def evaluate(self, room: str, sensor_name: str, value: float) -> List[CompiledRule]:
+        """All rules on (room, sensor_name) satisfied by value"""
+        buckets = self._groups.get((room, sensor_name))
+        if not buckets:
+            return []
+        matched = []
+        for bucket in buckets.values():
+            matched.extend(bucket.matching(value))
+        return matched
+
+    def evaluate_groups(self, values: Dict[Tuple[str, str], float]) -> List[CompiledRule]:
+        """
+        Rules satisfied by the current value of their (room, sensor_name) in
+        values; groups without a value (missing or NaN) match nothing.
+        """
+        matched = []
+        for (room, sensor_name), value in values.items():
+            if value == value:
+                matched.extend(self.evaluate(room, sensor_name, value))
+        return matched
+
+    def evaluate_edges(self, room: str, sensor_name: str, value: float) -> List[CompiledRule]:
+        """Rules on (room, sensor_name) that became satisfied with this new value"""
+        buckets = self._groups.get((room, sensor_name))
+        if not buckets:
+            return []
+        rising = []
+        for bucket in buckets.values():
+            rising.extend(bucket.rising(value))
+        return rising
@@ -0,0 +1,129 @@
+import json
+import os
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from sensor_store import SensorStore, SensorSeries
+
+# Columnar on-disk cache for sensor CSVs
+#
+# Stored next to the CSV as <csv>.cache/ with one .npy file per column:
+#   timestamp.npy    int64 ns since epoch
+#   room.npy         dictionary codes into meta["rooms"]
+#   sensor_name.npy  dictionary codes into meta["sensor_names"]
+#   value.npy        float64, as read from the CSV, so queries on a cached
+#                    load return exactly what the CSV path returns
+# Rows are grouped by (room, sensor_name) and time-sorted within a group, and
+# meta["groups"] holds each group's [start, end) so SensorSeries can be views
+# straight into the memory-mapped arrays. The cache is valid while the CSV's
+# mtime and size match the ones recorded in meta.json.
+
+CACHE_VERSION = 2
+COLUMNS = ("timestamp", "room", "sensor_name", "value")
+
+
+def cache_dir(csv_path: str) -> str:
+    return csv_path + ".cache"
+
+
+def _csv_signature(csv_path: str) -> dict:
+    st = os.stat(csv_path)
+    return {"csv_mtime_ns": st.st_mtime_ns, "csv_size": st.st_size}
+
+
+def _read_meta(directory: str) -> Optional[dict]:
+    try:
+        with open(os.path.join(directory, "meta.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def is_fresh(csv_path: str) -> bool:
+    meta = _read_meta(cache_dir(csv_path))
+    if meta is None or meta.get("version") != CACHE_VERSION:
+        return False
+    return all(meta.get(k) == v for k, v in _csv_signature(csv_path).items())
+
+
+def write_cache(csv_path: str, df: pd.DataFrame):
+    """
+    Write df (grouped by room/sensor_name, time-sorted within groups) as the
+    columnar cache for csv_path.
+    """
+    directory = cache_dir(csv_path)
+    os.makedirs(directory, exist_ok=True)
+
+    # drop the old meta first so a half-written cache is never considered fresh
+    meta_path = os.path.join(directory, "meta.json")
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+
+    rooms = pd.Categorical(df["room"])
+    sensors = pd.Categorical(df["sensor_name"])
+    room_codes = rooms.codes.astype("int32")
+    sensor_codes = sensors.codes.astype("int32")
+
+    columns = {
+        "timestamp": df["timestamp"].to_numpy().astype("datetime64[ns]").view("int64"),
+        "room": room_codes,
+        "sensor_name": sensor_codes,
+        "value": df["value"].to_numpy(dtype="float64"),
+    }
+    for name, arr in columns.items():
+        np.save(os.path.join(directory, name + ".npy"), arr)
+
+    # [start, end) of each (room, sensor_name) run
+    change = np.flatnonzero((np.diff(room_codes) != 0) | (np.diff(sensor_codes) != 0)) + 1
+    starts = np.concatenate(([0], change)) if len(df) else np.empty(0, dtype="int64")
+    ends = np.concatenate((change, [len(df)])) if len(df) else np.empty(0, dtype="int64")
+    groups = [[int(room_codes[s]), int(sensor_codes[s]), int(s), int(e)] for s, e in zip(starts, ends)]
+
+    meta = {
+        "version": CACHE_VERSION,
+        "rows": int(len(df)),
+        "rooms": [str(c) for c in rooms.categories],
+        "sensor_names": [str(c) for c in sensors.categories],
+        "groups": groups,
+        **_csv_signature(csv_path),
+    }
+    tmp_path = meta_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, meta_path)
+
+
+def load_cache(csv_path: str) -> Optional[Tuple[pd.DataFrame, SensorStore]]:
+    """
+    Memory-map a fresh cache and return (dataframe, store), or None if the
+    cache is missing, stale or unreadable.
+    """
+    if not is_fresh(csv_path):
+        return None
+
+    directory = cache_dir(csv_path)
+    meta = _read_meta(directory)
+    try:
+        cols = {name: np.load(os.path.join(directory, name + ".npy"), mmap_mode="r") for name in COLUMNS}
+    except (OSError, ValueError):
+        return None
+    if any(len(arr) != meta["rows"] for arr in cols.values()):
+        return None
+
+    rooms, sensor_names = meta["rooms"], meta["sensor_names"]
+    ts, values = cols["timestamp"], cols["value"]
+
+    store = SensorStore()
+    for room_code, sensor_code, start, end in meta["groups"]:
+        store.add_series(rooms[room_code], sensor_names[sensor_code],
+                         SensorSeries(ts[start:end], values[start:end]))
+
+    df = pd.DataFrame({
+        "timestamp": np.asarray(ts).view("datetime64[ns]"),
+        "room": pd.Categorical.from_codes(cols["room"], categories=rooms),
+        "sensor_name": pd.Categorical.from_codes(cols["sensor_name"], categories=sensor_names),
+        "value": np.asarray(values),
+    })
+    return df, store
@@ -0,0 +1,616 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, Optional, Tuple, Iterator
+
+# Partitioned sensor store
+#
+# Readings are kept per (room, sensor_name) as timestamp-sorted NumPy arrays.
+# Timestamps are int64 nanoseconds since epoch, values are floats.
+# Latest lookups are O(1), exact and range lookups are O(log n) binary searches.
+# Window aggregates use a lazily built index per series: prefix sums for
+# sum/count/mean, O(1) after the binary search that locates the window, and
+# the min/max of every block of BLOCK readings for min/max, which then scan
+# the partial blocks at the window's edges plus one entry per whole block.
+# The min/max index takes 2n/BLOCK floats, so long histories stay cheap.
+#
+# Each series also keeps a time-of-day index: the positions of its readings in
+# each period (night 0-6h, morning 6-12h, afternoon 12-18h, evening 18-24h),
+# so period queries over the whole history are a searchsorted plus a gather.
+#
+# Retention: once apply_retention() runs, every series also keeps 1-minute and
+# 1-hour rollups (min/max/sum/count per bucket) of all its readings. Raw
+# readings, minute buckets and hour buckets are then dropped after their own
+# number of days (RetentionPolicy); cutoffs are hour-aligned. window_stats()
+# answers the part of a window that raw readings still cover from the raw
+# aggregate index and the older part from the rollups, coarsest tier first:
+# whole hours from the hour tier, the remaining edges from the minute tier.
+# Where no finer tier is left, an edge bucket counts when its midpoint lies in
+# the window (edges round to the nearest bucket boundary).
+#
+# A store is not thread-safe, and reads are not read-only: the indexes are
+# built or extended on the first read after a change. Readers and writers of
+# one store share a lock (the tools hold the home's lock for both).
+
+SeriesKey = Tuple[str, str]
+
+PERIODS = ("night", "morning", "afternoon", "evening")
+PERIOD_CODES = {name: code for code, name in enumerate(PERIODS)}
+
+MINUTE_NS = 60_000_000_000
+HOUR_NS = 60 * MINUTE_NS
+DAY_NS = 24 * HOUR_NS
+
+# rollup tiers, finest first
+ROLLUP_BUCKETS = (MINUTE_NS, HOUR_NS)
+TIER_NAMES = {MINUTE_NS: "1m", HOUR_NS: "1h"}
+# coarsest first, as WindowStats.tiers lists them
+TIER_ORDER = ("1h", "1m", "raw")
+
+# readings per block of the min/max index
+BLOCK = 256
+
+
+def to_ns(ts) -> int:
+    """Convert a timestamp-like value (str, datetime, pd.Timestamp, int ns) to int64 ns"""
+    if isinstance(ts, (int, np.integer)):
+        return int(ts)
+    return int(pd.Timestamp(ts).value)
+
+
+def period_codes(ts_ns: np.ndarray) -> np.ndarray:
+    """Time-of-day period code (index into PERIODS) of each int64 ns timestamp"""
+    return ((ts_ns // HOUR_NS) % 24 // 6).astype("int8")
+
+
+class RetentionPolicy:
+    """Days of history kept per resolution; None keeps a tier forever"""
+
+    __slots__ = ("raw_days", "minute_days", "hour_days")
+
+    def __init__(self, raw_days: float = 7.0, minute_days: Optional[float] = 30.0,
+                 hour_days: Optional[float] = None):
+        # a day of raw readings keeps every time-of-day period answerable
+        if raw_days is None or raw_days < 1:
+            raise ValueError("raw_days must be at least 1")
+        if minute_days is not None and minute_days < raw_days:
+            raise ValueError("minute_days must be at least raw_days")
+        if hour_days is not None and (minute_days is None or hour_days < minute_days):
+            raise ValueError("hour_days must be at least minute_days")
+        self.raw_days = raw_days
+        self.minute_days = minute_days
+        self.hour_days = hour_days
+
+    def cutoffs(self, newest_ns: int) -> Tuple[int, Dict[int, Optional[int]]]:
+        """(raw cutoff, {bucket_ns: rollup cutoff}) relative to the newest reading, hour-aligned"""
+        def before(days):
+            if days is None:
+                return None
+            return (newest_ns - int(days * DAY_NS)) // HOUR_NS * HOUR_NS
+
+        return before(self.raw_days), {MINUTE_NS: before(self.minute_days), HOUR_NS: before(self.hour_days)}
+
+
+class WindowStats:
+    """count/sum/min/max of the readings in a window, merged over the tiers that answered it"""
+
+    __slots__ = ("count", "sum", "min", "max", "tiers")
+
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.min = float("inf")
+        self.max = float("-inf")
+        self.tiers = []
+
+    def add(self, count: int, total: float, lo: float, hi: float, tier: str):
+        if not count:
+            return
+        self.count += count
+        self.sum += total
+        self.min = min(self.min, lo)
+        self.max = max(self.max, hi)
+        if tier not in self.tiers:
+            self.tiers.append(tier)
+            self.tiers.sort(key=TIER_ORDER.index)
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count
+
+
+class Rollup:
+    """min/max/sum/count of one series per fixed-width time bucket"""
+
+    __slots__ = ("bucket_ns", "_start", "_min", "_max", "_sum", "_count", "_size", "retained_from")
+
+    def __init__(self, bucket_ns: int):
+        self.bucket_ns = bucket_ns
+        self._start = np.empty(0, dtype="int64")
+        self._min = np.empty(0, dtype="float64")
+        self._max = np.empty(0, dtype="float64")
+        self._sum = np.empty(0, dtype="float64")
+        self._count = np.empty(0, dtype="int64")
+        self._size = 0
+        # buckets before this were dropped by retention (None: nothing dropped)
+        self.retained_from: Optional[int] = None
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def starts(self) -> np.ndarray:
+        return self._start[:self._size]
+
+    @property
+    def sums(self) -> np.ndarray:
+        return self._sum[:self._size]
+
+    @property
+    def counts(self) -> np.ndarray:
+        return self._count[:self._size]
+
+    def covers(self, ts_ns: int) -> bool:
+        return self.retained_from is None or ts_ns >= self.retained_from
+
+    def _reserve(self, n: int):
+        cap = len(self._start)
+        if n <= cap:
+            return
+        new_cap = max(n, 2 * cap, 16)
+        for name in ("_start", "_min", "_max", "_sum", "_count"):
+            old = getattr(self, name)
+            grown = np.empty(new_cap, dtype=old.dtype)
+            grown[:self._size] = old[:self._size]
+            setattr(self, name, grown)
+
+    def add(self, ts: np.ndarray, values: np.ndarray):
+        """Fold sorted readings into their buckets"""
+        if len(ts) == 0:
+            return
+        buckets = ts // self.bucket_ns * self.bucket_ns
+        n = self._size
+
+        # readings behind the newest bucket (late arrivals) are merged one by one
+        late = int(np.searchsorted(buckets, self._start[n - 1])) if n else 0
+        for i in range(late):
+            self.add_one(int(ts[i]), values[i])
+        buckets, values = buckets[late:], values[late:]
+        if len(buckets) == 0:
+            return
+
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(buckets)) + 1))
+        new_start = buckets[starts]
+        new_min = np.minimum.reduceat(values, starts)
+        new_max = np.maximum.reduceat(values, starts)
+        new_sum = np.add.reduceat(values.astype("float64"), starts)
+        new_count = np.diff(np.concatenate((starts, [len(buckets)])))
+
+        n = self._size
+        if n and new_start[0] == self._start[n - 1]:
+            self._min[n - 1] = min(self._min[n - 1], new_min[0])
+            self._max[n - 1] = max(self._max[n - 1], new_max[0])
+            self._sum[n - 1] += new_sum[0]
+            self._count[n - 1] += new_count[0]
+            new_start, new_min, new_max = new_start[1:], new_min[1:], new_max[1:]
+            new_sum, new_count = new_sum[1:], new_count[1:]
+
+        m = len(new_start)
+        self._reserve(n + m)
+        self._start[n:n + m] = new_start
+        self._min[n:n + m] = new_min
+        self._max[n:n + m] = new_max
+        self._sum[n:n + m] = new_sum
+        self._count[n:n + m] = new_count
+        self._size = n + m
+
+    def add_one(self, ts_ns: int, value: float):
+        """Fold one reading into its bucket, wherever that bucket is"""
+        bucket = ts_ns // self.bucket_ns * self.bucket_ns
+        n = self._size
+        i = int(np.searchsorted(self._start[:n], bucket))
+        if i < n and self._start[i] == bucket:
+            self._min[i] = min(self._min[i], value)
+            self._max[i] = max(self._max[i], value)
+            self._sum[i] += value
+            self._count[i] += 1
+            return
+
+        self._reserve(n + 1)
+        for arr in (self._start, self._min, self._max, self._sum, self._count):
+            arr[i + 1:n + 1] = arr[i:n]
+        self._start[i] = bucket
+        self._min[i] = self._max[i] = value
+        self._sum[i] = value
+        self._count[i] = 1
+        self._size = n + 1
+
+    def trim_before(self, ts_ns: int) -> int:
+        """Drop buckets that start before ts_ns. Returns how many were dropped"""
+        self.retained_from = ts_ns if self.retained_from is None else max(self.retained_from, ts_ns)
+        cut = int(np.searchsorted(self.starts, ts_ns))
+        if cut:
+            n = self._size - cut
+            for arr in (self._start, self._min, self._max, self._sum, self._count):
+                arr[:n] = arr[cut:self._size]
+            self._size = n
+        return cut
+
+    def bucket_range(self, start_ns: int, end_ns: int) -> Tuple[int, int]:
+        """Positions [i, j) of the buckets that start in [start_ns, end_ns)"""
+        starts = self.starts
+        return int(np.searchsorted(starts, start_ns)), int(np.searchsorted(starts, end_ns))
+
+    def add_stats(self, stats: WindowStats, start_ns: int, end_ns: int):
+        """Add the buckets that start in [start_ns, end_ns) to stats"""
+        i, j = self.bucket_range(start_ns, end_ns)
+        if i < j:
+            stats.add(int(self._count[i:j].sum()), float(self._sum[i:j].sum()),
+                      float(self._min[i:j].min()), float(self._max[i:j].max()),
+                      TIER_NAMES.get(self.bucket_ns, str(self.bucket_ns)))
+
+
+class SensorSeries:
+    """Sorted timestamp/value arrays for a single (room, sensor_name)"""
+
+    __slots__ = ("_ts", "_values", "_size", "_agg_size", "_prefix", "_block_min", "_block_max",
+                 "_period_size", "_period_index", "_rollups", "_rollup_size", "_raw_from")
+
+    def __init__(self, timestamps: np.ndarray, values: np.ndarray):
+        self._ts = np.asarray(timestamps, dtype="int64")
+        values = np.asarray(values)
+        # float64 columns (e.g. the memory-mapped cache) are used without a copy
+        self._values = values.astype("float64", copy=False)
+        self._size = len(self._ts)
+        # aggregates cover readings [0, _agg_size) and are extended on demand
+        self._agg_size = 0
+        self._prefix = None
+        # min/max of each complete block of BLOCK readings
+        self._block_min = np.empty(0, dtype="float64")
+        self._block_max = np.empty(0, dtype="float64")
+        # period index covers readings [0, _period_size), extended on demand
+        self._period_size = 0
+        self._period_index = [np.empty(0, dtype="int64") for _ in PERIODS]
+        # rollup tiers (bucket_ns -> Rollup), created by the first apply_retention;
+        # they include readings [0, _rollup_size)
+        self._rollups: Dict[int, Rollup] = {}
+        self._rollup_size = 0
+        # raw readings before this were dropped by retention (None: nothing dropped)
+        self._raw_from: Optional[int] = None
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def timestamps(self) -> np.ndarray:
+        return self._ts[:self._size]
+
+    @property
+    def values(self) -> np.ndarray:
+        return self._values[:self._size]
+
+    def latest(self) -> Optional[Tuple[int, float]]:
+        if self._size == 0:
+            return None
+        i = self._size - 1
+        return int(self._ts[i]), float(self._values[i])
+
+    def value_at(self, i: int) -> float:
+        return float(self._values[i])
+
+    def find(self, ts_ns: int) -> Optional[int]:
+        """Index of the first reading at exactly ts_ns, or None"""
+        i = int(np.searchsorted(self.timestamps, ts_ns, side="left"))
+        if i < self._size and self._ts[i] == ts_ns:
+            return i
+        return None
+
+    def range_indices(self, start_ns: int, end_ns: int) -> Tuple[int, int]:
+        """Half-open index range [lo, hi) of readings with start <= ts <= end"""
+        ts = self.timestamps
+        lo = int(np.searchsorted(ts, start_ns, side="left"))
+        hi = int(np.searchsorted(ts, end_ns, side="right"))
+        return lo, max(lo, hi)
+
+    # Appending
+
+    def _reserve(self, n: int):
+        cap = len(self._ts)
+        if n <= cap and self._ts.flags.writeable and self._values.flags.writeable:
+            return
+        new_cap = max(n, 2 * cap, 16)
+        ts = np.empty(new_cap, dtype="int64")
+        values = np.empty(new_cap, dtype=self._values.dtype)
+        ts[:self._size] = self._ts[:self._size]
+        values[:self._size] = self._values[:self._size]
+        self._ts = ts
+        self._values = values
+
+    def append(self, ts_ns: int, value: float) -> int:
+        """
+        Add one reading, amortized O(1) when it is the newest.
+        Older readings are inserted in place. Returns the reading's index.
+        """
+        n = self._size
+        self._reserve(n + 1)
+
+        if n == 0 or ts_ns >= self._ts[n - 1]:
+            pos = n
+        else:
+            pos = int(np.searchsorted(self._ts[:n], ts_ns, side="right"))
+            self._ts[pos + 1:n + 1] = self._ts[pos:n]
+            self._values[pos + 1:n + 1] = self._values[pos:n]
+
+        self._ts[pos] = ts_ns
+        self._values[pos] = value
+        self._size = n + 1
+        self._agg_size = min(self._agg_size, pos)
+        self._period_size = min(self._period_size, pos)
+        if pos < self._rollup_size:
+            # a late reading inside the rolled-up prefix
+            for rollup in self._rollups.values():
+                rollup.add_one(ts_ns, value)
+            self._rollup_size += 1
+        return pos
+
+    def trim_before(self, ts_ns: int) -> int:
+        """Drop readings older than ts_ns. Returns how many were dropped"""
+        cut = int(np.searchsorted(self.timestamps, ts_ns, side="left"))
+        if cut == 0:
+            return 0
+
+        n = self._size - cut
+        if len(self._ts) > 4 * max(n, 16):
+            # most of the capacity is unused now: give it back
+            self._ts = self._ts[cut:self._size].copy()
+            self._values = self._values[cut:self._size].copy()
+            self._prefix = None
+            self._block_min = np.empty(0, dtype="float64")
+            self._block_max = np.empty(0, dtype="float64")
+        else:
+            self._reserve(self._size)
+            self._ts[:n] = self._ts[cut:self._size]
+            self._values[:n] = self._values[cut:self._size]
+        self._size = n
+        self._agg_size = 0
+        self._period_size = 0
+        self._rollup_size = max(0, self._rollup_size - cut)
+        return cut
+
+    # Retention tiers
+
+    @property
+    def raw_from(self) -> Optional[int]:
+        """Raw readings before this timestamp were rolled up and dropped (None: none were)"""
+        return self._raw_from
+
+    def _ensure_rollups(self):
+        n = self._size
+        start = self._rollup_size
+        if not self._rollups or start == n:
+            return
+        for rollup in self._rollups.values():
+            rollup.add(self._ts[start:n], self._values[start:n])
+        self._rollup_size = n
+
+    def rollup(self, bucket_ns: int) -> Optional[Rollup]:
+        """Up-to-date rollup tier of bucket_ns, or None before retention was applied"""
+        self._ensure_rollups()
+        return self._rollups.get(bucket_ns)
+
+    def apply_retention(self, raw_before: int, rollup_before: Dict[int, Optional[int]]) -> int:
+        """
+        Roll every reading up into the minute and hour tiers, then drop raw
+        readings before raw_before and each tier's buckets before its cutoff
+        (None keeps the tier). Returns how many raw readings were dropped.
+        """
+        if not self._rollups:
+            self._rollups = {bucket_ns: Rollup(bucket_ns) for bucket_ns in ROLLUP_BUCKETS}
+            self._rollup_size = 0
+        self._ensure_rollups()
+
+        dropped = self.trim_before(raw_before)
+        self._raw_from = raw_before if self._raw_from is None else max(self._raw_from, raw_before)
+        for bucket_ns, before in rollup_before.items():
+            if before is not None:
+                self._rollups[bucket_ns].trim_before(before)
+        return dropped
+
+    def window_stats(self, start_ns: int, end_ns: int) -> WindowStats:
+        """
+        count/sum/min/max of the readings with start <= ts <= end. Raw readings
+        answer the part they still cover; the part before raw_from comes from
+        the rollups (see the module comment).
+        """
+        stats = WindowStats()
+        raw_from = self._raw_from
+        lo, hi = self.range_indices(start_ns if raw_from is None else max(start_ns, raw_from), end_ns)
+        if hi > lo:
+            stats.add(hi - lo, self.window_sum(lo, hi), self.window_min(lo, hi), self.window_max(lo, hi), "raw")
+        if raw_from is not None and start_ns < raw_from:
+            self._rollup_stats(stats, start_ns, min(end_ns + 1, raw_from))
+        return stats
+
+    def _rollup_stats(self, stats: WindowStats, start_ns: int, end_ns: int):
+        """Add [start_ns, end_ns) from the rollups to stats, coarsest tier first"""
+        self._ensure_rollups()
+        tiers = sorted(self._rollups.values(), key=lambda r: r.bucket_ns, reverse=True)
+
+        parts = [(start_ns, end_ns)]
+        for rollup in tiers:
+            width = rollup.bucket_ns
+            rest = []
+            for s, e in parts:
+                # whole buckets inside the part
+                a = -(-s // width) * width
+                z = e // width * width
+                if a < z and rollup.covers(a):
+                    rollup.add_stats(stats, a, z)
+                    if s < a:
+                        rest.append((s, a))
+                    if z < e:
+                        rest.append((z, e))
+                else:
+                    rest.append((s, e))
+            parts = rest
+
+        # edges finer than every tier left: buckets of the finest tier that
+        # still covers them, when the bucket's midpoint is inside the edge
+        for s, e in parts:
+            for rollup in reversed(tiers):
+                if rollup.covers(s) or rollup is tiers[0]:
+                    half = rollup.bucket_ns // 2
+                    rollup.add_stats(stats, s - half, e - half)
+                    break
+
+    # Aggregate index
+
+    def _ensure_aggregates(self):
+        n = self._size
+        start = self._agg_size
+        if start == n:
+            return
+
+        cap = len(self._values)
+        if self._prefix is None or len(self._prefix) < cap + 1:
+            prefix = np.zeros(cap + 1, dtype="float64")
+            if self._prefix is not None:
+                prefix[:start + 1] = self._prefix[:start + 1]
+            self._prefix = prefix
+
+        self._prefix[start + 1:n + 1] = self._prefix[start] + np.cumsum(self._values[start:n], dtype="float64")
+        # blocks from the one holding `start` on are (re)computed
+        first, last = start // BLOCK, n // BLOCK
+        if last > first:
+            if len(self._block_min) < last:
+                blocks = cap // BLOCK + 1
+                self._block_min = _grown(self._block_min, blocks, first)
+                self._block_max = _grown(self._block_max, blocks, first)
+            chunk = self._values[first * BLOCK:last * BLOCK].reshape(-1, BLOCK)
+            self._block_min[first:last] = chunk.min(axis=1)
+            self._block_max[first:last] = chunk.max(axis=1)
+        self._agg_size = n
+
+    def window_sum(self, lo: int, hi: int) -> float:
+        self._ensure_aggregates()
+        return float(self._prefix[hi] - self._prefix[lo])
+
+    def window_min(self, lo: int, hi: int) -> float:
+        self._ensure_aggregates()
+        return self._window_extreme(self._block_min, lo, hi, np.min)
+
+    def window_max(self, lo: int, hi: int) -> float:
+        self._ensure_aggregates()
+        return self._window_extreme(self._block_max, lo, hi, np.max)
+
+    def _window_extreme(self, blocks: np.ndarray, lo: int, hi: int, reduce) -> float:
+        """reduce over values[lo:hi]: whole blocks from the block index, the edges from the values"""
+        b0, b1 = -(-lo // BLOCK), hi // BLOCK
+        if b0 >= b1:
+            return float(reduce(self._values[lo:hi]))
+        parts = [reduce(blocks[b0:b1])]
+        if lo < b0 * BLOCK:
+            parts.append(reduce(self._values[lo:b0 * BLOCK]))
+        if b1 * BLOCK < hi:
+            parts.append(reduce(self._values[b1 * BLOCK:hi]))
+        return float(reduce(parts))
+
+    def window_percentile(self, lo: int, hi: int, q: float) -> float:
+        """Percentile needs the window's order statistics, so this is O(hi - lo)"""
+        return float(np.percentile(self.values[lo:hi], q))
+
+    # Time-of-day index
+
+    def _ensure_periods(self):
+        n = self._size
+        start = self._period_size
+        if start == n:
+            return
+
+        codes = period_codes(self._ts[start:n])
+        for code, index in enumerate(self._period_index):
+            keep = index[:int(np.searchsorted(index, start))]
+            self._period_index[code] = np.concatenate([keep, start + np.flatnonzero(codes == code)])
+        self._period_size = n
+
+    def period_indices(self, code: int, lo: int = 0, hi: Optional[int] = None) -> np.ndarray:
+        """Sorted positions in [lo, hi) of the readings taken in period `code`"""
+        self._ensure_periods()
+        index = self._period_index[code]
+        if lo == 0 and hi is None:
+            return index
+        hi = self._size if hi is None else hi
+        return index[int(np.searchsorted(index, lo)):int(np.searchsorted(index, hi))]
+
+    def period_latest(self, code: int) -> Optional[int]:
+        """Position of the newest reading taken in period `code`, or None"""
+        index = self.period_indices(code)
+        return int(index[-1]) if len(index) else None
+
+
+def _grown(array: np.ndarray, size: int, keep: int) -> np.ndarray:
+    """array resized to size entries, of which the first `keep` are kept"""
+    grown = np.empty(size, dtype=array.dtype)
+    grown[:keep] = array[:keep]
+    return grown
+
+
+class SensorStore:
+    """Mapping of (room, sensor_name) -> SensorSeries"""
+
+    def __init__(self):
+        self._series: Dict[SeriesKey, SensorSeries] = {}
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "SensorStore":
+        """
+        Build the store from a dataframe with timestamp, room, sensor_name, value.
+        The dataframe must already be sorted by timestamp.
+        """
+        store = cls()
+        if df.empty:
+            return store
+
+        ts = df["timestamp"].to_numpy().astype("datetime64[ns]").view("int64")
+        values = df["value"].to_numpy(dtype="float64")
+
+        for (room, sensor_name), idx in df.groupby(["room", "sensor_name"], sort=False).indices.items():
+            store._series[(room, sensor_name)] = SensorSeries(ts[idx], values[idx])
+
+        return store
+
+    def get(self, room: str, sensor_name: str) -> Optional[SensorSeries]:
+        return self._series.get((room, sensor_name))
+
+    def add_series(self, room: str, sensor_name: str, series: SensorSeries):
+        self._series[(room, sensor_name)] = series
+
+    def append(self, room: str, sensor_name: str, ts_ns: int, value: float) -> Tuple[SensorSeries, int]:
+        """Add one reading, creating the series on first use. Returns (series, index)"""
+        series = self._series.get((room, sensor_name))
+        if series is None:
+            series = self._series[(room, sensor_name)] = SensorSeries(
+                np.empty(0, dtype="int64"), np.empty(0, dtype="float64")
+            )
+        return series, series.append(ts_ns, value)
+
+    def keys(self):
+        return self._series.keys()
+
+    def trim_before(self, ts_ns: int) -> int:
+        """Drop readings older than ts_ns from every series"""
+        return sum(series.trim_before(ts_ns) for series in self._series.values())
+
+    def apply_retention(self, raw_before: int, rollup_before: Dict[int, Optional[int]]) -> int:
+        """SensorSeries.apply_retention on every series"""
+        return sum(series.apply_retention(raw_before, rollup_before) for series in self._series.values())
+
+    def newest(self) -> Optional[int]:
+        """Timestamp of the newest reading of any series"""
+        latest = [int(series.timestamps[-1]) for series in self._series.values() if len(series)]
+        return max(latest) if latest else None
+
+    def items(self) -> Iterator[Tuple[SeriesKey, SensorSeries]]:
+        return iter(self._series.items())
+
+    def __len__(self) -> int:
+        return sum(len(s) for s in self._series.values())
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# the modules live flat in Home_Automation/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("HOME_AUTOMATION_DEBUG", "0")
+os.environ.setdefault("HOME_AUTOMATION_STATE_DIR", "")
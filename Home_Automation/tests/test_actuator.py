@@ -0,0 +1,101 @@
+import pandas as pd
+import pytest
+
+from actuator import Actuator, Command, DevicePolicy
+
+
+class Devices:
+    def __init__(self):
+        self.states = {}
+        self.now = pd.Timestamp("2025-01-01 12:00")
+
+    def current(self, room, device):
+        return self.states.get((room, device))
+
+    def apply(self, room, device, state):
+        self.states[(room, device)] = state
+
+    def advance(self, seconds):
+        self.now += pd.Timedelta(seconds=seconds)
+
+
+@pytest.fixture
+def devices():
+    return Devices()
+
+
+@pytest.fixture
+def actuator(devices):
+    return Actuator(devices.current, devices.apply, clock=lambda: devices.now)
+
+
+def test_coalesce_priority_then_last_writer(actuator, devices):
+    outcome = actuator.dispatch([
+        Command("kitchen", "fan", "on", priority=1),
+        Command("kitchen", "fan", "off", priority=0),
+        Command("bedroom", "light", "on"),
+        Command("bedroom", "light", "off"),
+    ])
+    assert devices.states == {("kitchen", "fan"): "on", ("bedroom", "light"): "off"}
+    assert len(outcome["applied"]) == 2 and len(outcome["superseded"]) == 2
+
+
+def test_command_for_current_state_is_unchanged(actuator, devices):
+    devices.states[("kitchen", "fan")] = "on"
+    outcome = actuator.dispatch([Command("kitchen", "fan", "on")])
+    assert outcome["applied"] == [] and len(outcome["unchanged"]) == 1
+
+
+def test_min_interval_queues_and_retries(actuator, devices):
+    actuator.set_policy("kitchen", "fan", DevicePolicy(min_interval_seconds=60))
+    actuator.dispatch([Command("kitchen", "fan", "on")])
+    devices.advance(10)
+
+    outcome = actuator.dispatch([Command("kitchen", "fan", "off")])
+    assert [reason for _, reason in outcome["throttled"]] == ["rate_limited"]
+    assert [c.state for c in actuator.pending] == ["off"]
+
+    # still throttled: kept in the queue, not reported again
+    devices.advance(10)
+    assert actuator.flush()["throttled"] == []
+    assert devices.states[("kitchen", "fan")] == "on"
+
+    devices.advance(60)
+    assert [c.state for c in actuator.flush()["applied"]] == ["off"]
+    assert actuator.pending == [] and actuator.stats["retried"] == 1
+
+
+def test_hold_blocks_only_the_return_to_the_previous_state(actuator, devices):
+    actuator.set_policy("kitchen", "fan", DevicePolicy(hold_seconds=300))
+    devices.states[("kitchen", "fan")] = "off"
+    actuator.dispatch([Command("kitchen", "fan", "on")])
+    devices.advance(30)
+
+    assert actuator.dispatch([Command("kitchen", "fan", "off")])["throttled"][0][1] == "hold"
+    assert actuator.dispatch([Command("kitchen", "fan", "eco")])["applied"][0].state == "eco"
+    # the newer command superseded the queued "off"
+    assert actuator.pending == []
+
+
+def test_queued_command_dropped_when_no_longer_needed(actuator, devices):
+    actuator.set_policy("kitchen", "fan", DevicePolicy(min_interval_seconds=60))
+    actuator.dispatch([Command("kitchen", "fan", "on")])
+    actuator.dispatch([Command("kitchen", "fan", "off")])
+    devices.states[("kitchen", "fan")] = "off"
+    devices.advance(120)
+    assert actuator.flush() == {"applied": [], "unchanged": [], "superseded": [], "throttled": []}
+    assert actuator.pending == []
+
+
+def test_force_skips_throttling(actuator, devices):
+    actuator.set_policy("kitchen", "fan", DevicePolicy(min_interval_seconds=60))
+    actuator.dispatch([Command("kitchen", "fan", "on")])
+    assert actuator.dispatch([Command("kitchen", "fan", "off")], force=True)["applied"]
+
+
+def test_listeners_get_each_changing_cycle(actuator, devices):
+    seen = []
+    actuator.add_listener(lambda applied, ts: seen.append([c.state for c in applied]))
+    actuator.dispatch([Command("kitchen", "fan", "on")])
+    actuator.dispatch([Command("kitchen", "fan", "on")])
+    assert seen == [["on"]]
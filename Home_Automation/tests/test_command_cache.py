@@ -0,0 +1,40 @@
+import threading
+
+from command_cache import CommandCache, normalize_command
+
+
+def test_sign_of_a_number_is_part_of_the_key():
+    assert normalize_command("turn on the heater below -5") != normalize_command("turn on the heater below 5")
+    assert normalize_command("Living-room temp > 17.5.") == "living room temp > 17.5"
+
+
+def test_lru_and_ttl():
+    now = [0.0]
+    cache = CommandCache(max_entries=2, ttl_seconds=10, clock=lambda: now[0])
+    cache.put("a", {"tool": "a"})
+    cache.put("b", {"tool": "b"})
+    assert cache.get("a") == {"tool": "a"}
+    cache.put("c", {"tool": "c"})
+    assert cache.get("b") is None
+    now[0] = 10
+    assert cache.get("a") is None and len(cache) == 1
+
+
+def test_concurrent_get_and_put():
+    cache = CommandCache(max_entries=8, ttl_seconds=None)
+    errors = []
+
+    def work(n):
+        try:
+            for i in range(2000):
+                cache.put(f"cmd {(n + i) % 20}", {"tool": "t", "args": {"i": i}})
+                cache.get(f"cmd {(n * 7 + i) % 20}")
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=work, args=(n,)) for n in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == [] and len(cache) == 8
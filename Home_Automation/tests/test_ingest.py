@@ -0,0 +1,43 @@
+import pytest
+
+import tools
+from home import Home, use_home
+
+FAN_RULE = {"room": "kitchen", "sensor_name": "temperature", "operator": ">",
+            "threshold_value": 25, "device": "fan", "state": "on"}
+
+
+@pytest.fixture
+def home():
+    with use_home(Home("test")) as h:
+        tools.add_automation_rule("fan above 25", FAN_RULE)
+        yield h
+
+
+def test_invalid_reading_applies_nothing(home):
+    batch = [("2025-01-01 10:00", "kitchen", "temperature", 30),
+             {"timestamp": "2025-01-01 10:01", "room": "kitchen", "value": 1}]
+    with pytest.raises(KeyError):
+        tools.ingest_readings(batch)
+    assert home.sensor_store is None
+
+    # the edge was not consumed by the rejected batch
+    result = tools.ingest_readings([("2025-01-01 10:02", "kitchen", "temperature", 31)])
+    assert result["actions"] == ["kitchen.fan → on"]
+
+
+def test_rule_fires_on_rising_edge_only(home):
+    result = tools.ingest_readings([("2025-01-01 10:00", "kitchen", "temperature", 20),
+                                    ("2025-01-01 10:01", "kitchen", "temperature", 30),
+                                    ("2025-01-01 10:02", "kitchen", "temperature", 31)])
+    assert len(result["rules_triggered"]) == 1
+    assert home.device_state("kitchen", "fan") == "on"
+
+
+def test_parse_reading_rejects_bad_values():
+    with pytest.raises(ValueError):
+        tools.parse_reading(("2025-01-01", "kitchen", "temperature", "warm"))
+    with pytest.raises(TypeError):
+        tools.parse_reading(("2025-01-01", None, "temperature", 1))
+    with pytest.raises(ValueError):
+        tools.parse_reading(("not a time", "kitchen", "temperature", 1))
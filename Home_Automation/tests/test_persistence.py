@@ -0,0 +1,68 @@
+import json
+import os
+
+from persistence import SNAPSHOT_FILE, WAL_FILE, StateLog
+
+RULE = {"rule_id": 0, "rule_text": "fan above 25"}
+
+
+def reopen(directory, **kwargs):
+    log = StateLog(str(directory), **kwargs)
+    return log, log.recover()
+
+
+def test_records_survive_a_restart(tmp_path):
+    log, _ = reopen(tmp_path)
+    log.append({"op": "rule", "rule": RULE})
+    log.append({"op": "device", "room": "kitchen", "device": "fan", "state": "on"})
+    log.append({"op": "device", "room": "kitchen", "device": "fan", "state": "off"}, wait=True)
+    log.close()
+
+    log, (rules, devices) = reopen(tmp_path)
+    assert rules == [RULE]
+    assert devices == {"kitchen": {"fan": "off"}}
+    log.close()
+
+
+def test_torn_tail_is_cut_off(tmp_path):
+    log, _ = reopen(tmp_path)
+    log.append({"op": "device", "room": "kitchen", "device": "fan", "state": "on"}, wait=True)
+    log.close()
+    with open(tmp_path / WAL_FILE, "a", encoding="utf-8") as f:
+        f.write('{"seq": 2, "op": "device", "room": "kitch')
+
+    log, (_, devices) = reopen(tmp_path)
+    assert devices == {"kitchen": {"fan": "on"}}
+    # the next record starts on a line of its own
+    log.append({"op": "device", "room": "bedroom", "device": "light", "state": "on"}, wait=True)
+    log.close()
+
+    lines = (tmp_path / WAL_FILE).read_text(encoding="utf-8").splitlines()
+    assert [json.loads(line)["seq"] for line in lines] == [1, 2]
+    _, (_, devices) = reopen(tmp_path)
+    assert devices == {"kitchen": {"fan": "on"}, "bedroom": {"light": "on"}}
+
+
+def test_compaction_snapshots_and_truncates(tmp_path):
+    log, _ = reopen(tmp_path, compact_every=3)
+    states = {}
+    for i in range(3):
+        state = "on" if i % 2 == 0 else "off"
+        log.append({"op": "device", "room": "kitchen", "device": "fan", "state": state})
+        states = {"kitchen": {"fan": state}}
+    assert log.should_compact()
+    log.compact([RULE], states)
+    assert not log.should_compact()
+    assert os.path.getsize(tmp_path / WAL_FILE) == 0
+
+    log.append({"op": "device", "room": "bedroom", "device": "light", "state": "on"}, wait=True)
+    log.close()
+
+    snapshot = json.loads((tmp_path / SNAPSHOT_FILE).read_text(encoding="utf-8"))
+    assert snapshot["seq"] == 3
+    log, (rules, devices) = reopen(tmp_path)
+    assert rules == [RULE]
+    assert devices == {"kitchen": {"fan": "on"}, "bedroom": {"light": "on"}}
+    # sequence numbers continue after the snapshot
+    assert log.append({"op": "rule", "rule": RULE}) == 5
+    log.close()
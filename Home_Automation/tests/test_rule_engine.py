@@ -0,0 +1,63 @@
+import pytest
+
+from rule_engine import RuleIndex, compile_rule
+
+
+def rule(rule_id, op, threshold, room="kitchen", sensor_name="temperature"):
+    return compile_rule(rule_id, f"rule {rule_id}", {
+        "room": room, "sensor_name": sensor_name, "operator": op,
+        "threshold_value": threshold, "device": f"d{rule_id}", "state": "on"})
+
+
+def ids(rules):
+    return sorted(r.rule_id for r in rules)
+
+
+@pytest.fixture
+def index():
+    index = RuleIndex()
+    for r in [rule(0, ">", 20), rule(1, ">", 25), rule(2, ">=", 25), rule(3, "<", 18),
+              rule(4, "<=", 18), rule(5, "==", 22), rule(6, ">", 0, room="bedroom")]:
+        index.add(r)
+    return index
+
+
+@pytest.mark.parametrize("value, expected", [
+    (30, [0, 1, 2]), (25, [0, 2]), (22, [0, 5]), (18, [4]), (10, [3, 4]),
+])
+def test_evaluate_matches_each_operator(index, value, expected):
+    assert ids(index.evaluate("kitchen", "temperature", value)) == expected
+
+
+def test_evaluate_unknown_sensor_matches_nothing(index):
+    assert index.evaluate("kitchen", "humidity", 50) == []
+
+
+def test_evaluate_groups_skips_missing_and_nan(index):
+    values = {("kitchen", "temperature"): 30.0, ("bedroom", "temperature"): float("nan")}
+    assert ids(index.evaluate_groups(values)) == [0, 1, 2]
+
+
+def test_edges_fire_only_on_false_to_true(index):
+    assert ids(index.evaluate_edges("kitchen", "temperature", 22)) == [0, 5]
+    # still satisfied: no new edges
+    assert ids(index.evaluate_edges("kitchen", "temperature", 23)) == []
+    assert ids(index.evaluate_edges("kitchen", "temperature", 26)) == [1, 2]
+    assert ids(index.evaluate_edges("kitchen", "temperature", 15)) == [3, 4]
+    assert ids(index.evaluate_edges("kitchen", "temperature", 26)) == [0, 1, 2]
+
+
+def test_rule_added_between_readings_starts_inactive(index):
+    index.evaluate_edges("kitchen", "temperature", 30)
+    index.add(rule(7, ">", 28))
+    index.add(rule(8, ">", 35))
+    # rule 7 holds for the next reading and fires once; the older rules keep their state
+    assert ids(index.evaluate_edges("kitchen", "temperature", 31)) == [7]
+    assert ids(index.evaluate_edges("kitchen", "temperature", 36)) == [8]
+    assert ids(index.evaluate_edges("kitchen", "temperature", 36)) == []
+
+
+def test_reset_edges_fires_current_matches_again(index):
+    index.evaluate_edges("kitchen", "temperature", 30)
+    index.reset_edges()
+    assert ids(index.evaluate_edges("kitchen", "temperature", 30)) == [0, 1, 2]
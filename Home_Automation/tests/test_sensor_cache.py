@@ -0,0 +1,86 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import sensor_cache
+import tools
+from home import Home, use_home
+
+CSV = """timestamp,room,sensor_name,value
+2025-01-01 00:00:00,kitchen,temperature,21.1
+2025-01-01 00:01:00,kitchen,temperature,21.3
+2025-01-01 00:00:00,bedroom,humidity,40.07
+2025-01-01 00:02:00,kitchen,temperature,17.49
+"""
+
+
+@pytest.fixture
+def csv_path(tmp_path):
+    path = tmp_path / "sensors.csv"
+    path.write_text(CSV, encoding="utf-8")
+    return str(path)
+
+
+def load(csv_path):
+    with use_home(Home("cache")) as home:
+        result = tools.load_sensor_data(csv_path)
+    return result, home
+
+
+def test_second_load_uses_the_cache(csv_path):
+    first, from_csv = load(csv_path)
+    assert first.get("source") != "cache"
+    assert sensor_cache.is_fresh(csv_path)
+
+    second, from_cache = load(csv_path)
+    assert second["source"] == "cache"
+    assert second["rows_loaded"] == first["rows_loaded"] == 4
+    for key in from_csv.sensor_store.keys():
+        a, b = from_csv.sensor_store.get(*key), from_cache.sensor_store.get(*key)
+        assert np.array_equal(a.timestamps, b.timestamps)
+        # same float64 values, so aggregates match the CSV path exactly
+        assert np.array_equal(a.values, b.values) and b.values.dtype == np.float64
+
+
+def test_changed_csv_invalidates_the_cache(csv_path):
+    load(csv_path)
+    with open(csv_path, "a", encoding="utf-8") as f:
+        f.write("2025-01-01 00:03:00,kitchen,temperature,30.0\n")
+    assert not sensor_cache.is_fresh(csv_path)
+    assert sensor_cache.load_cache(csv_path) is None
+
+    result, home = load(csv_path)
+    assert result.get("source") != "cache" and result["rows_loaded"] == 5
+    assert home.sensor_store.get("kitchen", "temperature").latest()[1] == 30.0
+    assert sensor_cache.is_fresh(csv_path)
+
+
+def test_other_cache_version_is_stale(csv_path):
+    load(csv_path)
+    meta_path = os.path.join(sensor_cache.cache_dir(csv_path), "meta.json")
+    with open(meta_path, "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    meta["version"] = sensor_cache.CACHE_VERSION - 1
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    assert not sensor_cache.is_fresh(csv_path)
+
+
+def test_missing_column_file_falls_back_to_csv(csv_path):
+    load(csv_path)
+    os.remove(os.path.join(sensor_cache.cache_dir(csv_path), "value.npy"))
+    assert sensor_cache.load_cache(csv_path) is None
+    result, _ = load(csv_path)
+    assert result["rows_loaded"] == 4
+
+
+def test_cached_frame_matches_csv(csv_path):
+    _, from_csv = load(csv_path)
+    _, from_cache = load(csv_path)
+    expected = from_csv.sensor_data.astype({"room": str, "sensor_name": str})
+    actual = from_cache.sensor_data.astype({"room": str, "sensor_name": str})
+    # the CSV parser may pick a coarser datetime unit than the cached ns
+    pd.testing.assert_frame_equal(actual, expected, check_dtype=False)
@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from sensor_store import HOUR_NS, MINUTE_NS, BLOCK, SensorSeries, to_ns
+
+START = to_ns("2025-01-01")
+
+
+@pytest.fixture
+def frame():
+    rng = np.random.default_rng(7)
+    ts = START + np.cumsum(rng.integers(1, 120, 5 * BLOCK)) * 10**9
+    return pd.DataFrame({"timestamp": pd.to_datetime(ts), "value": rng.normal(20, 5, len(ts))})
+
+
+def windows(frame, count=200, seed=3):
+    rng = np.random.default_rng(seed)
+    ts = frame["timestamp"]
+    for _ in range(count):
+        a, b = sorted(rng.integers(0, len(ts), 2))
+        # bounds between readings as well as on them
+        yield ts[a] - pd.Timedelta(seconds=int(rng.integers(0, 2))), ts[b]
+
+
+def test_window_aggregates_match_pandas(frame):
+    series = SensorSeries(frame["timestamp"].to_numpy().view("int64"), frame["value"].to_numpy())
+    for start, end in windows(frame):
+        expected = frame.loc[frame["timestamp"].between(start, end), "value"]
+        lo, hi = series.range_indices(to_ns(start), to_ns(end))
+        assert hi - lo == len(expected)
+        assert series.window_sum(lo, hi) == pytest.approx(expected.sum())
+        assert series.window_min(lo, hi) == expected.min()
+        assert series.window_max(lo, hi) == expected.max()
+        assert series.window_percentile(lo, hi, 90) == pytest.approx(np.percentile(expected, 90))
+
+
+def test_aggregates_follow_appends(frame):
+    half = len(frame) // 2
+    ts = frame["timestamp"].to_numpy().view("int64")
+    values = frame["value"].to_numpy()
+    series = SensorSeries(ts[:half], values[:half])
+    series.window_min(0, half)
+    # newest readings, then a late one inside the indexed part
+    for t, v in zip(ts[half:], values[half:]):
+        series.append(int(t), float(v))
+    series.append(int(ts[10]) + 1, -100.0)
+
+    expected = np.insert(values, 11, -100.0)
+    assert series.window_min(0, len(expected)) == expected.min()
+    assert series.window_max(5, 700) == expected[5:700].max()
+    assert series.window_sum(3, 900) == pytest.approx(expected[3:900].sum())
+
+
+@pytest.fixture
+def retained():
+    """Three days of integer readings every 10s; the last day stays raw, the rest is rolled up"""
+    ts = START + np.arange(3 * 24 * 360) * 10**10
+    values = (np.arange(len(ts)) % 97).astype("float64")
+    # the series trims its arrays in place
+    series = SensorSeries(ts.copy(), values.copy())
+    raw_from = START + 2 * 24 * HOUR_NS
+    series.apply_retention(raw_from, {MINUTE_NS: None, HOUR_NS: None})
+    return series, pd.Series(values, index=pd.to_datetime(ts))
+
+
+def test_retention_drops_raw_readings(retained):
+    series, full = retained
+    assert series.raw_from == START + 2 * 24 * HOUR_NS
+    assert len(series) == 24 * 360
+
+
+@pytest.mark.parametrize("start, end, tiers", [
+    ("2025-01-01 00:30", "2025-01-03 12:00", ["1h", "1m", "raw"]),
+    ("2025-01-01 03:00", "2025-01-01 07:59:59", ["1h", "1m"]),
+    ("2025-01-02 10:15", "2025-01-02 10:44:59", ["1m"]),
+    ("2025-01-03 01:00", "2025-01-03 02:00", ["raw"]),
+])
+def test_window_stats_merge_tiers(retained, start, end, tiers):
+    series, full = retained
+    expected = full[pd.Timestamp(start):pd.Timestamp(end)]
+    stats = series.window_stats(to_ns(start), to_ns(end))
+    assert stats.tiers == tiers
+    assert stats.count == len(expected)
+    assert stats.sum == expected.sum()
+    assert (stats.min, stats.max) == (expected.min(), expected.max())
+
+
+def test_rollup_buckets(retained):
+    series, full = retained
+    hours = series.rollup(HOUR_NS)
+    expected = full.resample("1h").agg(["sum", "count"])
+    assert np.array_equal(hours.starts, expected.index.asi8)
+    assert np.array_equal(hours.sums, expected["sum"].to_numpy())
+    assert np.array_equal(hours.counts, expected["count"].to_numpy())
+
+
+def test_trimmed_minute_tier_rounds_edges_to_hours(retained):
+    series, full = retained
+    series.apply_retention(series.raw_from, {MINUTE_NS: START + 24 * HOUR_NS, HOUR_NS: None})
+    # 03:20 and 05:40 round to the 03:00 and 06:00 hour boundaries
+    stats = series.window_stats(to_ns("2025-01-01 03:20"), to_ns("2025-01-01 05:40"))
+    assert stats.tiers == ["1h"]
+    assert stats.count == len(full[pd.Timestamp("2025-01-01 03:00"):pd.Timestamp("2025-01-01 05:59:59")])
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+import tools
+from home import Home, use_home
+from sensor_store import SensorSeries, SensorStore
+from sharding import ShardedRuleEvaluator
+
+START = np.datetime64("2025-01-01", "ns").astype("int64")
+MINUTE = 60 * 10**9
+
+
+def make_home(home_id, seed):
+    rng = np.random.default_rng(seed)
+    home = Home(home_id)
+    home.sensor_store = SensorStore()
+    for room in ("kitchen", "bedroom"):
+        ts = START + np.arange(3 * 1440) * MINUTE
+        home.sensor_store.add_series(room, "temperature", SensorSeries(ts, rng.normal(22, 4, len(ts))))
+    with use_home(home):
+        for room in ("kitchen", "bedroom"):
+            for threshold in (18, 22, 26):
+                tools.add_automation_rule(f"{room} above {threshold}", {
+                    "room": room, "sensor_name": "temperature", "operator": ">",
+                    "threshold_value": threshold, "device": f"fan{threshold}", "state": "on"})
+    return home
+
+
+@pytest.mark.parametrize("time_period", [None, "morning", "evening"])
+def test_pool_matches_in_process(time_period):
+    expected = ShardedRuleEvaluator().check_rules([make_home(f"h{i}", i) for i in range(4)], time_period)
+    assert expected["shards"] == 0
+
+    with ShardedRuleEvaluator(max_workers=2, pool_min_groups=1) as evaluator:
+        pooled = evaluator.check_rules([make_home(f"h{i}", i) for i in range(4)], time_period)
+    assert pooled["shards"] > 0
+    assert pooled["homes"] == expected["homes"]
@@ -0,0 +1,79 @@
+import json
+
+import pytest
+
+import agent
+import llm
+import tool_call_grammar
+from tool_call_grammar import ToolCallStreamParser, ToolCallValidator
+
+BAD_ESCAPE = '{"tool": "list_automation_rules", "args": {"note": "a\\qb"}}'
+
+
+def feed_in_pieces(parser, text, size=3):
+    calls = []
+    for i in range(0, len(text), size):
+        calls += parser.feed(text[i:i + size])
+    return calls
+
+
+def test_calls_of_a_list_arrive_as_they_close():
+    parser = ToolCallStreamParser(["a", "b"])
+    text = '[{"tool": "a", "args": {"s": "}{"}}, {"tool": "b", "args": {}}] trailing'
+    calls = feed_in_pieces(parser, text)
+    assert calls == [{"tool": "a", "args": {"s": "}{"}}, {"tool": "b", "args": {}}]
+    assert parser.done and not parser.failed
+
+
+def test_invalid_json_number_is_not_a_call():
+    parser = ToolCallStreamParser(["a"])
+    assert feed_in_pieces(parser, '{"tool": "a", "args": {"threshold_value": 08}}') == []
+    assert not parser.done
+
+
+@pytest.mark.parametrize("text", ['"a\\qb"', '"\\uZZZZ"', '"\\u12"}', '"\\x41"'])
+def test_invalid_escape_is_rejected(text):
+    validator = ToolCallValidator(["a"])
+    assert not validator.feed('{"tool": "a", "args": {"s": ' + text)
+
+
+@pytest.mark.parametrize("text", ['"\\"\\\\\\/\\b\\f\\n\\r\\t"', '"\\u00e9\\uABCD"'])
+def test_valid_escapes_are_accepted(text):
+    parser = ToolCallStreamParser(["a"])
+    calls = parser.feed('{"tool": "a", "args": {"s": ' + text + '}}')
+    assert calls == [{"tool": "a", "args": {"s": json.loads(text)}}]
+
+
+def test_undecodable_call_fails_the_parse(monkeypatch):
+    def loads(text):
+        raise json.JSONDecodeError("stub", text, 0)
+
+    monkeypatch.setattr(tool_call_grammar.json, "loads", loads)
+    parser = ToolCallStreamParser(["a"])
+    assert feed_in_pieces(parser, '{"tool": "a", "args": {}}') == []
+    assert parser.failed and parser.finished
+    assert "invalid JSON" in parser.error
+
+
+@pytest.mark.parametrize("output", [BAD_ESCAPE, '{"tool": "list_automation_rules", "args": {"x": 08}}'])
+def test_agent_reports_undecodable_call(monkeypatch, output):
+    def stub_stream(prompt, prefix=None, tool_names=None, max_new_tokens=256, stop_event=None):
+        yield output
+
+    monkeypatch.setattr(llm, "stream_llm", stub_stream)
+    monkeypatch.setattr(agent, "STREAM_LLM", True)
+    agent.COMMAND_CACHE.clear()
+    result = agent.natural_language_command_agent("zz please do the thing with the rules")
+    assert result["error"] == "LLM did not return valid JSON"
+    assert result["raw"].startswith('{"tool": "list_automation_rules"')
+
+
+def test_agent_runs_streamed_call(monkeypatch):
+    def stub_stream(prompt, prefix=None, tool_names=None, max_new_tokens=256, stop_event=None):
+        yield json.dumps({"tool": "list_automation_rules", "args": {}})
+
+    monkeypatch.setattr(llm, "stream_llm", stub_stream)
+    monkeypatch.setattr(agent, "STREAM_LLM", True)
+    agent.COMMAND_CACHE.clear()
+    result = agent.natural_language_command_agent("zz please do the thing with the rules")
+    assert "rules" in result
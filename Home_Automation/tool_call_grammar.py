@@ -0,0 +1,380 @@
+import json
+import re
+from typing import Any, Dict, Iterable, List, Optional
+
+# Incremental validator for tool-call JSON
+#
+# Accepts one object of the form {"tool": <name>, "args": {...}}, where <name>
+# is one of the allowed tool names, or (with allow_list) a non-empty array of
+# such objects, one character at a time.
+# feed() returns False as soon as the text can no longer become a valid
+# tool call, so the constrained decoder in llm.py can reject candidate tokens
+# before sampling them, and `done` flips to True the moment the object closes.
+#
+# ToolCallStreamParser runs the same automaton over streamed model output and
+# hands out each call as soon as its object closes, so the agent can start a
+# tool while the model is still writing the rest of a list.
+
+WHITESPACE = " \t\n\r"
+LITERALS = ("true", "false", "null")
+# characters allowed after a backslash; 'u' takes exactly four hex digits
+ESCAPE_CHARS = set('"\\/bfnrt')
+HEX_DIGITS = set("0123456789abcdefABCDEF")
+NUMBER_CHARS = set("-+0123456789.eE")
+# JSON numbers: no leading zeros, digits on both sides of '.', digits after the exponent
+NUMBER_RE = re.compile(r"-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][+-]?\d+)?")
+# prefixes of JSON numbers, so feed() rejects e.g. "08" or "1.e" at the offending character
+NUMBER_PREFIX_RE = re.compile(r"-?(?:(?:0|[1-9]\d*)(?:\.|(?:\.\d+)?(?:[eE][+-]?\d*)?))?")
+
+# parser states
+VALUE = "value"                # expecting any JSON value
+KEY_OR_END = "key_or_end"      # just after '{'
+KEY = "key"                    # after ',' in an object
+COLON = "colon"
+COMMA_OR_END = "comma_or_end"  # after a value inside a container
+CALL_SEP_OR_END = "call_sep_or_end"  # after a tool call inside the top-level array
+ITEM_OR_END = "item_or_end"    # just after '['
+STRING = "string"
+ESCAPE = "escape"              # after a backslash in a string
+UNICODE_ESCAPE = "unicode_escape"  # inside the hex digits of \uXXXX
+NUMBER = "number"
+LITERAL = "literal"
+DONE = "done"
+
+
+class ToolCallValidator:
+    """Character-level pushdown automaton for a tool call or a list of tool calls"""
+
+    __slots__ = ("tool_names", "allow_list", "in_list", "calls", "state", "stack", "buf",
+                 "hex_left", "string_role", "keys_seen", "current_key", "tool", "args_closed")
+
+    def __init__(self, tool_names: Iterable[str], allow_list: bool = True):
+        self.tool_names = tuple(tool_names)
+        self.allow_list = allow_list
+        self.in_list = False       # inside the top-level array of tool calls
+        self.calls = []            # tool names of the completed calls
+        self.state = VALUE
+        self.stack = []            # "obj" / "arr" per open container
+        self.buf = ""              # text of the current string / number / literal
+        self.hex_left = 0          # hex digits still expected in a \u escape
+        self.string_role = None    # "key", "tool" or None
+        self.keys_seen = set()     # top-level keys
+        self.current_key = None    # top-level key whose value is being parsed
+        self.tool: Optional[str] = None
+        self.args_closed = False
+
+    def copy(self) -> "ToolCallValidator":
+        other = ToolCallValidator.__new__(ToolCallValidator)
+        other.tool_names = self.tool_names
+        other.allow_list = self.allow_list
+        other.in_list = self.in_list
+        other.calls = list(self.calls)
+        other.state = self.state
+        other.stack = list(self.stack)
+        other.buf = self.buf
+        other.hex_left = self.hex_left
+        other.string_role = self.string_role
+        other.keys_seen = set(self.keys_seen)
+        other.current_key = self.current_key
+        other.tool = self.tool
+        other.args_closed = self.args_closed
+        return other
+
+    @property
+    def done(self) -> bool:
+        return self.state == DONE
+
+    @property
+    def ready(self) -> bool:
+        """The tool name and the complete args object of the current call have been seen"""
+        return self.done or (self.tool is not None and self.args_closed)
+
+    def _next_call(self):
+        """Reset the per-object state for the next call of the array"""
+        self.keys_seen = set()
+        self.current_key = None
+        self.tool = None
+        self.args_closed = False
+
+    def feed(self, text: str) -> bool:
+        for ch in text:
+            if not self._step(ch):
+                return False
+        return True
+
+    # internals
+
+    def _depth(self) -> int:
+        return len(self.stack)
+
+    def _end_value(self):
+        """A value just finished at the current depth"""
+        if self._depth() == 1 and self.current_key is not None:
+            self.current_key = None
+        if self.stack:
+            self.state = COMMA_OR_END
+            return
+        # a whole tool call just closed
+        self.calls.append(self.tool)
+        self.state = CALL_SEP_OR_END if self.in_list else DONE
+
+    def _open(self, kind: str) -> bool:
+        depth = self._depth()
+        if depth == 0 and kind != "obj":
+            return False
+        if depth == 1:
+            # top-level values: tool is a string, args is an object
+            if self.current_key != "args" or kind != "obj":
+                return False
+        self.stack.append(kind)
+        self.state = KEY_OR_END if kind == "obj" else ITEM_OR_END
+        return True
+
+    def _close(self, kind: str) -> bool:
+        if not self.stack or self.stack[-1] != kind:
+            return False
+        if self._depth() == 1 and "tool" not in self.keys_seen:
+            return False
+        self.stack.pop()
+        if self._depth() == 1 and self.current_key == "args":
+            self.args_closed = True
+        self._end_value()
+        return True
+
+    def _start_value(self, ch: str) -> bool:
+        depth = self._depth()
+        if ch == "{":
+            return self._open("obj")
+        if ch == "[":
+            if depth == 0 and self.allow_list and not self.in_list:
+                self.in_list = True
+                return True
+            return self._open("arr")
+        if depth == 0:
+            return False
+        if depth == 1 and self.current_key == "args":
+            return False
+        if ch == '"':
+            self.state = STRING
+            self.buf = ""
+            self.string_role = "tool" if depth == 1 else None
+            return True
+        if depth == 1:
+            # the tool name must be a string
+            return False
+        if ch in NUMBER_CHARS and ch not in "+.eE":
+            self.state = NUMBER
+            self.buf = ch
+            return True
+        for lit in LITERALS:
+            if lit.startswith(ch):
+                self.state = LITERAL
+                self.buf = ch
+                return True
+        return False
+
+    def _finish_number(self) -> bool:
+        if not NUMBER_RE.fullmatch(self.buf):
+            return False
+        self._end_value()
+        return True
+
+    def _step(self, ch: str) -> bool:
+        state = self.state
+
+        if state == STRING:
+            return self._string_char(ch)
+
+        if state == ESCAPE:
+            self.buf += ch
+            if ch == "u":
+                self.hex_left = 4
+                self.state = UNICODE_ESCAPE
+                return True
+            self.state = STRING
+            return ch in ESCAPE_CHARS
+
+        if state == UNICODE_ESCAPE:
+            if ch not in HEX_DIGITS:
+                return False
+            self.buf += ch
+            self.hex_left -= 1
+            if self.hex_left == 0:
+                self.state = STRING
+            return True
+
+        if state == NUMBER:
+            if ch in NUMBER_CHARS:
+                self.buf += ch
+                return NUMBER_PREFIX_RE.fullmatch(self.buf) is not None
+            if not self._finish_number():
+                return False
+            return self._step(ch)
+
+        if state == LITERAL:
+            candidate = self.buf + ch
+            if any(lit.startswith(candidate) for lit in LITERALS):
+                self.buf = candidate
+                if candidate in LITERALS:
+                    self._end_value()
+                return True
+            return False
+
+        if ch in WHITESPACE:
+            return True
+
+        if state == DONE:
+            return False
+
+        if state == VALUE:
+            return self._start_value(ch)
+
+        if state == CALL_SEP_OR_END:
+            if ch == ",":
+                self._next_call()
+                self.state = VALUE
+                return True
+            if ch == "]":
+                self.state = DONE
+                return True
+            return False
+
+        if state == ITEM_OR_END:
+            if ch == "]":
+                return self._close("arr")
+            return self._start_value(ch)
+
+        if state in (KEY_OR_END, KEY):
+            if ch == "}" and state == KEY_OR_END:
+                return self._close("obj")
+            if ch != '"':
+                return False
+            self.state = STRING
+            self.buf = ""
+            self.string_role = "key"
+            return True
+
+        if state == COLON:
+            if ch != ":":
+                return False
+            self.state = VALUE
+            return True
+
+        if state == COMMA_OR_END:
+            if ch == ",":
+                self.state = KEY if self.stack[-1] == "obj" else VALUE
+                return True
+            if ch == "}":
+                return self._close("obj")
+            if ch == "]":
+                return self._close("arr")
+            return False
+
+        return False
+
+    def _string_char(self, ch: str) -> bool:
+        top_level = self._depth() == 1
+
+        if ch == "\\":
+            # keys and tool names are plain identifiers
+            if top_level and self.string_role is not None:
+                return False
+            self.buf += ch
+            self.state = ESCAPE
+            return True
+
+        if ch != '"':
+            if ch < " ":
+                return False
+            self.buf += ch
+            if top_level and self.string_role == "key":
+                return any(k.startswith(self.buf) and k not in self.keys_seen for k in ("tool", "args"))
+            if top_level and self.string_role == "tool":
+                return any(name.startswith(self.buf) for name in self.tool_names)
+            return True
+
+        # closing quote
+        role = self.string_role
+        self.string_role = None
+        if top_level and role == "key":
+            if self.buf not in ("tool", "args") or self.buf in self.keys_seen:
+                return False
+            self.keys_seen.add(self.buf)
+            self.current_key = self.buf
+            self.state = COLON
+            return True
+        if role == "key":
+            self.state = COLON
+            return True
+        if top_level and role == "tool":
+            if self.buf not in self.tool_names:
+                return False
+            self.tool = self.buf
+        self._end_value()
+        return True
+
+
+class ToolCallStreamParser:
+    """
+    Incremental parser for streamed tool-call text. feed() returns the calls
+    ({"tool", "args"} dicts) completed by the new text. Text before the first
+    call (an unconstrained model's preamble) is skipped; text after the call
+    or list is ignored, and so is anything after the output turns invalid.
+    A call the validator accepts but json.loads rejects fails the parse;
+    `error` says why.
+    """
+
+    __slots__ = ("tool_names", "allow_list", "validator", "text", "calls", "failed", "error", "_start")
+
+    def __init__(self, tool_names: Iterable[str], allow_list: bool = True):
+        self.tool_names = tuple(tool_names)
+        self.allow_list = allow_list
+        self.validator = ToolCallValidator(self.tool_names, allow_list)
+        self.text = ""
+        self.calls: List[Dict[str, Any]] = []
+        self.failed = False
+        self.error: Optional[str] = None
+        self._start = None      # offset in text of the object being parsed
+
+    @property
+    def done(self) -> bool:
+        """The call, or the whole list, is complete"""
+        return self.validator.done
+
+    @property
+    def finished(self) -> bool:
+        """Nothing more will be parsed: done, or invalid after the first call"""
+        return self.validator.done or self.failed
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        completed = []
+        validator = self.validator
+        for ch in chunk:
+            if self.finished:
+                break
+            pos = len(self.text)
+            self.text += ch
+            depth = len(validator.stack)
+            closed = len(validator.calls)
+
+            if not validator.feed(ch):
+                if self.calls:
+                    self.failed = True
+                    break
+                # not a tool call yet: start over at the next character
+                validator = self.validator = ToolCallValidator(self.tool_names, self.allow_list)
+                self._start = None
+                continue
+
+            if depth == 0 and validator.stack:
+                self._start = pos
+            if len(validator.calls) > closed:
+                try:
+                    call = json.loads(self.text[self._start:pos + 1])
+                except json.JSONDecodeError as e:
+                    self.failed = True
+                    self.error = f"invalid JSON in tool call: {e}"
+                    break
+                self.calls.append(call)
+                completed.append(call)
+        return completed
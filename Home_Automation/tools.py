@@ -1,27 +1,225 @@
+import functools
+import time
+
+import numpy as np
 import pandas as pd
 from datetime import datetime
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
+
+import home as _home
+import sensor_cache
+from actuator import Command, DevicePolicy
+from home import Home, DEFAULT_HOME, current_home, use_home, set_clock, now as _now
+from metrics import timed
+from persistence import StateLog
+from sensor_store import (SensorStore, SensorSeries, RetentionPolicy, WindowStats, to_ns, period_codes,
+                          PERIOD_CODES, MINUTE_NS, HOUR_NS, DAY_NS)
+from rule_engine import compile_rule, OPERATORS
+
+# State
+#
+# Sensor data, rules and device states belong to a home.Home; every tool acts
+# on current_home(), which is DEFAULT_HOME unless use_home() selected another.
+# The former module globals can still be read: tools.SENSOR_STORE,
+# tools.AUTOMATION_RULES, ... return the attributes of the current home.
+
+_HOME_ATTRIBUTES = {
+    "SENSOR_DATA": "sensor_data",
+    "SENSOR_STORE": "sensor_store",
+    "AUTOMATION_RULES": "automation_rules",
+    "DEVICE_STATES": "device_states",
+    "RULE_INDEX": "rule_index",
+    "STATE_LOG": "state_log",
+    "STATE_LOCK": "lock",
+    "ACTUATOR": "actuator",
+}
+
+
+def __getattr__(name: str):
+    if name in _HOME_ATTRIBUTES:
+        return getattr(current_home(), _HOME_ATTRIBUTES[name])
+    if name == "CLOCK":
+        return _home.CLOCK
+    raise AttributeError(f"module 'tools' has no attribute '{name}'")
+
+
+def _locked(fn):
+    """
+    Run fn holding the current home's lock, so tool calls can run on several
+    threads. Read tools hold it too: sensor_store builds its indexes (prefix
+    sums, block min/max, period positions, rollups) lazily on first read, and
+    an unlocked read could race an ingest that invalidates them.
+    """
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with current_home().lock:
+            return fn(*args, **kwargs)
+    return wrapper
 
-# Global States
 
-SENSOR_DATA: Optional[pd.DataFrame] = None
-AUTOMATION_RULES: List[Dict[str, Any]] = []
-DEVICE_STATES: Dict[str, Dict[str, str]] = {}
+# Persistence of rules and device states
+
+@_locked
+def enable_persistence(state_dir: str, flush_interval_ms: float = 10.0, compact_every: int = 2000):
+    """
+    Restore the current home's rules and device states from state_dir
+    (snapshot + log tail) and log every later change there.
+    """
+    h = current_home()
+    started = time.perf_counter()
+
+    if h.state_log is not None:
+        h.state_log.close()
+
+    log = StateLog(state_dir, flush_interval_ms=flush_interval_ms, compact_every=compact_every)
+    rules, device_states = log.recover()
+
+    compiled = []
+    for rule in rules:
+        try:
+            compiled.append(compile_rule(rule["rule_id"], rule["rule_text"], rule["structured"]))
+        except (KeyError, ValueError) as e:
+            return {"status": "error", "message": f"Cannot restore rule {rule.get('rule_id')}: {e}"}
+
+    h.automation_rules[:] = rules
+    h.rule_index.clear()
+    for rule in compiled:
+        h.rule_index.add(rule)
+    h.device_states.clear()
+    h.device_states.update(device_states)
+    h.state_log = log
+
+    return {
+        "status": "success",
+        "state_dir": state_dir,
+        "rules_restored": len(rules),
+        "devices_restored": sum(len(d) for d in device_states.values()),
+        "recovery_ms": round((time.perf_counter() - started) * 1000, 2)
+    }
 
 # 1. LOAD SENSOR DATA
 
-def load_sensor_data(csv_path: str):
+@timed("tool")
+@_locked
+def load_sensor_data(csv_path: str, use_cache: bool = True):
     """
-    Load sensor data CSV into global dataframe
+    Load sensor data CSV into the current home's dataframe and build the
+    per-(room, sensor_name) index used by the query tools.
+    Rows are grouped by (room, sensor_name) and time-sorted within a group.
+
+    With use_cache the CSV is parsed only when it changed: a columnar cache
+    (sensor_cache) next to it is memory-mapped instead. A configured
+    retention policy is applied to the loaded history.
     """
-    global SENSOR_DATA
+    h = current_home()
+
+    if use_cache:
+        cached = sensor_cache.load_cache(csv_path)
+        if cached is not None:
+            h.sensor_data, h.sensor_store = cached
+            rows = len(h.sensor_data)
+            if h.retention is not None:
+                _apply_retention(h)
+            return {
+                "status": "success",
+                "rows_loaded": rows,
+                "source": "cache"
+            }
+
+    sensor_data = pd.read_csv(csv_path, parse_dates=["timestamp"])
+    sensor_data.sort_values(by=["room", "sensor_name", "timestamp"], inplace=True, kind="stable")
+    sensor_data.reset_index(drop=True, inplace=True)
+    h.sensor_data = sensor_data
+    h.sensor_store = SensorStore.from_frame(sensor_data)
+
+    if use_cache:
+        try:
+            sensor_cache.write_cache(csv_path, sensor_data)
+        except OSError as e:
+            print(f"[load_sensor_data] could not write cache: {e}")
+
+    if h.retention is not None:
+        _apply_retention(h)
+
+    return {
+        "status": "success",
+        "rows_loaded": len(sensor_data),
+        "source": "csv"
+    }
+
+# 1b. INGEST SENSOR READINGS (EVENT-DRIVEN RULES)
+
+def parse_reading(reading) -> Tuple[int, str, str, float]:
+    """
+    (timestamp ns, room, sensor_name, value) of a reading dict or tuple;
+    KeyError, TypeError or ValueError if it is not a valid reading.
+    """
+    if isinstance(reading, dict):
+        timestamp, room, sensor_name, value = (reading["timestamp"], reading["room"],
+                                               reading["sensor_name"], reading["value"])
+    else:
+        timestamp, room, sensor_name, value = reading
+    if not isinstance(room, str) or not isinstance(sensor_name, str):
+        raise TypeError("room and sensor_name must be strings")
+    return to_ns(timestamp), room, sensor_name, float(value)
+
+
+def parse_readings(readings) -> List[Tuple[int, str, str, float]]:
+    """parse_reading of every reading; fails on the first invalid one"""
+    return [parse_reading(r) for r in readings]
 
-    SENSOR_DATA = pd.read_csv(csv_path, parse_dates=["timestamp"])
-    SENSOR_DATA.sort_values(by="timestamp", inplace=True)
+
+def _ingest(ts_ns: int, room: str, sensor_name: str, value: float) -> list:
+    """Append one parsed reading and return the rules it switched from false to true"""
+    h = current_home()
+    if h.sensor_store is None:
+        h.sensor_store = SensorStore()
+
+    series, pos = h.sensor_store.append(room, sensor_name, ts_ns, value)
+
+    # a late reading older than the latest one is history, not the current state
+    if pos != len(series) - 1:
+        return []
+
+    return h.rule_index.evaluate_edges(room, sensor_name, value)
+
+
+@timed("tool")
+@_locked
+def ingest_reading(timestamp: str, room: str, sensor_name: str, value: float):
+    """
+    Append a live reading to the sensor store and evaluate only the rules
+    subscribed to (room, sensor_name). Actions fire on a false -> true edge.
+    sensor_data keeps the rows loaded from CSV; live readings go to sensor_store.
+    """
+    rising = _ingest(*parse_reading((timestamp, room, sensor_name, value)))
+    _maybe_apply_retention()
+    return {
+        "status": "success",
+        "rows_ingested": 1,
+        **current_home().fire_rules(rising)
+    }
+
+
+@timed("tool")
+@_locked
+def ingest_readings(readings: List[Dict[str, Any]]):
+    """
+    Batch variant of ingest_reading. Each reading is a dict with timestamp,
+    room, sensor_name and value (or a tuple in that order); they are applied
+    in the given order. The whole batch is parsed first, so an invalid
+    reading raises before anything is stored or any rule edge is consumed.
+    """
+    parsed = parse_readings(readings)
+    rising = []
+    for reading in parsed:
+        rising.extend(_ingest(*reading))
+    _maybe_apply_retention()
 
     return {
         "status": "success",
-        "rows_loaded": len(SENSOR_DATA)
+        "rows_ingested": len(parsed),
+        **current_home().fire_rules(rising)
     }
 
 # 2. LOAD LOCAL LLM (Qwen 2.5 local)
@@ -32,10 +230,12 @@ def load_local_llm():
     """
     Registers your local Qwen 2.5 LLM.
     This does NOT run inference; it only stores configuration info.
-    The agent will later use this path to actually run the model.
+    The path comes from llm.MODEL_PATH (HOME_AUTOMATION_MODEL_PATH);
+    llm.py loads the weights lazily on first use.
     """
+    import llm
 
-    model_path = r"E:\Home_Automation\qwen2.5_local" #update this
+    model_path = str(llm.MODEL_PATH)
 
     if not os.path.exists(model_path):
         return {
@@ -47,7 +247,9 @@ def load_local_llm():
         "type": "local",
         "engine": "qwen",
         "model_name": "qwen2.5_local",
-        "path": model_path
+        "path": model_path,
+        "backend": llm.BACKEND,
+        "loaded": llm.is_loaded()
     }
 
     return {
@@ -56,117 +258,225 @@ def load_local_llm():
     }
 
 
+def _get_series(room: str, sensor_name: str) -> Optional[SensorSeries]:
+    """Indexed lookup of one (room, sensor_name) series of the current home"""
+    store = current_home().sensor_store
+    if store is None:
+        return None
+    return store.get(room, sensor_name)
+
 # 3. GET LATEST SENSOR DATA
 
+@timed("tool")
+@_locked
 def get_latest_sensor_data(room: str, sensor_name: str):
-    global SENSOR_DATA
-    if SENSOR_DATA is None:
+    if current_home().sensor_store is None:
         return {"error": "Sensor data not loaded"}
 
-    df = SENSOR_DATA[
-        (SENSOR_DATA["room"] == room) &
-        (SENSOR_DATA["sensor_name"] == sensor_name)
-    ]
+    series = _get_series(room, sensor_name)
+    latest = series.latest() if series is not None else None
 
-    if df.empty:
+    if latest is None:
         return {"error": "No data found"}
 
-    latest = df.iloc[-1]
+    ts, value = latest
 
     return {
-        "timestamp": latest["timestamp"],
+        "timestamp": pd.Timestamp(ts),
         "room": room,
         "sensor_name": sensor_name,
-        "value": float(latest["value"])
+        "value": value
     }
 
 # 4. GET SENSOR DATA BY TIMESTAMP
 
+@timed("tool")
+@_locked
 def get_sensor_data_by_timestamp(room: str, sensor_name: str, timestamp: str):
-    global SENSOR_DATA
-    if SENSOR_DATA is None:
+    if current_home().sensor_store is None:
         return {"error": "Sensor data not loaded"}
 
     ts = pd.to_datetime(timestamp)
 
-    df = SENSOR_DATA[
-        (SENSOR_DATA["room"] == room) &
-        (SENSOR_DATA["sensor_name"] == sensor_name) &
-        (SENSOR_DATA["timestamp"] == ts)
-    ]
+    series = _get_series(room, sensor_name)
+    i = series.find(ts.value) if series is not None else None
 
-    if df.empty:
+    if i is None:
         return {"error": "No matching record"}
 
-    rec = df.iloc[0]
-
     return {
-        "timestamp": str(rec["timestamp"]),
+        "timestamp": str(ts),
         "room": room,
         "sensor_name": sensor_name,
-        "value": float(rec["value"])
+        "value": series.value_at(i)
     }
 
 
 # 5. AVERAGE SENSOR DATA
 
-def avg_sensor_data(room: str, sensor_name: str, start_time: str, end_time: str):
-    global SENSOR_DATA
-    if SENSOR_DATA is None:
+def _window(room: str, sensor_name: str, start_time: str, end_time: str):
+    """Locate the [start_time, end_time] window of one series: (series, lo, hi) or an error dict"""
+    if current_home().sensor_store is None:
         return {"error": "Sensor data not loaded"}
 
-    start = pd.to_datetime(start_time)
-    end = pd.to_datetime(end_time)
+    series = _get_series(room, sensor_name)
+    if series is None:
+        return series, 0, 0
 
-    df = SENSOR_DATA[
-        (SENSOR_DATA["room"] == room) &
-        (SENSOR_DATA["sensor_name"] == sensor_name) &
-        (SENSOR_DATA["timestamp"] >= start) &
-        (SENSOR_DATA["timestamp"] <= end)
-    ]
+    lo, hi = series.range_indices(to_ns(start_time), to_ns(end_time))
+    return series, lo, hi
 
-    if df.empty:
+
+def _window_stats(room: str, sensor_name: str, start_time: str, end_time: str):
+    """WindowStats of the [start_time, end_time] window of one series (all retention tiers), or an error dict"""
+    if current_home().sensor_store is None:
+        return {"error": "Sensor data not loaded"}
+
+    series = _get_series(room, sensor_name)
+    if series is None:
+        return WindowStats()
+    return series.window_stats(to_ns(start_time), to_ns(end_time))
+
+
+def _window_aggregate(room: str, sensor_name: str, start_time: str, end_time: str, key: str, fn,
+                      allow_empty: bool = False):
+    stats = _window_stats(room, sensor_name, start_time, end_time)
+    if isinstance(stats, dict):
+        return stats
+
+    if not stats.count and not allow_empty:
         return {"error": "No data in interval"}
 
-    avg_val = df["value"].mean()
+    result = {
+        "room": room,
+        "sensor_name": sensor_name,
+        "start": str(start_time),
+        "end": str(end_time),
+        key: fn(stats)
+    }
+    # parts of the window answered by rollups are only as exact as their buckets
+    if stats.tiers and stats.tiers != ["raw"]:
+        result["tiers"] = stats.tiers
+    return result
 
-    return {
+
+@timed("tool")
+@_locked
+def avg_sensor_data(room: str, sensor_name: str, start_time: str, end_time: str):
+    return _window_aggregate(room, sensor_name, start_time, end_time, "average_value",
+                             lambda s: float(s.mean))
+
+# 5b. MIN / MAX / SUM / COUNT / PERCENTILE SENSOR DATA
+
+@timed("tool")
+@_locked
+def min_sensor_data(room: str, sensor_name: str, start_time: str, end_time: str):
+    return _window_aggregate(room, sensor_name, start_time, end_time, "min_value", lambda s: s.min)
+
+
+@timed("tool")
+@_locked
+def max_sensor_data(room: str, sensor_name: str, start_time: str, end_time: str):
+    return _window_aggregate(room, sensor_name, start_time, end_time, "max_value", lambda s: s.max)
+
+
+@timed("tool")
+@_locked
+def sum_sensor_data(room: str, sensor_name: str, start_time: str, end_time: str):
+    return _window_aggregate(room, sensor_name, start_time, end_time, "sum_value", lambda s: s.sum)
+
+
+@timed("tool")
+@_locked
+def count_sensor_data(room: str, sensor_name: str, start_time: str, end_time: str):
+    return _window_aggregate(room, sensor_name, start_time, end_time, "count", lambda s: s.count,
+                             allow_empty=True)
+
+
+@timed("tool")
+@_locked
+def percentile_sensor_data(room: str, sensor_name: str, start_time: str, end_time: str, percentile: float = 50):
+    """Percentiles need individual readings, so only raw readings (within raw retention) are used"""
+    if not 0 <= float(percentile) <= 100:
+        return {"error": "percentile must be between 0 and 100"}
+
+    window = _window(room, sensor_name, start_time, end_time)
+    if isinstance(window, dict):
+        return window
+
+    series, lo, hi = window
+    if series is not None and series.raw_from is not None:
+        lo = max(lo, series.range_indices(series.raw_from, series.raw_from)[0])
+    if lo >= hi:
+        return {"error": "No data in interval"}
+
+    result = {
         "room": room,
         "sensor_name": sensor_name,
         "start": str(start_time),
         "end": str(end_time),
-        "average_value": float(avg_val)
+        "percentile_value": series.window_percentile(lo, hi, float(percentile)),
+        "percentile": float(percentile)
     }
+    if series.raw_from is not None and to_ns(start_time) < series.raw_from:
+        result["raw_from"] = str(pd.Timestamp(series.raw_from))
+    return result
 
 # 6. SET DEVICE STATE (SIMULATED ACTUATOR)
 
-def set_device_state(room: str, device: str, state: str):
-    global DEVICE_STATES
+@timed("tool")
+@_locked
+def configure_device(room: str, device: str, min_interval_seconds: float = 0.0, hold_seconds: float = 0.0):
+    """
+    Flap protection for rule-driven changes of one device (manual commands are
+    not limited). Throttled commands are queued and sent once allowed. For a
+    threshold deadband use two rules with separated thresholds.
+    """
+    current_home().actuator.set_policy(room, device, DevicePolicy(min_interval_seconds, hold_seconds))
+    return {
+        "status": "success",
+        "room": room,
+        "device": device,
+        "min_interval_seconds": min_interval_seconds,
+        "hold_seconds": hold_seconds
+    }
+
 
-    if room not in DEVICE_STATES:
-        DEVICE_STATES[room] = {}
+@timed("tool")
+@_locked
+def set_device_state(room: str, device: str, state: str):
+    """Manual command; nothing happens when the device is already in state"""
+    outcome = current_home().actuator.dispatch([Command(room, device, state, source="manual")], force=True)
 
-    DEVICE_STATES[room][device] = state
+    if not outcome["applied"]:
+        return {
+            "status": "success",
+            "changed": False,
+            "room": room,
+            "device": device,
+            "state": state
+        }
 
     action = {
-        "timestamp": str(datetime.now()),
+        "timestamp": str(_now()),
         "room": room,
         "device": device,
         "state": state
     }
 
-    print(f" DEVICE ACTION: {room}.{device} -> {state}")
-
     return {
         "status": "success",
+        "changed": True,
         "action": action
     }
 
 # 7. ADD AUTOMATION RULE
 
+@timed("tool")
+@_locked
 def add_automation_rule(rule_text: str, structured_rule: Dict[str, Any], **kwargs):
-    """Flexible validation for action/state fields"""
-    global AUTOMATION_RULES
+    """Flexible validation for action/state fields; compiles the rule into the home's rule index"""
+    h = current_home()
     
     if not structured_rule or structured_rule is None:
         return {"status": "error", "message": "Structured rule cannot be null"}
@@ -181,209 +491,339 @@ def add_automation_rule(rule_text: str, structured_rule: Dict[str, Any], **kwarg
     
 
     required_fields = ['sensor_name', 'threshold_value', 'device', 'state']
-    if not all(key in structured_rule_copy for key in required_fields):
+    if 'condition' not in structured_rule_copy and not all(key in structured_rule_copy for key in required_fields):
         return {"status": "error", "message": f"Missing required fields: {required_fields}"}
+
+    rule_id = len(h.automation_rules)
+    try:
+        compiled = compile_rule(rule_id, rule_text, structured_rule_copy)
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}
     
     rule = {
+        "rule_id": rule_id,
         "rule_text": rule_text,
         "structured": structured_rule_copy,  
         "created_at": str(datetime.now())
     }
     
-    AUTOMATION_RULES.append(rule)
+    h.automation_rules.append(rule)
+    h.rule_index.add(compiled)
+    h.log_change({"op": "rule", "rule": rule})
     return {"status": "success", "rule_stored": rule}
 
 
 
 # 8. LIST AUTOMATION RULES
 
+@timed("tool")
+@_locked
 def list_automation_rules():
+    rules = current_home().automation_rules
     return {
-        "rule_count": len(AUTOMATION_RULES),
-        "rules": AUTOMATION_RULES
-    }
-def check_rules(time_period: str = None):
-    """Multi-agent rule engine: check stored rules vs current sensors"""
-    global SENSOR_DATA, AUTOMATION_RULES, DEVICE_STATES 
-    
-    triggered = []
-    
-    for rule in AUTOMATION_RULES:
-        structured = rule['structured']
-        if not structured:  
-            continue
-            
-       
-        if all(key in structured for key in ['sensor_name', 'threshold_value', 'device', 'state']):
-            room = structured.get('room', 'living_room')  
-            sensor_name = structured['sensor_name']
-            threshold = structured['threshold_value']
-            device = structured['device']
-            state = structured['state']
-            
-            
-            if time_period:
-                sensor_data = get_latest_sensor_data_time_filtered(room, sensor_name, time_period)
-            else:
-                sensor_data = get_latest_sensor_data(room, sensor_name)
-            
-            if sensor_data.get('error') or sensor_data['value'] <= threshold:
-                continue
-            
-            # Execute action
-            result = set_device_state(room, device, state)
-            if result['status'] == 'success':
-                triggered.append(f"{room}.{device} → {state} (rule: {rule['rule_text'][:50]}...)")
-        
-       
-        elif 'condition' in structured and 'actions' in structured:
-            cond = structured['condition']
-            sensor_info = cond.get('sensor', {})
-            room = sensor_info.get('room', 'living_room')
-            sensor_name = sensor_info.get('sensor_name', 'temperature')
-            operator = cond.get('comparison_operator', cond.get('operator', '>'))
-            threshold = cond.get('value')
-            
-            # Get sensor data
-            if time_period:
-                sensor_data = get_latest_sensor_data_time_filtered(room, sensor_name, time_period)
-            else:
-                sensor_data = get_latest_sensor_data(room, sensor_name)
-            
-            if sensor_data.get('error'):
-                continue
-            
-            current_value = sensor_data['value']
-            
-            # Evaluate condition
-            condition_met = False
-            if operator == '>' and current_value > threshold:
-                condition_met = True
-            elif operator == '>=' and current_value >= threshold:
-                condition_met = True
-            elif operator == '<' and current_value < threshold:
-                condition_met = True
-            elif operator == '<=' and current_value <= threshold:
-                condition_met = True
-            
-            if not condition_met:
-                continue
-            
-            # Execute first action
-            actions = structured['actions']
-            if actions:
-                action = actions[0]
-                device = action.get('device')
-                state = action.get('state')
-                if device and state:
-                    result = set_device_state(room, device, state)
-                    if result['status'] == 'success':
-                        triggered.append(f"{room}.{device} → {state} (rule: {rule['rule_text'][:50]}...)")
-        
-        # === LEGACY FORMAT SUPPORT ===
-        elif all(key in structured for key in ['sensor_name', 'threshold_value']):
-            
-            room = 'living_room'
-            sensor_data = get_latest_sensor_data(room, structured['sensor_name'])
-            if sensor_data.get('value', 0) > structured['threshold_value']:
-                set_device_state(room, 'fan', 'on')  # Default action
-                triggered.append(f"Legacy rule triggered: {rule['rule_text'][:50]}...")
-    
-    return {
-        "status": "checked", 
-        "rules_triggered": triggered if triggered else "None triggered",
-        "total_rules": len(AUTOMATION_RULES),
-        "time_period": time_period or "all_day"
+        "rule_count": len(rules),
+        "rules": rules
     }
 
+# 8b. TIME-OF-DAY PERIOD QUERIES (night, morning, afternoon, evening)
+
+def _period_code(time_period: str) -> Optional[int]:
+    return PERIOD_CODES.get(str(time_period).strip().lower())
 
+
+@timed("tool")
+@_locked
 def get_latest_sensor_data_time_filtered(room: str, sensor_name: str, time_period: str):
-    """Get latest sensor data in specific time period (morning, afternoon, evening, night)"""
-    global SENSOR_DATA
-    if SENSOR_DATA is None:
+    """Get the newest reading taken in a time period (morning, afternoon, evening, night), over the whole history"""
+    if current_home().sensor_store is None:
         return {"error": "No data"}
-    
-    # time periods 
-    now = pd.Timestamp.now().normalize()  
-    periods = {
-        "evening": (now + pd.Timedelta(hours=18), now + pd.Timedelta(hours=23, minutes=59)),
-        "morning": (now + pd.Timedelta(hours=6), now + pd.Timedelta(hours=12)),
-        "afternoon": (now + pd.Timedelta(hours=12), now + pd.Timedelta(hours=18)),
-        "night": (now, now + pd.Timedelta(hours=6))
-    }
-    
-    if time_period not in periods:
+
+    code = _period_code(time_period)
+    if code is None:
         return {"error": "Invalid time period"}
-    
-    start_time, end_time = periods[time_period]
-    df = SENSOR_DATA[
-        (SENSOR_DATA["room"] == room) &
-        (SENSOR_DATA["sensor_name"] == sensor_name) &
-        (SENSOR_DATA["timestamp"] >= start_time) &
-        (SENSOR_DATA["timestamp"] <= end_time)
-    ]
-    
-    if df.empty:
+
+    series = _get_series(room, sensor_name)
+    i = series.period_latest(code) if series is not None else None
+
+    if i is None:
         return {"error": f"No {time_period} data"}
-    
-    latest = df.iloc[-1]
+
     return {
-        "timestamp": latest["timestamp"],
-        "room": room, 
+        "timestamp": pd.Timestamp(int(series.timestamps[i])),
+        "room": room,
         "sensor_name": sensor_name,
-        "value": float(latest["value"]),
+        "value": series.value_at(i),
         "time_period": time_period
     }
 
+
+@timed("tool")
+@_locked
+def avg_sensor_data_by_period(room: str, sensor_name: str, time_period: str, days: int = 7):
+    """
+    Average of the readings taken in a time period over the last `days` days
+    of the series (counted back from its newest reading), plus per-day averages
+    """
+    if current_home().sensor_store is None:
+        return {"error": "Sensor data not loaded"}
+
+    code = _period_code(time_period)
+    if code is None:
+        return {"error": "Invalid time period"}
+
+    days = int(days)
+    if days < 1:
+        return {"error": "days must be at least 1"}
+
+    series = _get_series(room, sensor_name)
+    if series is None or len(series) == 0:
+        return {"error": "No data found"}
+
+    ts = series.timestamps
+    first_day = (int(ts[-1]) // DAY_NS - (days - 1)) * DAY_NS
+    raw_from = series.raw_from
+    raw_start = first_day if raw_from is None else max(first_day, raw_from)
+    idx = series.period_indices(code, int(np.searchsorted(ts, raw_start)))
+
+    values = series.values[idx].astype("float64")
+    day = (ts[idx] - first_day) // DAY_NS
+    sums = np.bincount(day, weights=values, minlength=days)
+    counts = np.bincount(day, minlength=days)
+    total = float(values.sum())
+
+    result = {}
+    if raw_start > first_day:
+        # days before raw retention: periods are whole hours, so the hour tier is exact
+        hourly = series.rollup(HOUR_NS)
+        i, j = hourly.bucket_range(first_day, raw_start)
+        starts = hourly.starts[i:j]
+        sel = period_codes(starts) == code
+        bucket_day = (starts[sel] - first_day) // DAY_NS
+        bucket_sums = hourly.sums[i:j][sel]
+        sums += np.bincount(bucket_day, weights=bucket_sums, minlength=days)
+        counts += np.bincount(bucket_day, weights=hourly.counts[i:j][sel], minlength=days).astype("int64")
+        total += float(bucket_sums.sum())
+        result["tiers"] = ["1h", "raw"] if len(idx) else ["1h"]
+
+    count = int(counts.sum())
+    if count == 0:
+        return {"error": f"No {time_period} data in the last {days} days"}
+
+    return {
+        "room": room,
+        "sensor_name": sensor_name,
+        "time_period": time_period,
+        "days": days,
+        "count": count,
+        "average_value": total / count,
+        "daily_averages": {
+            str(pd.Timestamp(first_day + d * DAY_NS).date()): float(sums[d] / counts[d])
+            for d in np.flatnonzero(counts)
+        },
+        **result
+    }
+
+# 9. CHECK RULES
+
+@timed("tool")
+@_locked
 def check_rules(time_period: str = None):
-    """Check stored rules against current sensor data (time-aware)"""
-    global AUTOMATION_RULES, DEVICE_STATES
-    triggered = []
-    
-    for rule in AUTOMATION_RULES:
-        structured = rule['structured']
-        
-
-        if 'condition' in structured and 'sensor' in structured['condition']:
-            cond = structured['condition']
-            sensor_info = cond['sensor']
-            
-
-            if time_period:
-                sensor_data = get_latest_sensor_data_time_filtered(
-                    sensor_info['room'], sensor_info['sensor_name'], time_period
-                )
-            else:
-                sensor_data = get_latest_sensor_data(sensor_info['room'], sensor_info['sensor_name'])
-            
-            if 'error' in sensor_data:
-                continue
-            
-            current_value = sensor_data['value']
-            threshold = cond.get('value', 0)
-            operator = cond.get('comparison_operator', '>').replace('>=', 'ge')
-            
-
-            if operator in ['>', 'gt'] and current_value > threshold:
-                execute_rule_action(structured, triggered)
-            elif operator in ['>=', 'ge'] and current_value >= threshold:
-                execute_rule_action(structured, triggered)
-        
-
-        elif all(k in structured for k in ['sensor_name', 'threshold_value']):
-            sensor_data = get_latest_sensor_data("living_room", structured['sensor_name'])
-            if sensor_data.get('value', 0) > structured['threshold_value']:
-                execute_rule_action(structured, triggered)
-    
-    return {"status": "checked", "rules_triggered": triggered}
-
-def execute_rule_action(structured, triggered):
-    """Helper to execute rule actions"""
-    actions = structured.get('actions', [{}])[0]
-    room = structured['condition']['sensor']['room'] if 'condition' in structured else "living_room"
-    device = actions.get('device', 'fan')
-    state = actions.get('state', 'on')
-    
-    result = set_device_state(room, device, state)
-    if result['status'] == 'success':
-        triggered.append(f"{room}.{device} → {state}")
+    """
+    Check stored rules against current sensor data (time-aware).
+    The current value of each distinct (room, sensor_name), or its newest
+    reading in time_period, is read once and its rules are then found with
+    one bisect per operator in the home's rule_index.
+    """
+    rule_index = current_home().rule_index
+    if time_period in ("all", "all_day"):
+        time_period = None
+
+    code = None
+    if time_period:
+        code = _period_code(time_period)
+        if code is None:
+            return {"status": "error", "message": f"Invalid time period '{time_period}'"}
+
+    values = {}
+    for room, sensor_name in rule_index.keys():
+        series = _get_series(room, sensor_name)
+        if series is None or len(series) == 0:
+            continue
+        i = len(series) - 1 if code is None else series.period_latest(code)
+        if i is not None:
+            values[(room, sensor_name)] = series.value_at(i)
+
+    return {
+        "status": "checked",
+        **current_home().fire_rules(rule_index.evaluate_groups(values)),
+        "total_rules": len(rule_index),
+        "time_period": time_period or "all_day"
+    }
+
+# 10. BACKTEST RULES
+
+def _backtest_window(room: str, sensor_name: str, start_ns: Optional[int], end_ns: Optional[int]):
+    """(timestamps, values, gaps to the next reading) of one series in the window, or None"""
+    series = _get_series(room, sensor_name)
+    if series is None:
+        return None
+
+    lo, hi = series.range_indices(
+        start_ns if start_ns is not None else np.iinfo("int64").min,
+        end_ns if end_ns is not None else np.iinfo("int64").max,
+    )
+    ts = series.timestamps[lo:hi]
+    return ts, series.values[lo:hi], np.diff(ts)
+
+
+def _backtest_rule(rule, window) -> Dict[str, Any]:
+    """Replay one compiled rule over its sensor's history with array operations"""
+    result = {
+        "rule_id": rule.rule_id,
+        "rule_text": rule.rule_text,
+        "room": rule.room,
+        "sensor_name": rule.sensor_name,
+        "condition": f"{rule.sensor_name} {rule.op} {rule.threshold}",
+        "device": rule.device,
+        "state": rule.state,
+        "readings": 0,
+        "matched_readings": 0,
+        "trigger_count": 0,
+        "first_trigger": None,
+        "last_trigger": None,
+        "on_duration_seconds": 0.0
+    }
+
+    if window is None:
+        result["error"] = "No data found"
+        return result
+
+    ts, values, gaps = window
+    if len(ts) == 0:
+        return result
+
+    # same predicate as check_rules; the threshold takes the stored value dtype
+    matched = OPERATORS[rule.op](values, values.dtype.type(rule.threshold))
+
+    # a trigger is a false -> true edge; the first reading has no predecessor
+    rising = matched.copy()
+    rising[1:] &= ~matched[:-1]
+    triggers = np.flatnonzero(rising)
+
+    result["readings"] = int(len(ts))
+    result["matched_readings"] = int(matched.sum())
+    result["trigger_count"] = int(len(triggers))
+    if len(triggers):
+        result["first_trigger"] = str(pd.Timestamp(int(ts[triggers[0]])))
+        result["last_trigger"] = str(pd.Timestamp(int(ts[triggers[-1]])))
+
+    # the device is held in the rule's state from each matching reading to the next reading
+    result["on_duration_seconds"] = float(gaps[matched[:-1]].sum()) / 1e9
+    return result
+
+
+@timed("tool")
+@_locked
+def backtest_rules(structured_rule: Optional[Dict[str, Any]] = None, rule_text: str = "candidate rule",
+                   start_time: Optional[str] = None, end_time: Optional[str] = None):
+    """
+    How often rules would have fired over the loaded sensor history.
+    Tests the stored rules, or only structured_rule when one is given
+    (compiled like add_automation_rule, but not stored). Each rule is one
+    vectorized pass over its sensor series.
+    """
+    if current_home().sensor_store is None:
+        return {"status": "error", "message": "Sensor data not loaded"}
+
+    if structured_rule:
+        try:
+            rules = [compile_rule(-1, rule_text, structured_rule)]
+        except ValueError as e:
+            return {"status": "error", "message": str(e)}
+    else:
+        rules = current_home().rule_index.rules()
+
+    start_ns = to_ns(start_time) if start_time else None
+    end_ns = to_ns(end_time) if end_time else None
+
+    # each series is sliced once, however many rules read it
+    windows = {}
+    for rule in rules:
+        if rule.key not in windows:
+            windows[rule.key] = _backtest_window(rule.room, rule.sensor_name, start_ns, end_ns)
+
+    return {
+        "status": "success",
+        "rules_tested": len(rules),
+        "start": str(start_time) if start_time else "all",
+        "end": str(end_time) if end_time else "all",
+        "results": [_backtest_rule(rule, windows[rule.key]) for rule in rules]
+    }
+
+# 11. RETENTION TIERS
+
+def _apply_retention(h: Home) -> Dict[str, Any]:
+    """Apply h.retention relative to the newest reading; caller holds h.lock or owns h"""
+    newest = h.sensor_store.newest() if h.sensor_store is not None else None
+    if newest is None:
+        return {"status": "success", "raw_dropped": 0}
+
+    raw_before, rollup_before = h.retention.cutoffs(newest)
+    dropped = h.sensor_store.apply_retention(raw_before, rollup_before)
+    if h.sensor_data is not None and dropped:
+        # the loaded frame would otherwise keep every row alive
+        keep = h.sensor_data["timestamp"].to_numpy().astype("datetime64[ns]").view("int64") >= raw_before
+        h.sensor_data = h.sensor_data[keep].reset_index(drop=True)
+    h.retention_due = (newest // HOUR_NS + 1) * HOUR_NS
+
+    return {
+        "status": "success",
+        "raw_dropped": dropped,
+        "raw_from": str(pd.Timestamp(raw_before)),
+        "minute_from": str(pd.Timestamp(rollup_before[MINUTE_NS])) if rollup_before[MINUTE_NS] else None,
+        "hour_from": str(pd.Timestamp(rollup_before[HOUR_NS])) if rollup_before[HOUR_NS] else None
+    }
+
+
+def _maybe_apply_retention():
+    """Apply the retention policy once per hour of sensor time; caller holds the home's lock"""
+    h = current_home()
+    if h.retention is None or h.sensor_store is None:
+        return
+    newest = h.sensor_store.newest()
+    if newest is not None and (h.retention_due is None or newest >= h.retention_due):
+        _apply_retention(h)
+
+
+@timed("tool")
+@_locked
+def configure_retention(raw_days: float = 7, minute_days: Optional[float] = 30, hour_days: Optional[float] = None):
+    """
+    Keep raw readings for raw_days, 1-minute rollups for minute_days and
+    1-hour rollups for hour_days (None: forever), counted back from the
+    newest reading. Applied now and then once per hour of ingested data.
+    """
+    try:
+        policy = RetentionPolicy(raw_days, minute_days, hour_days)
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}
+
+    h = current_home()
+    h.retention = policy
+    h.retention_due = None
+    return {
+        "raw_days": raw_days,
+        "minute_days": minute_days,
+        "hour_days": hour_days,
+        **_apply_retention(h)
+    }
+
+
+@timed("tool")
+@_locked
+def apply_retention():
+    """Roll up and drop the history beyond the current home's retention policy now"""
+    h = current_home()
+    if h.retention is None:
+        return {"status": "error", "message": "No retention policy configured"}
+    return _apply_retention(h)